@@ -0,0 +1,135 @@
+"""
+Benchmark of the message (de)serializers selectable in each service's config.py,
+in messages per second on a single core, for trades, candles and technical
+indicators payloads. Also reports the size of each encoded message and the decode
+time per message.
+
+Usage:
+    uv run benchmarks/serializers.py
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict
+
+SERVICES_DIR = os.path.join(os.path.dirname(__file__), '..', 'services')
+sys.path.insert(0, os.path.join(SERVICES_DIR, 'candles', 'src'))
+sys.path.insert(0, os.path.join(SERVICES_DIR, 'technical_indicators', 'src'))
+
+from candles.serializers import (  # noqa: E402
+    Candle,
+    Trade,
+    get_deserializer,
+    get_serializer,
+)
+from quixstreams.models.serializers import (  # noqa: E402
+    JSONDeserializer,
+    JSONSerializer,
+    MessageField,
+    SerializationContext,
+)
+
+N_MESSAGES = 200_000
+
+TRADE = {
+    'product_id': 'ETH/EUR',
+    'price': 2514.37,
+    'quantity': 0.01834219,
+    'timestamp': '2025-04-24T11:35:42.856851Z',
+    'timestamp_ms': 1745494542856,
+    'side': 'buy',
+}
+
+CANDLE = {
+    'pair': 'ETH/EUR',
+    'open': 2514.37,
+    'high': 2519.02,
+    'low': 2511.8,
+    'close': 2517.45,
+    'volume': 12.83462118,
+    'window_start_ms': 1745494500000,
+    'window_end_ms': 1745494560000,
+    'candle_seconds': 60,
+    'trade_count': 57,
+    'vwap': 2516.12345678,
+    'buy_volume': 7.12345678,
+    'sell_volume': 5.7111644,
+    'first_trade_ms': 1745494500123,
+    'last_trade_ms': 1745494559876,
+}
+
+TECHNICAL_INDICATORS = {
+    **CANDLE,
+    **{f'sma_{p}': 2510.123456789 + p for p in (7, 14, 21, 60)},
+    **{f'ema_{p}': 2511.987654321 + p for p in (7, 14, 21, 60)},
+    **{f'rsi_{p}': 51.23456789 + p for p in (7, 14, 21, 60)},
+    'macd_7': 1.23456789,
+    'macdsignal_7': 0.98765432,
+    'macdhist_7': 0.24691357,
+    'obv': 1234.56789,
+}
+
+PAYLOADS = {
+    'trades': (TRADE, Trade),
+    'candles': (CANDLE, Candle),
+    'technical_indicators': (TECHNICAL_INDICATORS, Any),
+}
+
+
+def messages_per_second(func: Callable[[Any], Any], value: Any) -> float:
+    start = time.perf_counter()
+    for _ in range(N_MESSAGES):
+        func(value)
+    return N_MESSAGES / (time.perf_counter() - start)
+
+
+def get_codecs(schema: Any) -> Dict[str, tuple]:
+    """
+    The (encode, decode) functions to compare, called the way quixstreams calls them.
+    """
+    ctx = SerializationContext(topic='benchmark', field=MessageField.VALUE)
+    # 'json' is what quixstreams resolves `value_serializer='json'` to (orjson)
+    json_serializer, json_deserializer = JSONSerializer(), JSONDeserializer()
+    msgspec_serializer = get_serializer('msgspec')
+    msgspec_deserializer = get_deserializer('msgspec', schema=schema)
+    codecs = {
+        'stdlib json': (lambda v: json.dumps(v).encode(), json.loads),
+        'json': (
+            lambda v: json_serializer(v, ctx),
+            lambda v: json_deserializer(v, ctx),
+        ),
+        'msgspec': (
+            lambda v: msgspec_serializer(v, ctx),
+            lambda v: msgspec_deserializer(v, ctx),
+        ),
+    }
+    # The binary records only exist for trades and candles
+    if schema is not Any:
+        binary_serializer = get_serializer('binary', schema=schema)
+        binary_deserializer = get_deserializer('binary', schema=schema)
+        codecs['binary'] = (
+            lambda v: binary_serializer(v, ctx),
+            lambda v: binary_deserializer(v, ctx),
+        )
+    return codecs
+
+
+if __name__ == '__main__':
+    print(
+        f'{"payload":<22}{"serializer":<14}{"bytes/msg":>10}'
+        f'{"encode msg/s":>16}{"decode msg/s":>16}{"decode us/msg":>15}'
+    )
+    for payload_name, (value, schema) in PAYLOADS.items():
+        for codec_name, (encode, decode) in get_codecs(schema).items():
+            encoded = encode(value)
+            decoded = decode(encoded)
+            # The binary trades don't carry the redundant ISO timestamp string
+            assert decoded == {k: v for k, v in value.items() if k in decoded}
+            decode_rate = messages_per_second(decode, encoded)
+            print(
+                f'{payload_name:<22}{codec_name:<14}{len(encoded):>10}'
+                f'{messages_per_second(encode, value):>16,.0f}'
+                f'{decode_rate:>16,.0f}{1e6 / decode_rate:>15.2f}'
+            )
@@ -0,0 +1,165 @@
+"""
+Benchmark of the technical indicators engines, in candles per second on a single
+core: talib recomputing every indicator over the candles in the state, against the
+incremental engine. Also checks the incremental values against talib over the
+whole series.
+
+Usage:
+    uv run benchmarks/ti_indicators.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import talib
+from quixstreams.utils.json import dumps, loads
+
+SERVICES_DIR = os.path.join(os.path.dirname(__file__), '..', 'services')
+sys.path.insert(0, os.path.join(SERVICES_DIR, 'technical_indicators', 'src'))
+
+from technical_indicators.candle import CandleBuffer  # noqa: E402
+from technical_indicators.config import IndicatorConfig  # noqa: E402
+from technical_indicators.incremental import IncrementalIndicators  # noqa: E402
+
+N_WINDOWS = 5_000
+# candle updates per window, as with the 'current' emission policy
+UPDATES_PER_WINDOW = 4
+MAX_CANDLES_IN_STATE = 100
+SMA_PERIODS = [7, 14, 21, 60]
+EMA_PERIODS = [7, 14, 21, 60]
+RSI_PERIODS = [7, 14, 21, 60]
+MACD_PERIODS = [(7, 14, 9)]
+INDICATORS = (
+    [IndicatorConfig(type='sma', period=period) for period in SMA_PERIODS]
+    + [IndicatorConfig(type='ema', period=period) for period in EMA_PERIODS]
+    + [IndicatorConfig(type='rsi', period=period) for period in RSI_PERIODS]
+    + [
+        IndicatorConfig(
+            type='macd', fast_period=fast, slow_period=slow, signal_period=signal
+        )
+        for fast, slow, signal in MACD_PERIODS
+    ]
+    + [IndicatorConfig(type='obv')]
+)
+
+
+class DictState:
+    """
+    In-memory state, values are JSON encoded like in the quixstreams stores.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        value = self.data.get(key)
+        return default if value is None else loads(value)
+
+    def set(self, key, value):
+        self.data[key] = dumps(value)
+
+    def get_bytes(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set_bytes(self, key, value):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def candles(close: np.ndarray, volume: np.ndarray):
+    rng = np.random.default_rng(2)
+    for i in range(N_WINDOWS):
+        for j in range(UPDATES_PER_WINDOW):
+            last = j == UPDATES_PER_WINDOW - 1
+            yield {
+                'pair': 'ETH/EUR',
+                'open': close[i],
+                'high': close[i],
+                'low': close[i],
+                'close': close[i] if last else close[i] + rng.normal(),
+                'volume': volume[i] if last else rng.random(),
+                'window_start_ms': i * 60000,
+                'window_end_ms': (i + 1) * 60000,
+                'candle_seconds': 60,
+            }
+
+
+def talib_recompute(candle: dict, buffer: CandleBuffer, state: DictState) -> dict:
+    # what the 'talib' engine does per message: update the state, then run every
+    # indicator over the candles in it
+    buffer.push(candle, state)
+    close = buffer.column('close')
+    volume = buffer.column('volume')
+    indicators = {}
+    for period in SMA_PERIODS:
+        indicators[f'sma_{period}'] = talib.SMA(close, period)[-1]
+    for period in EMA_PERIODS:
+        indicators[f'ema_{period}'] = talib.EMA(close, period)[-1]
+    for period in RSI_PERIODS:
+        indicators[f'rsi_{period}'] = talib.RSI(close, period)[-1]
+    for fast, slow, signal in MACD_PERIODS:
+        macd, macdsignal, macdhist = talib.MACD(close, fast, slow, signal)
+        indicators[f'macd_{fast}'] = macd[-1]
+        indicators[f'macdsignal_{fast}'] = macdsignal[-1]
+        indicators[f'macdhist_{fast}'] = macdhist[-1]
+    indicators['obv'] = talib.OBV(close, volume)[-1]
+    return {**candle, **indicators}
+
+
+def main():
+    rng = np.random.default_rng(0)
+    close = np.cumsum(rng.normal(0, 1, N_WINDOWS)) + 2500
+    volume = rng.random(N_WINDOWS)
+    n_messages = N_WINDOWS * UPDATES_PER_WINDOW
+
+    state = DictState()
+    buffer = CandleBuffer.from_state(state, MAX_CANDLES_IN_STATE)
+    start = time.perf_counter()
+    for candle in candles(close, volume):
+        talib_recompute(candle, buffer, state)
+    elapsed = time.perf_counter() - start
+    print(f'talib recompute: {n_messages / elapsed:>10.0f} candles/sec')
+
+    state = DictState()
+    engine = IncrementalIndicators(INDICATORS)
+    outputs = []
+    start = time.perf_counter()
+    for candle in candles(close, volume):
+        outputs.append(engine(candle, state))
+    elapsed = time.perf_counter() - start
+    print(f'incremental:     {n_messages / elapsed:>10.0f} candles/sec')
+
+    # the last update of each window is the closed candle
+    closed = outputs[UPDATES_PER_WINDOW - 1 :: UPDATES_PER_WINDOW]
+    reference = {}
+    for period in SMA_PERIODS:
+        reference[f'sma_{period}'] = talib.SMA(close, period)
+    for period in EMA_PERIODS:
+        reference[f'ema_{period}'] = talib.EMA(close, period)
+    for period in RSI_PERIODS:
+        reference[f'rsi_{period}'] = talib.RSI(close, period)
+    for fast, slow, signal in MACD_PERIODS:
+        (
+            reference[f'macd_{fast}'],
+            reference[f'macdsignal_{fast}'],
+            reference[f'macdhist_{fast}'],
+        ) = talib.MACD(close, fast, slow, signal)
+    reference['obv'] = talib.OBV(close, volume)
+    max_error = 0.0
+    for name, expected in reference.items():
+        values = np.array([output[name] for output in closed])
+        defined = ~np.isnan(expected)
+        assert np.array_equal(defined, ~np.isnan(values)), name
+        error = np.abs(values[defined] - expected[defined]) / np.maximum(
+            np.abs(expected[defined]), 1.0
+        )
+        max_error = max(max_error, error.max())
+    print(f'max relative error against talib over the whole series: {max_error:.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark of the technical indicators candle state, the former list of candle
+dicts against the ring buffer, for several `max_candles_in_state`. Reports the
+bytes written to the state per candle and the time per candle to update the state
+and get the close prices as a numpy array.
+
+Usage:
+    uv run benchmarks/ti_state.py
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+SERVICES_DIR = os.path.join(os.path.dirname(__file__), '..', 'services')
+sys.path.insert(0, os.path.join(SERVICES_DIR, 'technical_indicators', 'src'))
+
+from technical_indicators.candle import CandleBuffer  # noqa: E402
+
+N_CANDLES = 5_000
+# candle updates per window, as with the 'current' emission policy
+UPDATES_PER_WINDOW = 5
+
+
+class CountingState:
+    """
+    In-memory state counting the bytes written, values are JSON encoded like in the
+    quixstreams stores.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.bytes_written = 0
+
+    def get(self, key, default=None):
+        value = self.data.get(key)
+        return default if value is None else json.loads(value)
+
+    def set(self, key, value):
+        encoded = json.dumps(value).encode()
+        self.bytes_written += len(encoded)
+        self.data[key] = encoded
+
+    def get_bytes(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set_bytes(self, key, value):
+        self.bytes_written += len(value)
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def candles():
+    for i in range(N_CANDLES):
+        window_start_ms = 1745494500000 + i // UPDATES_PER_WINDOW * 60000
+        yield {
+            'pair': 'ETH/EUR',
+            'open': 2514.37,
+            'high': 2519.02,
+            'low': 2511.8,
+            'close': 2517.45 + i % 7,
+            'volume': 12.83462118,
+            'window_start_ms': window_start_ms,
+            'window_end_ms': window_start_ms + 60000,
+            'candle_seconds': 60,
+        }
+
+
+def list_state(max_candles: int, state: CountingState) -> None:
+    # the former update_candles_in_state and column extraction
+    for candle in candles():
+        history = state.get('candles', default=[])
+        if history and history[-1]['window_start_ms'] == candle['window_start_ms']:
+            history[-1] = candle
+        else:
+            history.append(candle)
+        if len(history) > max_candles:
+            history.pop(0)
+        state.set('candles', history)
+        np.array([c['close'] for c in history], dtype=np.float64)
+
+
+def ring_buffer_state(max_candles: int, state: CountingState) -> None:
+    buffer = CandleBuffer.from_state(state, max_candles)
+    for candle in candles():
+        buffer.push(candle, state)
+        buffer.column('close')
+
+
+def main():
+    for max_candles in (100, 1000, 5000):
+        for name, run in (('list', list_state), ('ring buffer', ring_buffer_state)):
+            state = CountingState()
+            start = time.perf_counter()
+            run(max_candles, state)
+            elapsed = time.perf_counter() - start
+            print(
+                f'max_candles_in_state={max_candles:>5} {name:>12}: '
+                f'{state.bytes_written / N_CANDLES:>10.0f} bytes/candle '
+                f'{elapsed / N_CANDLES * 1e6:>10.1f} us/candle'
+            )
+
+
+if __name__ == '__main__':
+    main()
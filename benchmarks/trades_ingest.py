@@ -0,0 +1,150 @@
+"""
+Micro-benchmark of the trades ingest hot path: from raw Kraken payloads to the JSON
+bytes produced to Kafka, on a single core.
+
+It compares the previous path (one pydantic `Trade` per trade, datetime round-trips
+and `model_dump`) with the columnar `TradeBatch` path.
+
+Usage:
+    uv run benchmarks/trades_ingest.py
+"""
+
+import datetime
+import os
+import random
+import sys
+import time
+from typing import Callable, List
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(__file__), '..', 'services', 'trades', 'src', 'trades'
+    ),
+)
+
+from quixstreams.utils.json import dumps  # noqa: E402
+from serializers import get_batch_serializer  # noqa: E402
+from trade import Trade, TradeBatch  # noqa: E402
+
+N_TRADES = 200_000
+N_REPEATS = 5
+encode_batch = get_batch_serializer('json')
+
+
+def _legacy_unix_seconds_to_iso_format(timestamp_sec: float) -> str:
+    dt = datetime.datetime.fromtimestamp(timestamp_sec, tz=datetime.timezone.utc)
+    return dt.isoformat().replace('+00:00', 'Z')
+
+
+def _legacy_iso_format_to_unix_seconds(iso_format: str) -> float:
+    return datetime.datetime.fromisoformat(iso_format).timestamp()
+
+
+def make_rest_rows(n: int) -> List[list]:
+    start = time.time() - 60 * 60 * 24
+    return [
+        [
+            f'{2500 + random.random() * 10:.2f}',
+            f'{random.random():.8f}',
+            start + i * 0.01,
+            'b',
+            'l',
+            '',
+            i,
+        ]
+        for i in range(n)
+    ]
+
+
+def make_websocket_trades(n: int) -> List[dict]:
+    start = time.time() - 60 * 60 * 24
+    return [
+        {
+            'symbol': 'ETH/EUR',
+            'side': 'buy',
+            'price': 2500 + random.random() * 10,
+            'qty': random.random(),
+            'ord_type': 'limit',
+            'trade_id': i,
+            'timestamp': _legacy_unix_seconds_to_iso_format(start + i * 0.01 + 1e-6),
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_rest(rows: List[list]) -> List[bytes]:
+    trades = [
+        Trade(
+            product_id='ETH/EUR',
+            price=row[0],
+            quantity=row[1],
+            timestamp=_legacy_unix_seconds_to_iso_format(row[2]),
+            timestamp_ms=int(row[2] * 1000),
+            side='buy' if row[3] == 'b' else 'sell',
+        )
+        for row in rows
+    ]
+    return [dumps(trade.model_dump()) for trade in trades]
+
+
+def batch_rest(rows: List[list]) -> List[bytes]:
+    batch = TradeBatch.from_kraken_rest_api_response('ETH/EUR', rows)
+    return encode_batch(batch)
+
+
+def legacy_websocket(trades_data: List[dict]) -> List[bytes]:
+    trades = [
+        Trade(
+            product_id=trade['symbol'],
+            price=float(trade['price']),
+            quantity=float(trade['qty']),
+            timestamp=trade['timestamp'],
+            timestamp_ms=int(
+                _legacy_iso_format_to_unix_seconds(trade['timestamp']) * 1000
+            ),
+            side=trade['side'],
+        )
+        for trade in trades_data
+    ]
+    return [dumps(trade.model_dump()) for trade in trades]
+
+
+def batch_websocket(trades_data: List[dict]) -> List[bytes]:
+    batch = TradeBatch.from_kraken_websocket_response(trades_data)
+    return encode_batch(batch)
+
+
+def trades_per_second(func: Callable, payload: list) -> float:
+    """
+    Best of `N_REPEATS` runs, in trades per second.
+    """
+    best = float('inf')
+    for _ in range(N_REPEATS):
+        start = time.perf_counter()
+        func(payload)
+        best = min(best, time.perf_counter() - start)
+    return len(payload) / best
+
+
+if __name__ == '__main__':
+    rest_rows = make_rest_rows(N_TRADES)
+    websocket_trades = make_websocket_trades(N_TRADES)
+
+    # Both paths must produce the same messages
+    assert legacy_rest(rest_rows[:1000]) == batch_rest(rest_rows[:1000])
+    assert legacy_websocket(websocket_trades[:1000]) == batch_websocket(
+        websocket_trades[:1000]
+    )
+
+    print(f'{"path":<12}{"before":>16}{"after":>16}{"speedup":>10}')
+    for name, before, after, payload in [
+        ('rest', legacy_rest, batch_rest, rest_rows),
+        ('websocket', legacy_websocket, batch_websocket, websocket_trades),
+    ]:
+        before_tps = trades_per_second(before, payload)
+        after_tps = trades_per_second(after, payload)
+        print(
+            f'{name:<12}{before_tps:>12,.0f} t/s{after_tps:>12,.0f} t/s'
+            f'{after_tps / before_tps:>9.1f}x'
+        )
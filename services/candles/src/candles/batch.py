@@ -0,0 +1,373 @@
+"""
+Builds the candles of a whole trade history in one vectorized pass, instead of
+replaying it through Kafka and the streaming candles service, then exits.
+
+    # from a trades archive (.parquet, .csv or .jsonl) to a candles file
+    uv run services/candles/src/candles/batch.py from_file \\
+        --trades_path=trades.parquet --output_path=candles.parquet \\
+        --candle_seconds=60
+
+    # from the trades topic, up to its current end, to the candles topic
+    uv run services/candles/src/candles/batch.py from_topic \\
+        --kafka_broker_address=localhost:31234 \\
+        --kafka_input_topic=trades_historical --kafka_output_topic=candles_historical \\
+        --candle_seconds=60
+
+The candles are the closed candles of the streaming service: same aggregates,
+open and close following the trade timestamps, optional gap filling and rollup.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from common.batch import read_file, read_topic, write_file
+from common.serializers import BinaryDeserializer
+from fire import Fire
+from loguru import logger
+from quixstreams import Application
+
+from candles.serializers import (
+    Candle,
+    SerializerName,
+    decode_binary,
+    get_serializer,
+)
+
+CANDLE_COLUMNS = [
+    'pair',
+    'open',
+    'high',
+    'low',
+    'close',
+    'volume',
+    'window_start_ms',
+    'window_end_ms',
+    'candle_seconds',
+    'trade_count',
+    'vwap',
+    'buy_volume',
+    'sell_volume',
+    'first_trade_ms',
+    'last_trade_ms',
+]
+
+
+def read_trades_topic(
+    kafka_broker_address: str, kafka_input_topic: str
+) -> pd.DataFrame:
+    """
+    Reads the trades topic from its beginning up to its end offsets at the time of
+    the call. JSON, msgspec and binary messages are all decoded.
+
+    Args:
+        kafka_broker_address (str): Address of the Kafka broker.
+        kafka_input_topic (str): Name of the Kafka topic to read trades from.
+
+    Returns:
+        pd.DataFrame: The trades
+    """
+    columns: Dict[str, list] = {
+        'product_id': [],
+        'price': [],
+        'quantity': [],
+        'timestamp_ms': [],
+        'side': [],
+    }
+    for trade in read_topic(
+        kafka_broker_address,
+        kafka_input_topic,
+        BinaryDeserializer(decode_binary),
+        consumer_group_prefix='candles-batch',
+    ):
+        for key, values in columns.items():
+            values.append(trade.get(key))
+    return pd.DataFrame(columns)
+
+
+def _trades_as_candles(trades: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turns every trade into a candle of its own, so trades and candles are aggregated
+    the same way.
+    """
+    price = trades['price'].astype('float64')
+    quantity = trades['quantity'].astype('float64')
+    timestamp_ms = trades['timestamp_ms'].astype('int64')
+    side = trades['side'] if 'side' in trades else pd.Series(None, index=trades.index)
+    return pd.DataFrame(
+        {
+            'pair': trades['product_id'],
+            'open': price,
+            'high': price,
+            'low': price,
+            'close': price,
+            'volume': quantity,
+            'window_start_ms': timestamp_ms,
+            'trade_count': 1,
+            'vwap': price,
+            'buy_volume': quantity.where(side == 'buy', 0.0),
+            'sell_volume': quantity.where(side == 'sell', 0.0),
+            'first_trade_ms': timestamp_ms,
+            'last_trade_ms': timestamp_ms,
+        }
+    )
+
+
+def _aggregate(
+    candles: pd.DataFrame, candle_seconds: int, from_trades: bool = False
+) -> pd.DataFrame:
+    """
+    Merges the candles of each pair into `candle_seconds` candles, with the semantics
+    of `merge_candles`, or the trades with the ones of `update_candle`.
+    """
+    window_ms = candle_seconds * 1000
+    # a stable sort keeps the arrival order of the trades with the same timestamp,
+    # like the streaming candles do
+    candles = candles.sort_values(
+        ['pair', 'window_start_ms', 'first_trade_ms'], kind='stable'
+    )
+    candles = candles.assign(
+        window_start_ms=candles['window_start_ms'] // window_ms * window_ms,
+        notional=candles['vwap'] * candles['volume'],
+    )
+    aggregated = (
+        candles.groupby(['pair', 'window_start_ms'], sort=True)
+        .agg(
+            open=('open', 'first'),
+            high=('high', 'max'),
+            low=('low', 'min'),
+            close=('close', 'last'),
+            volume=('volume', 'sum'),
+            trade_count=('trade_count', 'sum'),
+            notional=('notional', 'sum'),
+            # the vwap without volume: `update_candle` keeps the one of the first
+            # trade, `merge_candles` takes the one of the last candle
+            fallback_vwap=('vwap', 'first' if from_trades else 'last'),
+            buy_volume=('buy_volume', 'sum'),
+            sell_volume=('sell_volume', 'sum'),
+            first_trade_ms=('first_trade_ms', 'min'),
+            last_trade_ms=('last_trade_ms', 'max'),
+        )
+        .reset_index()
+    )
+    volume = aggregated['volume']
+    aggregated['vwap'] = np.where(
+        volume > 0,
+        aggregated['notional'] / volume.where(volume > 0, 1.0),
+        aggregated['fallback_vwap'],
+    )
+    aggregated['window_end_ms'] = aggregated['window_start_ms'] + window_ms
+    aggregated['candle_seconds'] = candle_seconds
+    return aggregated[CANDLE_COLUMNS]
+
+
+def _backfill_gaps(
+    candles: pd.DataFrame, candle_seconds: int, max_windows: int
+) -> pd.DataFrame:
+    """
+    Adds the flat candles of the empty windows, like `GapBackfill`.
+    """
+    window_ms = candle_seconds * 1000
+    next_start_ms = candles.groupby('pair')['window_start_ms'].shift(-1)
+    n_missing = (next_start_ms - candles['window_end_ms']) // window_ms
+    n_missing = n_missing.fillna(0).astype('int64')
+    n_missing = n_missing.where((n_missing > 0) & (n_missing <= max_windows), 0)
+    if not n_missing.any():
+        return candles
+
+    previous = candles.loc[candles.index.repeat(n_missing)]
+    # position of every flat candle within its gap
+    counts = n_missing[n_missing > 0].to_numpy()
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    close = previous['close']
+    flat = previous.assign(
+        open=close,
+        high=close,
+        low=close,
+        volume=0.0,
+        window_start_ms=previous['window_end_ms'] + offsets * window_ms,
+        trade_count=0,
+        vwap=close,
+        buy_volume=0.0,
+        sell_volume=0.0,
+        first_trade_ms=previous['last_trade_ms'],
+    )
+    flat['window_end_ms'] = flat['window_start_ms'] + window_ms
+    return (
+        pd.concat([candles, flat], ignore_index=True)
+        .sort_values(['pair', 'window_start_ms'], kind='stable')
+        .reset_index(drop=True)
+    )
+
+
+def build_candles(
+    trades: pd.DataFrame,
+    candle_seconds: int,
+    rollup_candle_seconds: Optional[List[int]] = None,
+    backfill_gaps: bool = False,
+    max_gap_backfill_windows: int = 1440,
+) -> pd.DataFrame:
+    """
+    Aggregates trades into the closed candles of every resolution.
+
+    Args:
+        trades (pd.DataFrame): The trades, with product_id, price, quantity,
+            timestamp_ms and optionally side columns.
+        candle_seconds (int): Duration of each candle in seconds.
+        rollup_candle_seconds (List[int]): Durations of the coarser candles, in
+            seconds, all multiples of `candle_seconds`.
+        backfill_gaps (bool): Whether to add flat candles for the windows without
+            trades between two candles of a pair.
+        max_gap_backfill_windows (int): Longest gap, in windows, to backfill.
+
+    Returns:
+        pd.DataFrame: The candles, in the order of their windows
+    """
+    rollup_candle_seconds = sorted(set(rollup_candle_seconds or []))
+    for seconds in rollup_candle_seconds:
+        if seconds <= candle_seconds or seconds % candle_seconds:
+            raise ValueError(
+                f'Cannot roll {candle_seconds}s candles up into {seconds}s candles: '
+                'it must be a larger multiple.'
+            )
+
+    candles = _aggregate(_trades_as_candles(trades), candle_seconds, from_trades=True)
+    if backfill_gaps:
+        candles = _backfill_gaps(candles, candle_seconds, max_gap_backfill_windows)
+
+    # the coarser candles are rolled up from the base ones, as in the streaming
+    # service, so the filled windows are part of them. A coarse window not covered
+    # by the base candles of its pair is still open, and left out like the streaming
+    # service only emits the closed ones.
+    resolutions = [candles]
+    last_end_ms = candles.groupby('pair')['window_end_ms'].max()
+    for seconds in rollup_candle_seconds:
+        coarse = _aggregate(candles, seconds)
+        closed = coarse['window_end_ms'] <= coarse['pair'].map(last_end_ms)
+        resolutions.append(coarse[closed])
+
+    return (
+        pd.concat(resolutions, ignore_index=True)
+        .sort_values(['window_end_ms', 'candle_seconds', 'pair'], kind='stable')
+        .reset_index(drop=True)
+    )
+
+
+def produce_candles(
+    candles: pd.DataFrame,
+    kafka_broker_address: str,
+    kafka_output_topic: str,
+    kafka_output_serializer: SerializerName = 'json',
+) -> None:
+    """
+    Produces the candles to the candles topic, keyed by pair like the streaming
+    service, and timestamped with their window start.
+    """
+    app = Application(broker_address=kafka_broker_address)
+    topic = app.topic(
+        name=kafka_output_topic,
+        value_serializer=get_serializer(kafka_output_serializer, schema=Candle),
+    )
+    start = time.monotonic()
+    with app.get_producer() as producer:
+        for candle in candles.to_dict(orient='records'):
+            message = topic.serialize(key=candle['pair'], value=candle)
+            producer.produce(
+                topic=topic.name,
+                key=message.key,
+                value=message.value,
+                timestamp=candle['window_start_ms'],
+            )
+    logger.info(
+        f'Produced {len(candles)} candles to {kafka_output_topic} in '
+        f'{time.monotonic() - start:.1f}s'
+    )
+
+
+def from_file(
+    trades_path: str,
+    output_path: str,
+    candle_seconds: int,
+    rollup_candle_seconds: Optional[List[int]] = None,
+    backfill_gaps: bool = False,
+    max_gap_backfill_windows: int = 1440,
+):
+    """
+    Builds the candles of a trades archive into a candles file.
+
+    Args:
+        trades_path (str): The trades archive, .parquet, .csv or .jsonl.
+        output_path (str): The candles file, .parquet, .csv or .jsonl.
+        candle_seconds (int): Duration of each candle in seconds.
+        rollup_candle_seconds (List[int]): Durations of the coarser candles.
+        backfill_gaps (bool): Whether to add flat candles for the windows without
+            trades between two candles of a pair.
+        max_gap_backfill_windows (int): Longest gap, in windows, to backfill.
+    """
+    trades = read_file(trades_path)
+    start = time.monotonic()
+    candles = build_candles(
+        trades,
+        candle_seconds,
+        rollup_candle_seconds=rollup_candle_seconds,
+        backfill_gaps=backfill_gaps,
+        max_gap_backfill_windows=max_gap_backfill_windows,
+    )
+    logger.info(
+        f'Built {len(candles)} candles from {len(trades)} trades in '
+        f'{time.monotonic() - start:.1f}s'
+    )
+    write_file(candles, output_path)
+
+
+def from_topic(
+    kafka_broker_address: str,
+    kafka_input_topic: str,
+    kafka_output_topic: str,
+    candle_seconds: int,
+    rollup_candle_seconds: Optional[List[int]] = None,
+    backfill_gaps: bool = False,
+    max_gap_backfill_windows: int = 1440,
+    kafka_output_serializer: SerializerName = 'json',
+    output_path: Optional[str] = None,
+):
+    """
+    Builds the candles of the trades topic, from its beginning to its current end,
+    and produces them to the candles topic (or writes them to `output_path`).
+
+    Args:
+        kafka_broker_address (str): Address of the Kafka broker.
+        kafka_input_topic (str): Name of the Kafka topic to read trades from.
+        kafka_output_topic (str): Name of the Kafka topic to write candles to.
+        candle_seconds (int): Duration of each candle in seconds.
+        rollup_candle_seconds (List[int]): Durations of the coarser candles.
+        backfill_gaps (bool): Whether to add flat candles for the windows without
+            trades between two candles of a pair.
+        max_gap_backfill_windows (int): Longest gap, in windows, to backfill.
+        kafka_output_serializer (str): Serializer of the candles topic.
+        output_path (str): A candles file to write instead of producing them.
+    """
+    trades = read_trades_topic(kafka_broker_address, kafka_input_topic)
+    start = time.monotonic()
+    candles = build_candles(
+        trades,
+        candle_seconds,
+        rollup_candle_seconds=rollup_candle_seconds,
+        backfill_gaps=backfill_gaps,
+        max_gap_backfill_windows=max_gap_backfill_windows,
+    )
+    logger.info(
+        f'Built {len(candles)} candles from {len(trades)} trades in '
+        f'{time.monotonic() - start:.1f}s'
+    )
+    if output_path:
+        write_file(candles, output_path)
+    else:
+        produce_candles(
+            candles, kafka_broker_address, kafka_output_topic, kafka_output_serializer
+        )
+
+
+if __name__ == '__main__':
+    Fire({'from_file': from_file, 'from_topic': from_topic})
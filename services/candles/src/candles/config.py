@@ -1,3 +1,5 @@
+from typing import List, Literal, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -12,6 +14,41 @@ class Settings(BaseSettings):
     kafka_output_topic: str
     kafka_consumer_group: str
     candle_seconds: int
+    # Coarser resolutions rolled up from the `candle_seconds` candles in the same pass
+    # over the trades, e.g. [300, 3600]. Each must be a multiple of `candle_seconds`.
+    rollup_candle_seconds: List[int] = []
+    # Which candle updates to produce: 'current' (one per trade), 'final' (closed
+    # candles only), 'throttle' (at most one every `emission_interval_ms` per pair and
+    # resolution) or 'close_move' (when the close moves by more than
+    # `emission_close_move`, relative). The closed candles are always produced.
+    emission_policy: Literal['current', 'final', 'throttle', 'close_move'] = 'current'
+    emission_interval_ms: int = 1000
+    emission_close_move: float = 0.001
+    stats_log_interval_sec: float = 60.0
+    # How long, in event time, a window stays open for the out of order trades
+    window_grace_ms: int = 0
+    # Trades arriving after their window closed are produced to this topic, if set
+    kafka_late_trades_topic: Optional[str] = None
+    # Whether to amend the closed candles with the late trades and produce them again,
+    # for the last `correction_max_windows` windows of each pair. The incremental
+    # technical indicators only take into account the amendments of the last closed
+    # window, the older ones are skipped with a warning. The coarser candles of
+    # `rollup_candle_seconds` are amended too, as long as `correction_max_windows`
+    # covers their whole window.
+    late_trades_correction: bool = False
+    correction_max_windows: int = 60
+    # Whether to backfill the windows without trades with flat candles (previous
+    # close, no volume, trade_count 0), up to `max_gap_backfill_windows` in a row.
+    # A gap is only backfilled when the next candle of the pair arrives: the empty
+    # windows after the latest candle of a quiet pair are not produced until it
+    # trades again. With a `window_grace_ms`, only with the 'final' emission policy,
+    # since the skipped window can still get trades when the next one starts
+    backfill_gaps: bool = False
+    max_gap_backfill_windows: int = 1440
+    # Value (de)serializer of each topic: 'json' (quixstreams default), 'msgspec' or
+    # 'binary' (compact struct-packed records, see serializers.py)
+    kafka_input_serializer: Literal['json', 'msgspec', 'binary'] = 'json'
+    kafka_output_serializer: Literal['json', 'msgspec', 'binary'] = 'json'
 
 
 config = Settings()
@@ -0,0 +1,125 @@
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Literal
+
+from loguru import logger
+from quixstreams import State
+
+# - 'current': every candle update, i.e. one message per trade
+# - 'final': only the closed candles
+# - 'throttle': at most one update every `interval_ms` per pair and resolution
+# - 'close_move': an update whenever the close moved by more than `close_move`
+#   (relative) since the last emitted update
+EmissionPolicy = Literal['current', 'final', 'throttle', 'close_move']
+
+
+class EmissionStats:
+    """
+    Counts the trades consumed and the candles emitted per resolution, and logs the
+    fan-out (candle messages per trade) every `log_interval_sec` seconds, so the
+    emission policies can be compared on the load they put downstream.
+    """
+
+    def __init__(self, log_interval_sec: float = 60.0):
+        self.log_interval_sec = log_interval_sec
+        self._trades = 0
+        self._emitted: Dict[int, int] = defaultdict(int)
+        self._last_log = time.monotonic()
+
+    def record_trade(self, trade: dict) -> None:
+        self._trades += 1
+
+    def record_emitted(self, candle: dict) -> None:
+        self._emitted[candle['candle_seconds']] += 1
+        self.maybe_log()
+
+    def maybe_log(self) -> None:
+        """
+        Logs and resets the counters if `log_interval_sec` has elapsed.
+        """
+        now = time.monotonic()
+        elapsed = now - self._last_log
+        if elapsed < self.log_interval_sec:
+            return
+
+        logger.info(f'Consumed {self._trades / elapsed:.1f} trades/sec')
+        for candle_seconds, n_emitted in sorted(self._emitted.items()):
+            logger.info(
+                f'{candle_seconds}s candles: {n_emitted / elapsed:.1f} emitted/sec, '
+                f'{n_emitted / max(self._trades, 1):.3f} messages per trade'
+            )
+        self._trades = 0
+        self._emitted.clear()
+        self._last_log = now
+
+
+class CandleThrottle:
+    """
+    Stateful filter of the intermediate candle updates, for the 'throttle' and
+    'close_move' emission policies.
+
+    A suppressed update is kept as pending in the state, and flushed before the first
+    update of the next window, so the last update of every window (the closed candle)
+    is always emitted.
+
+    The throttle interval is measured in wall clock time, since it bounds the message
+    rate downstream. A backfill therefore mostly emits the closed candles.
+    """
+
+    def __init__(
+        self,
+        policy: EmissionPolicy,
+        interval_ms: int = 1000,
+        close_move: float = 0.001,
+    ):
+        if policy not in ('throttle', 'close_move'):
+            raise ValueError(f'CandleThrottle does not implement policy {policy}')
+        self.policy = policy
+        self.interval_ms = interval_ms
+        self.close_move = close_move
+
+    def _should_emit(self, candle: dict, last: Dict[str, Any], now_ms: int) -> bool:
+        if self.policy == 'throttle':
+            return now_ms - last['emitted_at_ms'] >= self.interval_ms
+        last_close = last['close']
+        return abs(candle['close'] - last_close) > self.close_move * abs(last_close)
+
+    def __call__(self, candle: dict, state: State) -> List[dict]:
+        """
+        Args:
+            candle (dict): The latest update of a candle.
+            state (State): The state of the pair.
+
+        Returns:
+            List[dict]: The candles to emit, possibly none
+        """
+        now_ms = int(time.time() * 1000)
+        # state is stored as JSON, so the resolutions are string keys
+        key = str(candle['candle_seconds'])
+        throttle_state = state.get('throttle') or {}
+        last = throttle_state.get(key)
+
+        candles = []
+        if last is None:
+            emit = True
+        elif candle['window_start_ms'] != last['window_start_ms']:
+            # a new window: flush the last update of the previous one
+            if last['pending'] is not None:
+                candles.append(last['pending'])
+            emit = True
+        else:
+            emit = self._should_emit(candle, last, now_ms)
+
+        if emit:
+            candles.append(candle)
+            last = {
+                'window_start_ms': candle['window_start_ms'],
+                'emitted_at_ms': now_ms,
+                'close': candle['close'],
+                'pending': None,
+            }
+        else:
+            last['pending'] = candle
+        throttle_state[key] = last
+        state.set('throttle', throttle_state)
+        return candles
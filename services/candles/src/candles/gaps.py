@@ -0,0 +1,82 @@
+from typing import List
+
+from quixstreams import State
+
+
+class GapBackfill:
+    """
+    Backfills the windows without any trade with flat candles when the next candle of
+    the pair arrives, so every pair has a dense series of candles downstream.
+
+    The state holds the latest candle of each pair, which acts as the event time
+    watermark of the pair: when a candle of a later window arrives, a flat candle at
+    the previous close, with no volume and no trade, is emitted first for each of the
+    windows skipped in between. At most `max_windows` are filled per gap, a longer
+    gap (e.g. a pair delisted for a while) is left as is.
+
+    Nothing is emitted for a pair until its next candle: the empty windows after the
+    latest candle of a pair that stopped trading stay missing meanwhile, since the
+    state of a pair is only reachable from its own messages.
+
+    The synthetic candles can be told apart by their `trade_count` of 0.
+
+    A skipped window is filled as soon as a later one shows up, so the windows must
+    be closed by then: with a grace period, the candles must be the final ones.
+    """
+
+    def __init__(self, candle_seconds: int, max_windows: int = 1440):
+        self.window_ms = candle_seconds * 1000
+        self.max_windows = max_windows
+
+    def _flat_candle(self, previous: dict, window_start_ms: int) -> dict:
+        close = previous['close']
+        return {
+            **previous,
+            'open': close,
+            'high': close,
+            'low': close,
+            'close': close,
+            'volume': 0.0,
+            'window_start_ms': window_start_ms,
+            'window_end_ms': window_start_ms + self.window_ms,
+            'trade_count': 0,
+            'vwap': close,
+            'buy_volume': 0.0,
+            'sell_volume': 0.0,
+            # no trade in the window, these point at the trade of the close
+            'first_trade_ms': previous['last_trade_ms'],
+            'last_trade_ms': previous['last_trade_ms'],
+        }
+
+    def __call__(self, candle: dict, state: State) -> List[dict]:
+        """
+        Args:
+            candle (dict): The latest update of the current candle of a pair.
+            state (State): The state of the pair.
+
+        Returns:
+            List[dict]: The flat candles of the empty windows before `candle`, if any,
+                followed by `candle`
+        """
+        previous = state.get('last_candle')
+        if (
+            previous is not None
+            and candle['window_start_ms'] < previous['window_start_ms']
+        ):
+            return [candle]
+        state.set('last_candle', candle)
+        if previous is None:
+            return [candle]
+
+        n_missing = (
+            candle['window_start_ms'] - previous['window_end_ms']
+        ) // self.window_ms
+        if n_missing <= 0 or n_missing > self.max_windows:
+            return [candle]
+
+        candles = [
+            self._flat_candle(previous, previous['window_end_ms'] + i * self.window_ms)
+            for i in range(n_missing)
+        ]
+        candles.append(candle)
+        return candles
@@ -0,0 +1,184 @@
+import bisect
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+from quixstreams import State
+
+from candles.rollup import CandleRollup
+
+
+class LateTradeStats:
+    """
+    Counts the late trades per pair, and what happened to them, and logs a summary
+    every `log_interval_sec` seconds.
+    """
+
+    def __init__(self, log_interval_sec: float = 60.0):
+        self.log_interval_sec = log_interval_sec
+        self._late: Dict[str, int] = defaultdict(int)
+        self.corrected = 0
+        self.uncorrected = 0
+        self._last_log = time.monotonic()
+
+    def record_late(self, trade: dict) -> None:
+        self._late[trade['product_id']] += 1
+        self.maybe_log()
+
+    def maybe_log(self) -> None:
+        """
+        Logs and resets the counters if `log_interval_sec` has elapsed.
+        """
+        now = time.monotonic()
+        if now - self._last_log < self.log_interval_sec:
+            return
+
+        for product_id, n_late in sorted(self._late.items()):
+            logger.info(f'{product_id}: {n_late} late trades')
+        if self.corrected or self.uncorrected:
+            logger.info(
+                f'Corrected {self.corrected} closed candles, '
+                f'{self.uncorrected} late trades were too old to correct them'
+            )
+        self._late.clear()
+        self.corrected = 0
+        self.uncorrected = 0
+        self._last_log = now
+
+
+class LateTrades:
+    """
+    Flags the trades whose window is already closed, before they reach the window.
+
+    It follows the same rule as the quixstreams tumbling windows: a window of a pair
+    is closed once the latest trade timestamp of the pair passes the window end plus
+    the grace period. Late trades get a `late_by_ms` field, instead of being dropped
+    by the window with a warning, so they can be routed to a side output.
+    """
+
+    def __init__(
+        self,
+        candle_seconds: int,
+        grace_ms: int = 0,
+        stats: Optional[LateTradeStats] = None,
+    ):
+        self.window_ms = candle_seconds * 1000
+        self.grace_ms = grace_ms
+        self.stats = stats or LateTradeStats()
+
+    def __call__(self, trade: dict, state: State) -> dict:
+        timestamp_ms = trade['timestamp_ms']
+        latest_ms = state.get('latest_trade_ms', 0)
+        if timestamp_ms > latest_ms:
+            state.set('latest_trade_ms', timestamp_ms)
+            return trade
+
+        window_end_ms = timestamp_ms // self.window_ms * self.window_ms + self.window_ms
+        closed_until_ms = latest_ms - self.grace_ms
+        if window_end_ms > closed_until_ms:
+            return trade
+
+        self.stats.record_late(trade)
+        return {**trade, 'late_by_ms': closed_until_ms - timestamp_ms}
+
+
+class CandleCorrections:
+    """
+    Amends the closed candles with the late trades.
+
+    The last `max_windows` candles of each pair are kept in the state, each under its
+    own key so an update only rewrites one candle. A late trade within these windows
+    updates its candle with `reducer` (or creates it with `initializer` if the window
+    had no trade), and the amended candle is emitted again. RisingWave upserts it on
+    its primary key (pair, window_start_ms, window_end_ms).
+
+    With a `rollup`, the coarse candles containing the amended one are rebuilt from
+    the kept candles and emitted again too, as long as `max_windows` covers them.
+    """
+
+    def __init__(
+        self,
+        initializer: Callable[[dict], dict],
+        reducer: Callable[[dict, dict], dict],
+        candle_seconds: int,
+        max_windows: int = 60,
+        stats: Optional[LateTradeStats] = None,
+        rollup: Optional[CandleRollup] = None,
+    ):
+        self.initializer = initializer
+        self.reducer = reducer
+        self.candle_seconds = candle_seconds
+        self.window_ms = candle_seconds * 1000
+        self.max_windows = max_windows
+        self.stats = stats or LateTradeStats()
+        self.rollup = rollup
+
+    def remember(self, candle: dict, state: State) -> None:
+        """
+        Stores the latest update of a candle, to be used with `sdf.update`.
+        """
+        window_start_ms = candle['window_start_ms']
+        state.set(f'candle_{window_start_ms}', candle)
+
+        windows = state.get('candle_windows') or []
+        if windows and windows[-1] == window_start_ms:
+            return
+        windows.append(window_start_ms)
+        for expired_start_ms in windows[: -self.max_windows]:
+            state.delete(f'candle_{expired_start_ms}')
+        state.set('candle_windows', windows[-self.max_windows :])
+
+    def candles(self, start_ms: int, end_ms: int, state: State) -> Optional[List[dict]]:
+        """
+        Returns the kept candles from the window starting at `start_ms` until the one
+        starting at `end_ms` (excluded), or None if the first windows are no longer
+        kept.
+        """
+        windows = state.get('candle_windows') or []
+        if not windows or start_ms < windows[0]:
+            return None
+        return [
+            state.get(f'candle_{window_start_ms}')
+            for window_start_ms in windows
+            if start_ms <= window_start_ms < end_ms
+        ]
+
+    def amend(self, trade: dict, state: State) -> List[dict]:
+        """
+        Returns the closed candle of the late `trade`, amended with it, followed by
+        the amended coarse candles, or nothing if the window is older than the ones
+        kept in the state. To be used with `sdf.apply(..., expand=True)`.
+        """
+        window_start_ms = trade['timestamp_ms'] // self.window_ms * self.window_ms
+        candle = state.get(f'candle_{window_start_ms}')
+        if candle is not None and candle['trade_count'] > 0:
+            candle = self.reducer(candle, trade)
+        else:
+            windows = state.get('candle_windows') or []
+            if not windows or window_start_ms < windows[0]:
+                self.stats.uncorrected += 1
+                return []
+            # no trade landed in this window on time, it is missing or gap filled
+            if window_start_ms not in windows:
+                bisect.insort(windows, window_start_ms)
+                state.set('candle_windows', windows)
+            candle = {
+                **self.initializer(trade),
+                'window_start_ms': window_start_ms,
+                'window_end_ms': window_start_ms + self.window_ms,
+                'candle_seconds': self.candle_seconds,
+            }
+
+        state.set(f'candle_{window_start_ms}', candle)
+        self.stats.corrected += 1
+        if self.rollup is None:
+            return [candle]
+        return [
+            candle,
+            *self.rollup.amend(
+                candle,
+                lambda start_ms, end_ms: self.candles(start_ms, end_ms, state),
+                state,
+            ),
+        ]
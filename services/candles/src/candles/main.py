@@ -5,6 +5,18 @@ from loguru import logger
 from quixstreams import Application
 from quixstreams.models import TimestampType
 
+from candles.emission import CandleThrottle, EmissionPolicy, EmissionStats
+from candles.gaps import GapBackfill
+from candles.late import CandleCorrections, LateTrades, LateTradeStats
+from candles.rollup import CandleRollup
+from candles.serializers import (
+    Candle,
+    SerializerName,
+    Trade,
+    get_deserializer,
+    get_serializer,
+)
+
 
 def custom_ts_extractor(
     value: Any,
@@ -28,6 +40,7 @@ def init_candle(trade: dict) -> dict:
     Returns:
         dict: the initial candle state
     """
+    side = trade.get('side')
     return {
         'open': trade['price'],
         'high': trade['price'],
@@ -36,12 +49,20 @@ def init_candle(trade: dict) -> dict:
         'volume': trade['quantity'],
         # 'timestamp_ms': trade['timestamp_ms'],
         'pair': trade['product_id'],
+        'trade_count': 1,
+        'vwap': trade['price'],
+        'buy_volume': trade['quantity'] if side == 'buy' else 0.0,
+        'sell_volume': trade['quantity'] if side == 'sell' else 0.0,
+        'first_trade_ms': trade['timestamp_ms'],
+        'last_trade_ms': trade['timestamp_ms'],
     }
 
 
 def update_candle(candle: dict, trade: dict) -> dict:
     """Takes the current candle also known as the state and the new trade and update the candle state
 
+    Every aggregate is updated in O(1), without keeping the trades in the state.
+
     Args:
         candle (dict): the current candle state
         trade (dict): the new trade
@@ -49,11 +70,32 @@ def update_candle(candle: dict, trade: dict) -> dict:
     Returns:
         dict: the updated candle state
     """
-    # Open price does not change so there is no need to update it
-    candle['high'] = max(candle['high'], trade['price'])
-    candle['low'] = min(candle['low'], trade['price'])
-    candle['close'] = trade['price']
-    candle['volume'] += trade['quantity']
+    price = trade['price']
+    quantity = trade['quantity']
+    timestamp_ms = trade['timestamp_ms']
+    # trades can arrive slightly out of order, so open and close follow the trade
+    # timestamps rather than the arrival order
+    if timestamp_ms < candle['first_trade_ms']:
+        candle['open'] = price
+        candle['first_trade_ms'] = timestamp_ms
+    if timestamp_ms >= candle['last_trade_ms']:
+        candle['close'] = price
+        candle['last_trade_ms'] = timestamp_ms
+    candle['high'] = max(candle['high'], price)
+    candle['low'] = min(candle['low'], price)
+
+    volume = candle['volume'] + quantity
+    if volume > 0:
+        # running volume weighted average, no need to keep the sum of price * quantity
+        candle['vwap'] += (price - candle['vwap']) * quantity / volume
+    candle['volume'] = volume
+    candle['trade_count'] += 1
+
+    side = trade.get('side')
+    if side == 'buy':
+        candle['buy_volume'] += quantity
+    elif side == 'sell':
+        candle['sell_volume'] += quantity
 
     return candle
 
@@ -64,13 +106,27 @@ def run(
     kafka_output_topic: str,
     kafka_consumer_group: str,
     candle_seconds: int,
+    rollup_candle_seconds: Optional[List[int]] = None,
+    emission_policy: EmissionPolicy = 'current',
+    emission_interval_ms: int = 1000,
+    emission_close_move: float = 0.001,
+    stats_log_interval_sec: float = 60.0,
+    window_grace_ms: int = 0,
+    kafka_late_trades_topic: Optional[str] = None,
+    late_trades_correction: bool = False,
+    correction_max_windows: int = 60,
+    backfill_gaps: bool = False,
+    max_gap_backfill_windows: int = 1440,
+    kafka_input_serializer: SerializerName = 'json',
+    kafka_output_serializer: SerializerName = 'json',
 ):
     """
     Transforms a stream of input trades into a stream of output candles.
 
     In three steps:
     - Ingests trades from `kafka_input_topic`
-    - Aggregates trades into candles of `candle_sec` seconds
+    - Aggregates trades into candles of `candle_sec` seconds, and rolls them up into
+      candles of each of the `rollup_candle_seconds`
     - Produces candles to `kafka_output_topic`
     Args:
         kafka_broker_address (str): Address of the Kafka broker.
@@ -78,10 +134,38 @@ def run(
         kafka_output_topic (str): Name of the Kafka topic to write candles to.
         kafka_consumer_group (str): Kafka consumer group name.
         candle_seconds (int): Duration of each candle in seconds.
+        rollup_candle_seconds (List[int]): Durations of the coarser candles, in
+            seconds, all multiples of `candle_seconds`.
+        emission_policy (str): Which candle updates to produce, see config.py.
+        emission_interval_ms (int): Minimum interval between two updates of a
+            candle, with the 'throttle' policy.
+        emission_close_move (float): Minimum relative move of the close between two
+            updates of a candle, with the 'close_move' policy.
+        stats_log_interval_sec (float): How often to log the emission stats.
+        window_grace_ms (int): How long a window stays open for out of order trades,
+            in event time.
+        kafka_late_trades_topic (str): Name of the Kafka topic to write the trades
+            that arrived after their window closed to, if any.
+        late_trades_correction (bool): Whether to amend the closed candles with the
+            late trades, and produce them again.
+        correction_max_windows (int): How many closed candles per pair can still be
+            amended.
+        backfill_gaps (bool): Whether to produce flat candles for the windows without
+            trades, when the next candle of the pair arrives. Only with the 'final'
+            policy if `window_grace_ms` > 0.
+        max_gap_backfill_windows (int): Longest gap, in windows, to backfill.
+        kafka_input_serializer (str): Deserializer of the trades topic.
+        kafka_output_serializer (str): Serializer of the candles topic.
 
     Returns:
         None
     """
+    if backfill_gaps and window_grace_ms > 0 and emission_policy != 'final':
+        # the next window is emitted while the skipped one can still get trades,
+        # which would then come after its flat candle
+        raise ValueError(
+            "backfill_gaps with window_grace_ms > 0 needs the 'final' emission policy"
+        )
     app = Application(
         broker_address=kafka_broker_address,
         consumer_group=kafka_consumer_group,
@@ -89,27 +173,74 @@ def run(
     # Define the input topic
     trades_topic = app.topic(
         name=kafka_input_topic,
-        value_serializer='json',
+        value_deserializer=get_deserializer(kafka_input_serializer, schema=Trade),
         timestamp_extractor=custom_ts_extractor,
     )
     # Define the output topic
     candles_topic = app.topic(
         name=kafka_output_topic,
-        value_serializer='json',
+        value_serializer=get_serializer(kafka_output_serializer, schema=Candle),
     )
     # Step 1. Ingest trades from the input topic
     # Create a streaming dataframe connected to the input topic
     sdf = app.dataframe(topic=trades_topic)
+    stats = EmissionStats(log_interval_sec=stats_log_interval_sec)
+    sdf = sdf.update(stats.record_trade)
+
+    # Flag the trades whose window already closed, the window would drop them
+    late_stats = LateTradeStats(log_interval_sec=stats_log_interval_sec)
+    sdf = sdf.apply(
+        LateTrades(candle_seconds, grace_ms=window_grace_ms, stats=late_stats),
+        stateful=True,
+    )
+    rollup = (
+        CandleRollup(
+            candle_seconds,
+            rollup_candle_seconds,
+            emit_partial=emission_policy != 'final',
+        )
+        if rollup_candle_seconds
+        else None
+    )
+    corrections = CandleCorrections(
+        init_candle,
+        update_candle,
+        candle_seconds,
+        max_windows=correction_max_windows,
+        stats=late_stats,
+        rollup=rollup,
+    )
+    late_sdf = sdf[sdf.contains('late_by_ms')]
+    if kafka_late_trades_topic:
+        late_sdf.to_topic(
+            topic=app.topic(name=kafka_late_trades_topic, value_serializer='json')
+        )
+    if late_trades_correction:
+        # Amend the closed candles, and the coarser ones rolled up from them, and
+        # produce them again, downstream they replace the previous version with the
+        # same window. They are not throttled, like the other closed candles
+        late_sdf = late_sdf.apply(corrections.amend, stateful=True, expand=True)
+        late_sdf = late_sdf.update(stats.record_emitted)
+        late_sdf.to_topic(topic=candles_topic)
+    sdf = sdf[~sdf.contains('late_by_ms')]
 
     # Step 2. Aggregate trades into candles
     sdf = (
-        # Define tumbling window of candle_seconds
-        sdf.tumbling_window(timedelta(seconds=candle_seconds))
+        # Define tumbling window of candle_seconds, kept open `window_grace_ms` longer
+        # for the out of order trades
+        sdf.tumbling_window(
+            timedelta(seconds=candle_seconds),
+            grace_ms=timedelta(milliseconds=window_grace_ms),
+        )
         # Create a `reduce` aggregation with `reducer` and `initializer` functions
         .reduce(reducer=update_candle, initializer=init_candle)
     )
-    # emit all the intermediate candles to make the system more reactive
-    sdf = sdf.current()
+    if emission_policy == 'final':
+        sdf = sdf.final()
+    else:
+        # emit all the intermediate candles to make the system more reactive, they
+        # are thinned out below for the 'throttle' and 'close_move' policies
+        sdf = sdf.current()
     # Extract open, high, low, close, volume, timestamp_ms, pair from the dataframe
     sdf['open'] = sdf['value']['open']
     sdf['high'] = sdf['value']['high']
@@ -118,6 +249,12 @@ def run(
     sdf['volume'] = sdf['value']['volume']
     # sdf['timestamp_ms'] = sdf['value']['timestamp_ms']
     sdf['pair'] = sdf['value']['pair']
+    sdf['trade_count'] = sdf['value']['trade_count']
+    sdf['vwap'] = sdf['value']['vwap']
+    sdf['buy_volume'] = sdf['value']['buy_volume']
+    sdf['sell_volume'] = sdf['value']['sell_volume']
+    sdf['first_trade_ms'] = sdf['value']['first_trade_ms']
+    sdf['last_trade_ms'] = sdf['value']['last_trade_ms']
 
     # Extract window start and end timestamps
     sdf['window_start_ms'] = sdf['start']
@@ -135,11 +272,47 @@ def run(
             'volume',
             'window_start_ms',
             'window_end_ms',
+            'trade_count',
+            'vwap',
+            'buy_volume',
+            'sell_volume',
+            'first_trade_ms',
+            'last_trade_ms',
         ]
     ]
 
     sdf['candle_seconds'] = candle_seconds
 
+    if backfill_gaps:
+        # Dense series for the indicators downstream, the next candle of a pair
+        # backfills the empty windows since its previous one
+        sdf = sdf.apply(
+            GapBackfill(candle_seconds, max_windows=max_gap_backfill_windows),
+            stateful=True,
+            expand=True,
+        )
+
+    if late_trades_correction:
+        # keep the latest candles around for the late trades to amend them
+        sdf = sdf.update(corrections.remember, stateful=True)
+
+    # Roll the candles up into the coarser resolutions, instead of one consumer group
+    # per resolution re-reading the trades topic
+    if rollup is not None:
+        sdf = sdf.apply(rollup, stateful=True, expand=True)
+
+    if emission_policy in ('throttle', 'close_move'):
+        sdf = sdf.apply(
+            CandleThrottle(
+                emission_policy,
+                interval_ms=emission_interval_ms,
+                close_move=emission_close_move,
+            ),
+            stateful=True,
+            expand=True,
+        )
+    sdf = sdf.update(stats.record_emitted)
+
     # Print the data
     sdf = sdf.update(lambda message: logger.debug(f'Received trade: {message}'))
 
@@ -159,4 +332,17 @@ if __name__ == '__main__':
         kafka_output_topic=config.kafka_output_topic,
         kafka_consumer_group=config.kafka_consumer_group,
         candle_seconds=config.candle_seconds,
+        rollup_candle_seconds=config.rollup_candle_seconds,
+        emission_policy=config.emission_policy,
+        emission_interval_ms=config.emission_interval_ms,
+        emission_close_move=config.emission_close_move,
+        stats_log_interval_sec=config.stats_log_interval_sec,
+        window_grace_ms=config.window_grace_ms,
+        kafka_late_trades_topic=config.kafka_late_trades_topic,
+        late_trades_correction=config.late_trades_correction,
+        correction_max_windows=config.correction_max_windows,
+        backfill_gaps=config.backfill_gaps,
+        max_gap_backfill_windows=config.max_gap_backfill_windows,
+        kafka_input_serializer=config.kafka_input_serializer,
+        kafka_output_serializer=config.kafka_output_serializer,
     )
@@ -0,0 +1,205 @@
+from functools import reduce
+from typing import Callable, List, Optional
+
+from loguru import logger
+from quixstreams import State
+
+
+def merge_candles(first: dict, second: dict) -> dict:
+    """
+    Merges two consecutive candles of the same pair into one spanning both.
+
+    Args:
+        first (dict): The earlier candle.
+        second (dict): The later candle.
+
+    Returns:
+        dict: The merged candle
+    """
+    volume = first['volume'] + second['volume']
+    notional = first['vwap'] * first['volume'] + second['vwap'] * second['volume']
+    vwap = notional / volume if volume > 0 else second['vwap']
+    return {
+        'pair': first['pair'],
+        'open': first['open'],
+        'high': max(first['high'], second['high']),
+        'low': min(first['low'], second['low']),
+        'close': second['close'],
+        'volume': volume,
+        'window_start_ms': first['window_start_ms'],
+        'window_end_ms': second['window_end_ms'],
+        'candle_seconds': first['candle_seconds'],
+        'trade_count': first['trade_count'] + second['trade_count'],
+        'vwap': vwap,
+        'buy_volume': first['buy_volume'] + second['buy_volume'],
+        'sell_volume': first['sell_volume'] + second['sell_volume'],
+        'first_trade_ms': min(first['first_trade_ms'], second['first_trade_ms']),
+        'last_trade_ms': max(first['last_trade_ms'], second['last_trade_ms']),
+    }
+
+
+class CandleRollup:
+    """
+    Rolls the candles of the base resolution up into coarser resolutions, so a single
+    pass over the trades produces every resolution.
+
+    For every pair the state holds, per coarse resolution, the merge of the base
+    candles already closed in the current coarse window. Each base candle update is
+    then merged with it in O(1), and emitted along with one candle per resolution,
+    all tagged with their `candle_seconds`.
+
+    With `emit_partial=False` (the base candles are the closed ones), a coarse candle
+    is only emitted once closed, when the first base candle of the next coarse window
+    arrives.
+
+    A closed base candle amended by a late trade goes through `amend`, which rebuilds
+    the coarse candles containing it from the base candles kept for the corrections.
+    """
+
+    def __init__(
+        self,
+        base_candle_seconds: int,
+        candle_seconds_list: List[int],
+        emit_partial: bool = True,
+    ):
+        for candle_seconds in candle_seconds_list:
+            if candle_seconds <= base_candle_seconds or (
+                candle_seconds % base_candle_seconds
+            ):
+                raise ValueError(
+                    f'Cannot roll {base_candle_seconds}s candles up into '
+                    f'{candle_seconds}s candles: it must be a larger multiple.'
+                )
+        self.base_candle_seconds = base_candle_seconds
+        self.candle_seconds_list = sorted(set(candle_seconds_list))
+        self.emit_partial = emit_partial
+
+    @staticmethod
+    def _coarse_candle(candle: dict, window_start_ms: int, candle_seconds: int) -> dict:
+        return {
+            **candle,
+            'window_start_ms': window_start_ms,
+            'window_end_ms': window_start_ms + candle_seconds * 1000,
+            'candle_seconds': candle_seconds,
+        }
+
+    def __call__(self, candle: dict, state: State) -> List[dict]:
+        """
+        Args:
+            candle (dict): The latest update of the current base candle of a pair.
+            state (State): The state of the pair.
+
+        Returns:
+            List[dict]: The base candle followed by the coarser candles containing it
+        """
+        rollup: Optional[dict] = state.get('rollup')
+        if rollup is None:
+            rollup = {'base_candle': None, 'windows': {}}
+
+        previous = rollup['base_candle']
+        if previous is not None:
+            if candle['window_start_ms'] < previous['window_start_ms']:
+                # Cannot happen without a window grace period, the coarse candles
+                # have already moved on
+                logger.warning(f'Not rolling up out of order candle {candle}')
+                return [candle]
+            if candle['window_start_ms'] > previous['window_start_ms']:
+                # the previous base candle is closed, fold it into its coarse windows
+                for window in rollup['windows'].values():
+                    window['closed'] = (
+                        merge_candles(window['closed'], previous)
+                        if window['closed']
+                        else previous
+                    )
+
+        candles = [candle]
+        for candle_seconds in self.candle_seconds_list:
+            window_ms = candle_seconds * 1000
+            window_start_ms = candle['window_start_ms'] // window_ms * window_ms
+            # state is stored as JSON, so the resolutions are string keys
+            window = rollup['windows'].get(str(candle_seconds))
+            if window is None or window['window_start_ms'] != window_start_ms:
+                if not self.emit_partial and window is not None and window['closed']:
+                    candles.append(
+                        self._coarse_candle(
+                            window['closed'], window['window_start_ms'], candle_seconds
+                        )
+                    )
+                window = {'window_start_ms': window_start_ms, 'closed': None}
+                rollup['windows'][str(candle_seconds)] = window
+
+            if not self.emit_partial:
+                continue
+            coarse = (
+                merge_candles(window['closed'], candle) if window['closed'] else candle
+            )
+            candles.append(self._coarse_candle(coarse, window_start_ms, candle_seconds))
+
+        rollup['base_candle'] = candle
+        state.set('rollup', rollup)
+        return candles
+
+    def amend(
+        self,
+        candle: dict,
+        base_candles: Callable[[int, int], Optional[List[dict]]],
+        state: State,
+    ) -> List[dict]:
+        """
+        Rebuilds the coarse candles containing a base candle amended by a late trade.
+
+        Args:
+            candle (dict): The amended base candle.
+            base_candles (Callable[[int, int], Optional[List[dict]]]): Returns the
+                base candles of the pair from a window start (included) to another
+                (excluded), or None if the older ones are no longer kept.
+            state (State): The state of the pair.
+
+        Returns:
+            List[dict]: The amended coarse candles, the closed ones and, with
+            `emit_partial`, the current ones
+        """
+        rollup: Optional[dict] = state.get('rollup')
+        if rollup is None or rollup['base_candle'] is None:
+            return []
+        current = rollup['base_candle']
+        if candle['window_start_ms'] >= current['window_start_ms']:
+            # not folded into the coarse windows yet, as if it arrived in order
+            return self(candle, state)[1:]
+
+        candles = []
+        for candle_seconds in self.candle_seconds_list:
+            window_ms = candle_seconds * 1000
+            window_start_ms = candle['window_start_ms'] // window_ms * window_ms
+            window = rollup['windows'].get(str(candle_seconds))
+            is_current = window is not None and (
+                window['window_start_ms'] == window_start_ms
+            )
+            end_ms = (
+                current['window_start_ms']
+                if is_current
+                else window_start_ms + window_ms
+            )
+            bases = base_candles(window_start_ms, end_ms)
+            if not bases:
+                logger.debug(
+                    f'Not amending the {candle_seconds}s candle of {candle["pair"]} '
+                    f'at {window_start_ms}, its first base candles are no longer kept'
+                )
+                continue
+            closed = reduce(merge_candles, bases)
+            if not is_current:
+                candles.append(
+                    self._coarse_candle(closed, window_start_ms, candle_seconds)
+                )
+                continue
+            window['closed'] = closed
+            if self.emit_partial:
+                candles.append(
+                    self._coarse_candle(
+                        merge_candles(closed, current), window_start_ms, candle_seconds
+                    )
+                )
+
+        state.set('rollup', rollup)
+        return candles
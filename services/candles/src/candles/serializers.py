@@ -0,0 +1,239 @@
+import struct
+from functools import lru_cache
+from typing import Any, Callable, Dict, NotRequired, TypedDict
+
+from common import serializers
+from common.serializers import SerializerName
+from quixstreams.models.serializers import Deserializer, Serializer
+
+
+class Trade(TypedDict):
+    product_id: str
+    price: float
+    quantity: float
+    timestamp: NotRequired[str]
+    timestamp_ms: int
+    # taker side, 'buy' or 'sell', missing in older trades
+    side: NotRequired[str | None]
+
+
+class Candle(TypedDict):
+    pair: str
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    window_start_ms: int
+    window_end_ms: int
+    candle_seconds: int
+    trade_count: int
+    vwap: float
+    buy_volume: float
+    sell_volume: float
+    first_trade_ms: int
+    last_trade_ms: int
+
+
+# Compact binary records for the trades and candles topics, encoded and decoded with
+# this module by the trades, candles and technical indicators services.
+#
+# Every record starts with a 2 bytes header: a magic byte and the schema id, followed
+# by the length-prefixed utf-8 pair and the fixed-size little-endian numeric fields.
+# The key names are implied by the schema id, which also versions the layout.
+# The ISO `timestamp` string of trades is not encoded, `timestamp_ms` carries it.
+# The v1 records, without the trade side and the candle aggregates, are still decoded.
+BINARY_MAGIC = 0xCB
+TRADE_SCHEMA_V1 = 1
+CANDLE_SCHEMA_V1 = 2
+TRADE_SCHEMA_V2 = 3
+CANDLE_SCHEMA_V2 = 4
+
+_TRADE_V1 = struct.Struct('<ddq')  # price, quantity, timestamp_ms
+_CANDLE_V1 = struct.Struct('<dddddqqI')  # OHLCV, window start/end, candle_seconds
+# v1 + side (0 unknown, 1 buy, 2 sell)
+_TRADE_V2 = struct.Struct('<ddqB')
+# v1 + trade_count, vwap, buy/sell volume, first/last trade timestamps
+_CANDLE_V2 = struct.Struct('<dddddqqIIdddqq')
+_SIDE_CODES = {None: 0, 'buy': 1, 'sell': 2}
+_SIDES = (None, 'buy', 'sell')
+
+
+@lru_cache(maxsize=4096)
+def _encode_pair(schema_id: int, pair: str) -> bytes:
+    # a handful of pairs, their headers are built once
+    pair_bytes = pair.encode()
+    return bytes((BINARY_MAGIC, schema_id, len(pair_bytes))) + pair_bytes
+
+
+def encode_trade_fields(
+    product_id: str,
+    price: float,
+    quantity: float,
+    timestamp_ms: int,
+    side: str | None,
+) -> bytes:
+    """
+    Encodes a trade from its fields, e.g. straight from the columns of a batch.
+    """
+    return _encode_pair(TRADE_SCHEMA_V2, product_id) + _TRADE_V2.pack(
+        price, quantity, timestamp_ms, _SIDE_CODES.get(side, 0)
+    )
+
+
+def encode_trade(trade: dict) -> bytes:
+    return encode_trade_fields(
+        trade['product_id'],
+        trade['price'],
+        trade['quantity'],
+        trade['timestamp_ms'],
+        trade.get('side'),
+    )
+
+
+def encode_candle(candle: dict) -> bytes:
+    return _encode_pair(CANDLE_SCHEMA_V2, candle['pair']) + _CANDLE_V2.pack(
+        candle['open'],
+        candle['high'],
+        candle['low'],
+        candle['close'],
+        candle['volume'],
+        candle['window_start_ms'],
+        candle['window_end_ms'],
+        candle['candle_seconds'],
+        candle['trade_count'],
+        candle['vwap'],
+        candle['buy_volume'],
+        candle['sell_volume'],
+        candle['first_trade_ms'],
+        candle['last_trade_ms'],
+    )
+
+
+def _decode_trade_v1(pair: str, value: bytes, offset: int) -> dict:
+    price, quantity, timestamp_ms = _TRADE_V1.unpack_from(value, offset)
+    return {
+        'product_id': pair,
+        'price': price,
+        'quantity': quantity,
+        'timestamp_ms': timestamp_ms,
+    }
+
+
+def _decode_trade_v2(pair: str, value: bytes, offset: int) -> dict:
+    price, quantity, timestamp_ms, side = _TRADE_V2.unpack_from(value, offset)
+    return {
+        'product_id': pair,
+        'price': price,
+        'quantity': quantity,
+        'timestamp_ms': timestamp_ms,
+        'side': _SIDES[side],
+    }
+
+
+def _decode_candle_v1(pair: str, value: bytes, offset: int) -> dict:
+    (
+        open_,
+        high,
+        low,
+        close,
+        volume,
+        window_start_ms,
+        window_end_ms,
+        candle_seconds,
+    ) = _CANDLE_V1.unpack_from(value, offset)
+    return {
+        'pair': pair,
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume,
+        'window_start_ms': window_start_ms,
+        'window_end_ms': window_end_ms,
+        'candle_seconds': candle_seconds,
+    }
+
+
+def _decode_candle_v2(pair: str, value: bytes, offset: int) -> dict:
+    (
+        open_,
+        high,
+        low,
+        close,
+        volume,
+        window_start_ms,
+        window_end_ms,
+        candle_seconds,
+        trade_count,
+        vwap,
+        buy_volume,
+        sell_volume,
+        first_trade_ms,
+        last_trade_ms,
+    ) = _CANDLE_V2.unpack_from(value, offset)
+    return {
+        'pair': pair,
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume,
+        'window_start_ms': window_start_ms,
+        'window_end_ms': window_end_ms,
+        'candle_seconds': candle_seconds,
+        'trade_count': trade_count,
+        'vwap': vwap,
+        'buy_volume': buy_volume,
+        'sell_volume': sell_volume,
+        'first_trade_ms': first_trade_ms,
+        'last_trade_ms': last_trade_ms,
+    }
+
+
+_BINARY_ENCODERS: Dict[Any, Callable[[dict], bytes]] = {
+    Trade: encode_trade,
+    Candle: encode_candle,
+}
+_BINARY_DECODERS: Dict[int, Callable[[str, bytes, int], dict]] = {
+    TRADE_SCHEMA_V1: _decode_trade_v1,
+    CANDLE_SCHEMA_V1: _decode_candle_v1,
+    TRADE_SCHEMA_V2: _decode_trade_v2,
+    CANDLE_SCHEMA_V2: _decode_candle_v2,
+}
+
+
+def decode_binary(value: bytes) -> dict:
+    """
+    Decodes a binary record, dispatching on the schema id of its header.
+    """
+    if len(value) < 3 or value[0] != BINARY_MAGIC:
+        raise ValueError('Not a binary record')
+    decoder = _BINARY_DECODERS.get(value[1])
+    if decoder is None:
+        raise ValueError(f'Unknown binary schema id {value[1]}')
+    pair_end = 3 + value[2]
+    return decoder(value[3:pair_end].decode(), value, pair_end)
+
+
+def get_serializer(name: SerializerName, schema: Any = Any) -> str | Serializer:
+    """
+    Returns the value serializer to use for a topic given its name in the config,
+    see `common.serializers.get_serializer`, with the binary records of the trades
+    and candles.
+    """
+    if name == 'binary' and schema not in _BINARY_ENCODERS:
+        raise ValueError('The binary format only supports trades and candles')
+    return serializers.get_serializer(
+        name, schema=schema, encode_binary=_BINARY_ENCODERS.get(schema)
+    )
+
+
+def get_deserializer(name: SerializerName, schema: Any = Any) -> str | Deserializer:
+    """
+    Returns the value deserializer to use for a topic given its name in the config,
+    see `common.serializers.get_deserializer`.
+    """
+    return serializers.get_deserializer(
+        name, schema=schema, decode_binary=decode_binary
+    )
@@ -0,0 +1,109 @@
+import random
+from functools import reduce
+
+import pandas as pd
+import pytest
+from candles.batch import build_candles
+from candles.main import init_candle, update_candle
+from candles.rollup import merge_candles
+
+
+def make_trades(n, seed=0):
+    rng = random.Random(seed)
+    trades, timestamp_ms = [], 0
+    for _ in range(n):
+        timestamp_ms += rng.randint(0, 20000)
+        trades.append(
+            {
+                'product_id': rng.choice(['ETH/EUR', 'BTC/USD']),
+                'price': 100 + rng.random(),
+                # some trades without volume, for the vwap fallbacks
+                'quantity': 0.0 if rng.random() < 0.3 else rng.random(),
+                'timestamp_ms': timestamp_ms,
+                'side': rng.choice(['buy', 'sell']),
+            }
+        )
+    return trades
+
+
+def reduce_candles(trades, candle_seconds):
+    # the candles of the streaming reducers, by (pair, window start)
+    window_ms = candle_seconds * 1000
+    candles = {}
+    for trade in trades:
+        start = trade['timestamp_ms'] // window_ms * window_ms
+        key = (trade['product_id'], start)
+        candles[key] = (
+            update_candle(candles[key], trade)
+            if key in candles
+            else {
+                **init_candle(trade),
+                'window_start_ms': start,
+                'window_end_ms': start + window_ms,
+                'candle_seconds': candle_seconds,
+            }
+        )
+    return candles
+
+
+def assert_same_candle(row, candle):
+    for column, value in candle.items():
+        if isinstance(value, float):
+            assert row[column] == pytest.approx(value, rel=1e-12), column
+        else:
+            assert row[column] == value, column
+
+
+def test_build_candles_like_the_reducers():
+    trades = make_trades(500)
+    batch = build_candles(pd.DataFrame(trades), 60, rollup_candle_seconds=[300])
+
+    base = reduce_candles(trades, 60)
+    rows = batch[batch['candle_seconds'] == 60]
+    assert len(rows) == len(base)
+    for row in rows.to_dict('records'):
+        assert_same_candle(row, base[(row['pair'], row['window_start_ms'])])
+
+    # the coarse candles merge the base ones, like the rollup
+    coarse = {}
+    for (pair, start), candle in sorted(base.items()):
+        key = (pair, start // 300000 * 300000)
+        coarse.setdefault(key, []).append(candle)
+    rows = batch[batch['candle_seconds'] == 300]
+    for row in rows.to_dict('records'):
+        merged = reduce(merge_candles, coarse[(row['pair'], row['window_start_ms'])])
+        merged = {
+            **merged,
+            'window_start_ms': row['window_start_ms'],
+            'window_end_ms': row['window_start_ms'] + 300000,
+            'candle_seconds': 300,
+        }
+        assert_same_candle(row, merged)
+
+
+def test_build_candles_leaves_out_the_open_coarse_windows():
+    trades = [
+        {'product_id': 'X', 'price': 1.0, 'quantity': 1.0, 'timestamp_ms': ms}
+        for ms in [1000, 61000, 121000, 181000]
+    ]
+    batch = build_candles(pd.DataFrame(trades), 60, rollup_candle_seconds=[120])
+
+    coarse = batch[batch['candle_seconds'] == 120]
+    assert coarse['window_start_ms'].tolist() == [0, 120000]
+    assert (batch['candle_seconds'] == 60).sum() == 4
+
+    batch = build_candles(pd.DataFrame(trades[:3]), 60, rollup_candle_seconds=[120])
+    coarse = batch[batch['candle_seconds'] == 120]
+    assert coarse['window_start_ms'].tolist() == [0]
+
+
+def test_build_candles_backfills_the_gaps():
+    trades = [
+        {'product_id': 'X', 'price': price, 'quantity': 1.0, 'timestamp_ms': ms}
+        for price, ms in [(1.0, 1000), (2.0, 181000)]
+    ]
+    batch = build_candles(pd.DataFrame(trades), 60, backfill_gaps=True)
+
+    assert batch['window_start_ms'].tolist() == [0, 60000, 120000, 180000]
+    assert batch['trade_count'].tolist() == [1, 0, 0, 1]
+    assert batch['close'].tolist() == [1.0, 1.0, 1.0, 2.0]
@@ -0,0 +1,48 @@
+import pytest
+from candles.main import init_candle, update_candle
+
+
+def trade(timestamp_ms, price, quantity=1.0, side='buy'):
+    return {
+        'product_id': 'ETH/EUR',
+        'price': price,
+        'quantity': quantity,
+        'timestamp_ms': timestamp_ms,
+        'side': side,
+    }
+
+
+def test_update_candle_aggregates():
+    candle = init_candle(trade(1000, 10.0, 1.0, 'buy'))
+    for t in [trade(2000, 12.0, 3.0, 'sell'), trade(3000, 8.0, 2.0, 'buy')]:
+        candle = update_candle(candle, t)
+
+    assert candle['open'] == 10.0
+    assert candle['high'] == 12.0
+    assert candle['low'] == 8.0
+    assert candle['close'] == 8.0
+    assert candle['volume'] == 6.0
+    assert candle['trade_count'] == 3
+    assert candle['vwap'] == pytest.approx((10 + 36 + 16) / 6)
+    assert candle['buy_volume'] == 3.0
+    assert candle['sell_volume'] == 3.0
+    assert (candle['first_trade_ms'], candle['last_trade_ms']) == (1000, 3000)
+
+
+def test_update_candle_follows_the_trade_timestamps():
+    candle = init_candle(trade(2000, 10.0))
+    # arrives after, but happened before the first trade
+    candle = update_candle(candle, trade(1000, 9.0))
+    candle = update_candle(candle, trade(1500, 11.0))
+
+    assert candle['open'] == 9.0
+    assert candle['close'] == 10.0
+    assert (candle['first_trade_ms'], candle['last_trade_ms']) == (1000, 2000)
+
+
+def test_update_candle_without_volume_keeps_the_vwap():
+    candle = init_candle(trade(1000, 10.0, quantity=0.0))
+    candle = update_candle(candle, trade(2000, 12.0, quantity=0.0))
+
+    assert candle['vwap'] == 10.0
+    assert candle['volume'] == 0.0
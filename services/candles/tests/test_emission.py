@@ -0,0 +1,34 @@
+import pytest
+from candles.emission import CandleThrottle
+
+
+def update(window, close):
+    return {'candle_seconds': 60, 'window_start_ms': window * 60000, 'close': close}
+
+
+def test_throttle_flushes_the_last_update_of_a_window(state, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('candles.emission.time.time', lambda: now[0])
+    throttle = CandleThrottle('throttle', interval_ms=1000)
+
+    assert throttle(update(0, 1.0), state) == [update(0, 1.0)]
+    now[0] += 0.5
+    assert throttle(update(0, 2.0), state) == []
+    assert throttle(update(0, 3.0), state) == []
+    # the closed candle comes before the first update of the next window
+    assert throttle(update(1, 4.0), state) == [update(0, 3.0), update(1, 4.0)]
+    now[0] += 1
+    assert throttle(update(1, 5.0), state) == [update(1, 5.0)]
+
+
+def test_close_move(state):
+    throttle = CandleThrottle('close_move', close_move=0.01)
+
+    assert throttle(update(0, 100.0), state) == [update(0, 100.0)]
+    assert throttle(update(0, 100.5), state) == []
+    assert throttle(update(0, 101.5), state) == [update(0, 101.5)]
+
+
+def test_throttle_rejects_the_other_policies():
+    with pytest.raises(ValueError):
+        CandleThrottle('final')
@@ -0,0 +1,44 @@
+from candles.gaps import GapBackfill
+
+
+def candle(window, close):
+    return {
+        'pair': 'ETH/EUR',
+        'open': close,
+        'high': close,
+        'low': close,
+        'close': close,
+        'volume': 1.0,
+        'window_start_ms': window * 60000,
+        'window_end_ms': (window + 1) * 60000,
+        'candle_seconds': 60,
+        'trade_count': 1,
+        'vwap': close,
+        'buy_volume': 1.0,
+        'sell_volume': 0.0,
+        'first_trade_ms': window * 60000 + 1,
+        'last_trade_ms': window * 60000 + 2,
+    }
+
+
+def test_backfill_on_next_candle(state):
+    backfill = GapBackfill(60)
+    assert backfill(candle(0, 10.0), state) == [candle(0, 10.0)]
+
+    *flat, last = backfill(candle(3, 12.0), state)
+    assert last == candle(3, 12.0)
+    assert [c['window_start_ms'] for c in flat] == [60000, 120000]
+    for c in flat:
+        assert (c['open'], c['close'], c['vwap']) == (10.0, 10.0, 10.0)
+        assert (c['volume'], c['trade_count']) == (0.0, 0)
+        assert c['last_trade_ms'] == 2
+
+
+def test_backfill_skips_long_gaps_and_out_of_order_candles(state):
+    backfill = GapBackfill(60, max_windows=2)
+    backfill(candle(5, 10.0), state)
+
+    assert backfill(candle(1, 10.0), state) == [candle(1, 10.0)]
+    assert backfill(candle(9, 10.0), state) == [candle(9, 10.0)]
+    # updates of the same window
+    assert backfill(candle(9, 11.0), state) == [candle(9, 11.0)]
@@ -0,0 +1,106 @@
+from candles.late import CandleCorrections, LateTrades, LateTradeStats
+from candles.main import init_candle, update_candle
+from candles.rollup import CandleRollup
+
+
+def trade(timestamp_ms, price, quantity=1.0):
+    return {
+        'product_id': 'ETH/EUR',
+        'price': price,
+        'quantity': quantity,
+        'timestamp_ms': timestamp_ms,
+        'side': 'buy',
+    }
+
+
+def base_candle(window, price):
+    return {
+        **init_candle(trade(window * 60000 + 1, price)),
+        'window_start_ms': window * 60000,
+        'window_end_ms': (window + 1) * 60000,
+        'candle_seconds': 60,
+    }
+
+
+def test_late_trades_are_flagged_once_their_window_closed(state):
+    late_trades = LateTrades(60, grace_ms=5000)
+
+    assert 'late_by_ms' not in late_trades(trade(124000, 1.0), state)
+    # within the grace period of its window
+    assert 'late_by_ms' not in late_trades(trade(119000, 1.0), state)
+    late = late_trades(trade(59000, 1.0), state)
+    assert late['late_by_ms'] == 124000 - 5000 - 59000
+
+
+def test_corrections_amend_the_kept_candles(state):
+    stats = LateTradeStats()
+    corrections = CandleCorrections(
+        init_candle, update_candle, 60, max_windows=2, stats=stats
+    )
+    for window in range(3):
+        corrections.remember(base_candle(window, 10.0), state)
+
+    (amended,) = corrections.amend(trade(60000 + 5, 12.0), state)
+    assert (amended['window_start_ms'], amended['high'], amended['trade_count']) == (
+        60000,
+        12.0,
+        2,
+    )
+    assert state.get('candle_60000') == amended
+    # the first window expired
+    assert corrections.amend(trade(5, 12.0), state) == []
+    assert state.get('candle_0') is None
+    assert (stats.corrected, stats.uncorrected) == (1, 1)
+
+
+def test_corrections_create_the_candle_of_an_empty_window(state):
+    corrections = CandleCorrections(init_candle, update_candle, 60, max_windows=5)
+    corrections.remember(base_candle(0, 10.0), state)
+    corrections.remember(base_candle(2, 10.0), state)
+
+    (amended,) = corrections.amend(trade(60000 + 5, 12.0), state)
+    assert amended['window_start_ms'] == 60000
+    assert amended['trade_count'] == 1
+    assert [c['window_start_ms'] for c in corrections.candles(0, 180000, state)] == [
+        0,
+        60000,
+        120000,
+    ]
+
+
+def test_corrections_amend_the_rolled_up_candles(state):
+    rollup = CandleRollup(60, [120])
+    corrections = CandleCorrections(
+        init_candle, update_candle, 60, max_windows=10, rollup=rollup
+    )
+    for window in range(3):
+        candle = base_candle(window, 10.0)
+        corrections.remember(candle, state)
+        rollup(candle, state)
+
+    base, coarse = corrections.amend(trade(5, 20.0), state)
+    assert (base['window_start_ms'], base['high']) == (0, 20.0)
+    assert coarse['candle_seconds'] == 120
+    assert (coarse['window_start_ms'], coarse['high'], coarse['trade_count']) == (
+        0,
+        20.0,
+        3,
+    )
+
+
+def test_corrections_amend_the_current_coarse_window(state):
+    rollup = CandleRollup(60, [180])
+    corrections = CandleCorrections(
+        init_candle, update_candle, 60, max_windows=10, rollup=rollup
+    )
+    for window in range(2):
+        candle = base_candle(window, 10.0)
+        corrections.remember(candle, state)
+        rollup(candle, state)
+
+    _, coarse = corrections.amend(trade(5, 20.0), state)
+    assert (coarse['high'], coarse['trade_count']) == (20.0, 3)
+    # the next updates of the coarse window keep the correction
+    candle = base_candle(2, 10.0)
+    corrections.remember(candle, state)
+    assert rollup(candle, state)[1]['high'] == 20.0
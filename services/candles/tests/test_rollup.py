@@ -0,0 +1,91 @@
+import pytest
+from candles.main import init_candle
+from candles.rollup import CandleRollup, merge_candles
+
+
+def base_candle(window, price, quantity=1.0):
+    # a 60s candle of a single trade, in the window number `window`
+    candle = init_candle(
+        {
+            'product_id': 'ETH/EUR',
+            'price': price,
+            'quantity': quantity,
+            'timestamp_ms': window * 60000 + 1,
+            'side': 'buy',
+        }
+    )
+    return {
+        **candle,
+        'window_start_ms': window * 60000,
+        'window_end_ms': (window + 1) * 60000,
+        'candle_seconds': 60,
+    }
+
+
+def test_merge_candles():
+    merged = merge_candles(base_candle(0, 10.0, 1.0), base_candle(1, 12.0, 3.0))
+
+    assert (merged['open'], merged['high'], merged['low'], merged['close']) == (
+        10.0,
+        12.0,
+        10.0,
+        12.0,
+    )
+    assert merged['volume'] == 4.0
+    assert merged['vwap'] == pytest.approx(11.5)
+    assert merged['trade_count'] == 2
+    assert (merged['window_start_ms'], merged['window_end_ms']) == (0, 120000)
+
+
+def test_merge_candles_without_volume_takes_the_last_vwap():
+    merged = merge_candles(base_candle(0, 10.0, 0.0), base_candle(1, 12.0, 0.0))
+    assert merged['vwap'] == 12.0
+
+
+def test_rollup_rejects_resolutions_not_multiple_of_the_base():
+    with pytest.raises(ValueError):
+        CandleRollup(60, [90])
+    with pytest.raises(ValueError):
+        CandleRollup(60, [60])
+
+
+def test_rollup_emits_the_partial_coarse_candles(state):
+    rollup = CandleRollup(60, [180])
+    emitted = [rollup(base_candle(window, 10.0 + window), state) for window in range(4)]
+
+    assert [len(candles) for candles in emitted] == [2, 2, 2, 2]
+    coarse = emitted[2][1]
+    assert coarse['candle_seconds'] == 180
+    assert (coarse['window_start_ms'], coarse['window_end_ms']) == (0, 180000)
+    assert (coarse['open'], coarse['close'], coarse['trade_count']) == (10.0, 12.0, 3)
+    # the next coarse window starts over
+    assert emitted[3][1]['window_start_ms'] == 180000
+    assert emitted[3][1]['trade_count'] == 1
+
+
+def test_rollup_final_emits_the_closed_coarse_candles(state):
+    rollup = CandleRollup(60, [120, 180], emit_partial=False)
+    emitted = [rollup(base_candle(window, 10.0 + window), state) for window in range(4)]
+
+    coarse = [
+        (candle['candle_seconds'], candle['window_start_ms'], candle['trade_count'])
+        for candles in emitted
+        for candle in candles[1:]
+    ]
+    assert coarse == [(120, 0, 2), (180, 0, 3)]
+
+
+def test_rollup_updates_of_the_same_base_window(state):
+    rollup = CandleRollup(60, [120])
+    rollup(base_candle(0, 10.0), state)
+    update = {**base_candle(0, 10.0), 'close': 11.0, 'trade_count': 2}
+
+    coarse = rollup(update, state)[1]
+    # replaces the previous update instead of adding to it
+    assert (coarse['close'], coarse['trade_count']) == (11.0, 2)
+
+
+def test_rollup_out_of_order_candle_is_passed_through(state):
+    rollup = CandleRollup(60, [120])
+    rollup(base_candle(1, 10.0), state)
+    assert rollup(base_candle(0, 10.0), state) == [base_candle(0, 10.0)]
@@ -0,0 +1,101 @@
+import struct
+
+import pytest
+from candles.serializers import (
+    BINARY_MAGIC,
+    TRADE_SCHEMA_V1,
+    Candle,
+    Trade,
+    decode_binary,
+    encode_candle,
+    encode_trade,
+    get_deserializer,
+    get_serializer,
+)
+from quixstreams.models.serializers import (
+    MessageField,
+    SerializationContext,
+    SerializationError,
+)
+
+CTX = SerializationContext(topic='test', field=MessageField.VALUE)
+
+TRADE = {
+    'product_id': 'ETH/EUR',
+    'price': 2514.37,
+    'quantity': 0.01834219,
+    'timestamp_ms': 1745494542856,
+    'side': 'sell',
+}
+CANDLE = {
+    'pair': 'BTC/USD',
+    'open': 100.0,
+    'high': 110.5,
+    'low': 99.25,
+    'close': 105.0,
+    'volume': 12.5,
+    'window_start_ms': 1745494500000,
+    'window_end_ms': 1745494560000,
+    'candle_seconds': 60,
+    'trade_count': 42,
+    'vwap': 104.2,
+    'buy_volume': 7.5,
+    'sell_volume': 5.0,
+    'first_trade_ms': 1745494500123,
+    'last_trade_ms': 1745494559876,
+}
+
+
+def test_binary_round_trip():
+    assert decode_binary(encode_trade(TRADE)) == TRADE
+    assert decode_binary(encode_candle(CANDLE)) == CANDLE
+
+
+def test_binary_trade_without_side():
+    trade = {key: value for key, value in TRADE.items() if key != 'side'}
+    assert decode_binary(encode_trade(trade)) == {**trade, 'side': None}
+
+
+def test_binary_v1_trade_is_decoded():
+    pair = TRADE['product_id'].encode()
+    record = bytes((BINARY_MAGIC, TRADE_SCHEMA_V1, len(pair))) + pair
+    record += struct.pack('<ddq', 1.5, 2.5, 1000)
+
+    assert decode_binary(record) == {
+        'product_id': 'ETH/EUR',
+        'price': 1.5,
+        'quantity': 2.5,
+        'timestamp_ms': 1000,
+    }
+
+
+def test_binary_rejects_unknown_records():
+    with pytest.raises(ValueError):
+        decode_binary(b'not a record')
+    with pytest.raises(ValueError):
+        decode_binary(bytes((BINARY_MAGIC, 99, 0)))
+
+
+@pytest.mark.parametrize('name', ['json', 'msgspec', 'binary'])
+@pytest.mark.parametrize('schema, value', [(Trade, TRADE), (Candle, CANDLE)])
+def test_serializers_round_trip(name, schema, value):
+    serializer = get_serializer(name, schema=schema)
+    deserializer = get_deserializer(name, schema=schema)
+    if name == 'json':
+        # quixstreams' own
+        assert serializer == deserializer == 'json'
+        return
+    assert deserializer(serializer(value, CTX), CTX) == value
+
+
+def test_binary_deserializer_accepts_json():
+    deserializer = get_deserializer('binary')
+    assert deserializer(b'{"price": 1.0}', CTX) == {'price': 1.0}
+
+
+def test_binary_serializer_errors():
+    with pytest.raises(ValueError):
+        get_serializer('binary')
+    serializer = get_serializer('binary', schema=Trade)
+    with pytest.raises(SerializationError):
+        serializer({'price': 1.0}, CTX)
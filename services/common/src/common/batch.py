@@ -0,0 +1,130 @@
+"""
+Reading and writing of the whole history of a topic, or of a file, for the batch
+jobs of the services (see candles/batch.py and technical_indicators/batch.py).
+"""
+
+import time
+import uuid
+from typing import Any, Iterator
+
+import pandas as pd
+from confluent_kafka import OFFSET_BEGINNING, TopicPartition
+from loguru import logger
+from quixstreams import Application
+from quixstreams.models.serializers import (
+    Deserializer,
+    MessageField,
+    SerializationContext,
+)
+
+
+def read_file(path: str) -> pd.DataFrame:
+    """
+    Reads a file with the columns of the messages of a topic.
+
+    Args:
+        path (str): A .parquet, .csv or .jsonl file, possibly compressed.
+
+    Returns:
+        pd.DataFrame: The rows of the file
+    """
+    if '.parquet' in path:
+        return pd.read_parquet(path)
+    if '.csv' in path:
+        return pd.read_csv(path)
+    if '.jsonl' in path or '.ndjson' in path:
+        return pd.read_json(path, lines=True)
+    raise ValueError(f'Unknown file format: {path}')
+
+
+def write_file(rows: pd.DataFrame, path: str) -> None:
+    """
+    Writes the rows to a .parquet, .csv or .jsonl file.
+    """
+    if '.parquet' in path:
+        rows.to_parquet(path, index=False)
+    elif '.csv' in path:
+        rows.to_csv(path, index=False)
+    elif '.jsonl' in path or '.ndjson' in path:
+        rows.to_json(path, orient='records', lines=True)
+    else:
+        raise ValueError(f'Unknown file format: {path}')
+    logger.info(f'Wrote {len(rows)} rows to {path}')
+
+
+def read_topic(
+    kafka_broker_address: str,
+    kafka_topic: str,
+    deserializer: Deserializer,
+    consumer_group_prefix: str,
+    batch_size: int = 10000,
+) -> Iterator[Any]:
+    """
+    Yields the messages of a topic from its beginning up to its end offsets at the
+    time of the call, without committing any offset.
+
+    Args:
+        kafka_broker_address (str): Address of the Kafka broker.
+        kafka_topic (str): Name of the Kafka topic to read.
+        deserializer (Deserializer): Decodes the message values.
+        consumer_group_prefix (str): Prefix of the throwaway consumer group.
+        batch_size (int): How many messages to consume at once.
+
+    Yields:
+        The decoded messages, in the order of the topic within each partition
+    """
+    app = Application(
+        broker_address=kafka_broker_address,
+        # a throwaway group, nothing is committed
+        consumer_group=f'{consumer_group_prefix}-{uuid.uuid4().hex[:8]}',
+    )
+    ctx = SerializationContext(topic=kafka_topic, field=MessageField.VALUE)
+    n_messages = 0
+
+    with app.get_consumer(auto_commit_enable=False) as consumer:
+        metadata = consumer.list_topics(kafka_topic, timeout=10)
+        partitions = metadata.topics[kafka_topic].partitions
+        # stop offset of each partition, the messages produced meanwhile are left out
+        stop_offsets = {}
+        for partition in partitions:
+            low, high = consumer.get_watermark_offsets(
+                TopicPartition(kafka_topic, partition), timeout=10
+            )
+            if high > low:
+                stop_offsets[partition] = high
+        consumer.assign(
+            [
+                TopicPartition(kafka_topic, partition, OFFSET_BEGINNING)
+                for partition in stop_offsets
+            ]
+        )
+
+        start = time.monotonic()
+        while stop_offsets:
+            messages = consumer.consume(num_messages=batch_size, timeout=1)
+            if not messages:
+                # the last offsets can be transaction markers, which are never
+                # consumed
+                positions = consumer.position(
+                    [TopicPartition(kafka_topic, p) for p in stop_offsets]
+                )
+                for position in positions:
+                    if position.offset >= stop_offsets[position.partition]:
+                        del stop_offsets[position.partition]
+            for message in messages:
+                if message.error():
+                    raise RuntimeError(message.error())
+                partition = message.partition()
+                if partition not in stop_offsets:
+                    continue
+                if message.offset() >= stop_offsets[partition]:
+                    del stop_offsets[partition]
+                    continue
+                n_messages += 1
+                yield deserializer(message.value(), ctx)
+                if message.offset() == stop_offsets[partition] - 1:
+                    del stop_offsets[partition]
+        logger.info(
+            f'Read {n_messages} messages from {kafka_topic} in '
+            f'{time.monotonic() - start:.1f}s'
+        )
@@ -0,0 +1,129 @@
+"""
+Value (de)serializers of the Kafka topics, picked by their name in the config of
+each service. The binary records are only defined for some schemas, the service
+passes the functions encoding and decoding them (see candles/serializers.py).
+"""
+
+import struct
+from typing import Any, Callable, Literal, Optional
+
+import msgspec
+from quixstreams.models.serializers import (
+    Deserializer,
+    SerializationContext,
+    SerializationError,
+    Serializer,
+)
+from quixstreams.utils.json import loads
+
+SerializerName = Literal['json', 'msgspec', 'binary']
+
+
+class MsgspecSerializer(Serializer):
+    """
+    Encodes messages to JSON with msgspec.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._encoder = msgspec.json.Encoder()
+
+    def __call__(self, value: Any, ctx: SerializationContext) -> bytes:
+        try:
+            return self._encoder.encode(value)
+        except (TypeError, ValueError) as exc:
+            raise SerializationError(str(exc)) from exc
+
+
+class MsgspecDeserializer(Deserializer):
+    """
+    Decodes JSON messages with msgspec, validating them against `schema` while
+    decoding. With a TypedDict schema the messages are still plain dicts, so the
+    rest of the pipeline is unchanged.
+    """
+
+    def __init__(self, schema: Any = Any):
+        super().__init__()
+        self._decode_error = msgspec.DecodeError
+        self._decoder = msgspec.json.Decoder(schema)
+
+    def __call__(self, value: bytes, ctx: SerializationContext) -> Any:
+        try:
+            return self._decoder.decode(value)
+        except self._decode_error as exc:
+            raise SerializationError(str(exc)) from exc
+
+
+class BinarySerializer(Serializer):
+    """
+    Encodes messages as binary records with `encode`.
+    """
+
+    def __init__(self, encode: Callable[[Any], bytes]):
+        super().__init__()
+        self._encode = encode
+
+    def __call__(self, value: Any, ctx: SerializationContext) -> bytes:
+        try:
+            return self._encode(value)
+        except (KeyError, TypeError, ValueError, struct.error) as exc:
+            raise SerializationError(str(exc)) from exc
+
+
+class BinaryDeserializer(Deserializer):
+    """
+    Decodes binary records with `decode`. JSON messages are still accepted, so
+    consumers can be switched to `binary` before the producers of the topic.
+    """
+
+    def __init__(self, decode: Callable[[bytes], Any]):
+        super().__init__()
+        self._decode = decode
+
+    def __call__(self, value: bytes, ctx: SerializationContext) -> Any:
+        try:
+            if value[:1] == b'{':
+                return loads(value)
+            return self._decode(value)
+        except (ValueError, struct.error) as exc:
+            raise SerializationError(str(exc)) from exc
+
+
+def get_serializer(
+    name: SerializerName,
+    schema: Any = Any,
+    encode_binary: Optional[Callable[[Any], bytes]] = None,
+) -> str | Serializer:
+    """
+    Returns the value serializer to use for a topic given its name in the config.
+    `json` is quixstreams' default (orjson based), `binary` needs `encode_binary`.
+    """
+    if name == 'json':
+        return 'json'
+    if name == 'msgspec':
+        return MsgspecSerializer()
+    if name == 'binary':
+        if encode_binary is None:
+            raise ValueError(f'No binary format for {schema}')
+        return BinarySerializer(encode_binary)
+    raise ValueError(f'Unknown serializer: {name}')
+
+
+def get_deserializer(
+    name: SerializerName,
+    schema: Any = Any,
+    decode_binary: Optional[Callable[[bytes], Any]] = None,
+) -> str | Deserializer:
+    """
+    Returns the value deserializer to use for a topic given its name in the config.
+    `binary` needs `decode_binary`.
+    """
+    if name == 'json':
+        return 'json'
+    if name == 'msgspec':
+        return MsgspecDeserializer(schema=schema)
+    if name == 'binary':
+        if decode_binary is None:
+            raise ValueError(f'No binary format for {schema}')
+        return BinaryDeserializer(decode_binary)
+    raise ValueError(f'Unknown serializer: {name}')
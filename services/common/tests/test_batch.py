@@ -0,0 +1,25 @@
+import pandas as pd
+import pytest
+from common.batch import read_file, write_file
+
+ROWS = pd.DataFrame(
+    {
+        'pair': ['ETH/EUR', 'BTC/USD'],
+        'close': [2500.5, 95000.25],
+        'window_start_ms': [1745494500000, 1745494560000],
+    }
+)
+
+
+@pytest.mark.parametrize('name', ['rows.parquet', 'rows.csv', 'rows.jsonl'])
+def test_write_and_read_file(tmp_path, name):
+    path = str(tmp_path / name)
+    write_file(ROWS, path)
+    pd.testing.assert_frame_equal(read_file(path), ROWS)
+
+
+def test_unknown_file_format(tmp_path):
+    with pytest.raises(ValueError):
+        write_file(ROWS, str(tmp_path / 'rows.xlsx'))
+    with pytest.raises(ValueError):
+        read_file(str(tmp_path / 'rows.xlsx'))
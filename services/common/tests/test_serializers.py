@@ -0,0 +1,64 @@
+from typing import TypedDict
+
+import pytest
+from common.serializers import (
+    BinaryDeserializer,
+    BinarySerializer,
+    get_deserializer,
+    get_serializer,
+)
+from quixstreams.models.serializers import (
+    MessageField,
+    SerializationContext,
+    SerializationError,
+)
+
+CTX = SerializationContext(topic='test', field=MessageField.VALUE)
+
+
+class Score(TypedDict):
+    title: str
+    score: float
+
+
+def test_msgspec_round_trip():
+    serializer = get_serializer('msgspec')
+    deserializer = get_deserializer('msgspec', schema=Score)
+    value = {'title': 'BTC rallies', 'score': 0.75}
+
+    assert deserializer(serializer(value, CTX), CTX) == value
+
+
+def test_msgspec_validates_the_schema():
+    deserializer = get_deserializer('msgspec', schema=Score)
+    with pytest.raises(SerializationError):
+        deserializer(b'{"title": "BTC rallies"}', CTX)
+
+
+def test_json_is_the_quixstreams_one():
+    assert get_serializer('json') == get_deserializer('json') == 'json'
+
+
+def test_binary_needs_its_codec():
+    with pytest.raises(ValueError):
+        get_serializer('binary')
+    with pytest.raises(ValueError):
+        get_deserializer('binary')
+    with pytest.raises(ValueError):
+        get_serializer('yaml')
+
+
+def test_binary_uses_the_given_codec():
+    serializer = get_serializer('binary', encode_binary=lambda value: value['raw'])
+    deserializer = get_deserializer(
+        'binary', decode_binary=lambda value: {'raw': value}
+    )
+
+    assert isinstance(serializer, BinarySerializer)
+    assert isinstance(deserializer, BinaryDeserializer)
+    assert serializer({'raw': b'\x01\x02'}, CTX) == b'\x01\x02'
+    assert deserializer(b'\x01\x02', CTX) == {'raw': b'\x01\x02'}
+    # the JSON messages of the producers not switched yet
+    assert deserializer(b'{"raw": 1}', CTX) == {'raw': 1}
+    with pytest.raises(SerializationError):
+        serializer({}, CTX)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings
 
@@ -8,6 +8,9 @@ class Settings(BaseSettings):
     kafka_input_topic: str
     kafka_output_topic: str
     kafka_consumer_group: str
+    # Value (de)serializer of each topic: 'json' (quixstreams default) or 'msgspec'
+    kafka_input_serializer: Literal['json', 'msgspec'] = 'json'
+    kafka_output_serializer: Literal['json', 'msgspec'] = 'json'
     base_url: Optional[str] = None
     model: str
 
@@ -1,5 +1,6 @@
 from typing import List
 
+from common.serializers import SerializerName, get_deserializer, get_serializer
 from loguru import logger
 from quixstreams import Application
 
@@ -12,6 +13,8 @@ def run(
     kafka_output_topic: str,
     kafka_consumer_group: str,
     sentiment_extractor: SentimentExctractor,
+    kafka_input_serializer: SerializerName = 'json',
+    kafka_output_serializer: SerializerName = 'json',
 ):
     """
     Ingests news articles from Kafka and outputs structured outputs with
@@ -22,6 +25,8 @@ def run(
         kafka_output_topic (str): Name of the Kafka topic to write outputs to.
         kafka_consumer_group (str): Kafka consumer group name.
         sentiment_extractor: The SentimentExtractor object built with BAML to return scores with the chosen LLM model
+        kafka_input_serializer (str): Deserializer of the news topic.
+        kafka_output_serializer (str): Serializer of the sentiment scores topic.
     Returns:
         None
     """
@@ -33,12 +38,12 @@ def run(
     # Define the input topic
     news_topic = app.topic(
         name=kafka_input_topic,
-        value_serializer='json',
+        value_deserializer=get_deserializer(kafka_input_serializer),
     )
     # Define the output topic
     news_sentiment_topic = app.topic(
         name=kafka_output_topic,
-        value_serializer='json',
+        value_serializer=get_serializer(kafka_output_serializer),
     )
     # Create a streaming dataframe connected to the input topic
     sdf = app.dataframe(topic=news_topic)
@@ -87,4 +92,6 @@ if __name__ == '__main__':
         kafka_output_topic=config.kafka_output_topic,
         kafka_consumer_group=config.kafka_consumer_group,
         sentiment_extractor=sentiment_extractor,
+        kafka_input_serializer=config.kafka_input_serializer,
+        kafka_output_serializer=config.kafka_output_serializer,
     )
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings
 
@@ -45,12 +45,29 @@ class TrainingConfig(BaseSettings):
     ]
     hyperparam_search_trials: int = 5
     hyperparam_search_n_splits: int = 5
+    # Number of processes running the hyperparameter search trials in parallel, and
+    # of BLAS threads of each, so they share the cores instead of oversubscribing
+    hyperparam_search_n_jobs: int = 1
+    hyperparam_search_blas_threads: int = 1
     model_name: Optional[str] = 'OrthogonalMatchingPursuit'
     n_model_candidates: int = 2
+    # Budget of the selection of the model candidate and its hyperparameters, in
+    # fits or in seconds, spread over the candidates with successive halving
+    model_selection_budget: float = 100
+    model_selection_budget_unit: Literal['fits', 'seconds'] = 'fits'
     max_percentage_rows_with_nulls: float = (
         0.01  # Example parameter for data validation
     )
     max_percentage_diff_vs_baseline: float = 0.5
+    # dtype of the feature columns of the training data (the timestamps stay int64),
+    # and how many rows are fetched from RisingWave at once
+    training_data_dtype: Literal['float32', 'float64'] = 'float64'
+    training_data_chunk_rows: int = 50000
+    # Directory of the Parquet cache of the training data, so a run only fetches the
+    # candles added since the previous one (disabled if not set), and how long an
+    # unused entry is kept
+    feature_cache_dir: Optional[str] = None
+    feature_cache_max_age_days: float = 7
 
 
 train_config = TrainingConfig()
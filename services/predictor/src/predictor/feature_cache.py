@@ -0,0 +1,221 @@
+"""
+On-disk Parquet cache of the training data, so a training run only fetches from
+RisingWave the candles added since the previous one.
+
+There is one directory per (pair, candle_seconds, features, dtype), with the
+Parquet parts appended by each run and a manifest listing them with their row
+counts, windows, sizes and checksums. The parts are decoded into one DataFrame
+when loaded, the deduplication of the refreshed windows copies it anyway.
+A part whose candles are all older than the lookback is deleted, and so is a
+directory that no run has used for `max_age_days`.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Callable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+
+MANIFEST = 'manifest.json'
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """
+    Args:
+        cache_dir (str): The root directory of the cache, e.g. on a volume kept
+            across the training runs.
+        max_age_days (float): Entries not used for that long are deleted.
+        max_parts (int): The parts of an entry are compacted into one above that.
+        verify_checksums (bool): Whether to check the SHA-256 of every part when
+            loading it, on top of its size and row count.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_age_days: float = 7,
+        max_parts: int = 16,
+        verify_checksums: bool = False,
+    ):
+        self.cache_dir = cache_dir
+        self.max_age_days = max_age_days
+        self.max_parts = max_parts
+        self.verify_checksums = verify_checksums
+
+    def entry_dir(
+        self, pair: str, candle_seconds: int, features: List[str], dtype: str
+    ) -> str:
+        key = json.dumps([pair, candle_seconds, features, dtype])
+        digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+        name = f'{pair.replace("/", "").lower()}_{candle_seconds}_{digest}'
+        return os.path.join(self.cache_dir, name)
+
+    def load(
+        self,
+        pair: str,
+        candle_seconds: int,
+        features: List[str],
+        lookback_period: int,
+        fetch: Callable[[int], pd.DataFrame],
+        dtype: str = 'float64',
+        refresh_windows: int = 2,
+    ) -> pd.DataFrame:
+        """
+        Returns the features of the last `lookback_period` days of candles of the
+        pair, fetching only the ones missing from the cache.
+
+        Args:
+            pair (str): The crypto pair.
+            candle_seconds (int): The candle duration in seconds.
+            features (List[str]): The columns to load.
+            lookback_period (int): The number of days in the past to load data for.
+            fetch (Callable[[int], pd.DataFrame]): Loads the `features` (and
+                'window_start_ms') of the candles from a window start on.
+            dtype (str): The dtype of the feature columns, part of the cache key.
+            refresh_windows (int): How many of the latest cached windows are fetched
+                again, since their candles may have been updated since.
+
+        Returns:
+            pd.DataFrame: The features, ordered by window
+        """
+        self.evict()
+        since_ms = int((time.time() - lookback_period * 24 * 3600) * 1000)
+        entry_dir = self.entry_dir(pair, candle_seconds, features, dtype)
+        manifest = self._read_manifest(entry_dir)
+        if manifest is not None and manifest['covered_from_ms'] > since_ms:
+            logger.info(f'Feature cache {entry_dir} does not cover the lookback')
+            manifest = None
+        if manifest is None:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.makedirs(entry_dir)
+            manifest = {
+                'pair': pair,
+                'candle_seconds': candle_seconds,
+                'features': features,
+                'dtype': dtype,
+                'covered_from_ms': since_ms,
+                'parts': [],
+            }
+
+        # the parts with only candles older than the lookback
+        for part in [p for p in manifest['parts'] if p['max_ms'] < since_ms]:
+            os.remove(os.path.join(entry_dir, part['file']))
+            manifest['parts'].remove(part)
+
+        fetch_from_ms = since_ms
+        if manifest['parts']:
+            latest_ms = max(part['max_ms'] for part in manifest['parts'])
+            fetch_from_ms = max(
+                since_ms, latest_ms - refresh_windows * candle_seconds * 1000
+            )
+        start = time.monotonic()
+        new_rows = fetch(fetch_from_ms)
+        logger.info(
+            f'Fetched {len(new_rows)} rows from {fetch_from_ms} in '
+            f'{time.monotonic() - start:.1f}s, {len(manifest["parts"])} cached parts'
+        )
+        if len(new_rows):
+            manifest['parts'].append(self._write_part(entry_dir, new_rows))
+
+        data = self._read_parts(entry_dir, manifest['parts'])
+        if len(manifest['parts']) > self.max_parts:
+            self._compact(entry_dir, manifest, data)
+        manifest['last_used'] = time.time()
+        self._write_manifest(entry_dir, manifest)
+
+        data = data[data['window_start_ms'] >= since_ms].reset_index(drop=True)
+        return data[features]
+
+    def _read_manifest(self, entry_dir: str) -> Optional[dict]:
+        """
+        Returns the manifest of an entry if all its parts are intact, else None.
+        """
+        try:
+            with open(os.path.join(entry_dir, MANIFEST)) as file:
+                manifest = json.load(file)
+            for part in manifest['parts']:
+                path = os.path.join(entry_dir, part['file'])
+                if os.path.getsize(path) != part['size']:
+                    raise ValueError(f'{path} has changed size')
+                if pq.ParquetFile(path).metadata.num_rows != part['rows']:
+                    raise ValueError(f'{path} has changed row count')
+                if self.verify_checksums and _sha256(path) != part['sha256']:
+                    raise ValueError(f'{path} has changed checksum')
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, OSError, pa.ArrowException) as error:
+            logger.warning(f'Dropping the feature cache {entry_dir}: {error}')
+            return None
+        return manifest
+
+    def _write_manifest(self, entry_dir: str, manifest: dict) -> None:
+        path = os.path.join(entry_dir, MANIFEST)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(manifest, file)
+        os.replace(path + '.tmp', path)
+
+    def _write_part(self, entry_dir: str, rows: pd.DataFrame) -> dict:
+        min_ms = int(rows['window_start_ms'].min())
+        max_ms = int(rows['window_start_ms'].max())
+        name = f'part-{min_ms}-{max_ms}-{time.time_ns()}.parquet'
+        path = os.path.join(entry_dir, name)
+        pq.write_table(pa.Table.from_pandas(rows, preserve_index=False), path + '.tmp')
+        os.replace(path + '.tmp', path)
+        return {
+            'file': name,
+            'rows': len(rows),
+            'min_ms': min_ms,
+            'max_ms': max_ms,
+            'size': os.path.getsize(path),
+            'sha256': _sha256(path),
+        }
+
+    def _read_parts(self, entry_dir: str, parts: List[dict]) -> pd.DataFrame:
+        tables = [
+            pq.read_table(os.path.join(entry_dir, part['file'])) for part in parts
+        ]
+        data = pa.concat_tables(tables).to_pandas()
+        # the refreshed windows are in several parts, the latest one wins
+        return (
+            data.drop_duplicates('window_start_ms', keep='last')
+            .sort_values('window_start_ms', kind='stable')
+            .reset_index(drop=True)
+        )
+
+    def _compact(self, entry_dir: str, manifest: dict, data: pd.DataFrame) -> None:
+        part = self._write_part(entry_dir, data)
+        for old in manifest['parts']:
+            os.remove(os.path.join(entry_dir, old['file']))
+        manifest['parts'] = [part]
+
+    def evict(self) -> None:
+        """
+        Deletes the entries not used for `max_age_days`.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        oldest = time.time() - self.max_age_days * 24 * 3600
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            try:
+                with open(os.path.join(entry_dir, MANIFEST)) as file:
+                    last_used = json.load(file).get('last_used', 0)
+            except (OSError, ValueError):
+                last_used = os.path.getmtime(entry_dir)
+            if last_used < oldest:
+                logger.info(f'Evicting the feature cache {entry_dir}')
+                shutil.rmtree(entry_dir, ignore_errors=True)
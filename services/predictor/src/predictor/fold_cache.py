@@ -0,0 +1,159 @@
+"""
+Standardized matrices of the `TimeSeriesSplit` folds of the training data, so the
+hyperparameter search and the model selection fit only the models.
+
+The folds are fixed for a training run, so the `StandardScaler` of every fold is
+fitted once on its training rows (as the pipeline would), instead of once per fold
+of every trial, and the scaled rows are stored in contiguous arrays. With several
+worker processes the arrays live in one shared memory block, and only its name and
+layout are sent to the workers.
+"""
+
+import sys
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import TimeSeriesSplit
+
+
+def time_series_folds(n_rows: int, n_splits: int) -> List[Tuple[int, int]]:
+    """
+    Returns the (train_end, val_end) of each `TimeSeriesSplit` fold, oldest first.
+    """
+    # the TimeSeriesSplit folds are contiguous, a training prefix and the rows after
+    return [
+        (int(train_index[-1]) + 1, int(val_index[-1]) + 1)
+        for train_index, val_index in TimeSeriesSplit(n_splits=n_splits).split(
+            np.empty(n_rows)
+        )
+    ]
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    block = shared_memory.SharedMemory(name=name)
+    # the process that created the block unlinks it, not the workers
+    resource_tracker.unregister(block._name, 'shared_memory')
+    return block
+
+
+class FoldCache:
+    """
+    Args:
+        X_train (pd.DataFrame): Training data, the features are kept in their float
+            dtype.
+        y_train (pd.Series): Training target.
+        n_splits (int): The number of `TimeSeriesSplit` folds.
+        shared (bool): Whether to store the arrays in shared memory, to send the
+            cache to worker processes.
+    """
+
+    def __init__(
+        self,
+        X_train: pd.DataFrame,
+        y_train: pd.Series,
+        n_splits: int,
+        shared: bool = False,
+    ):
+        X = X_train.to_numpy()
+        if not np.issubdtype(X.dtype, np.floating):
+            X = X.astype(np.float64)
+        self.folds = time_series_folds(len(X), n_splits)
+        self.n_rows, self.n_features = X.shape
+        self.dtype = X.dtype.str
+        self._block = None
+        self._owner = True
+        if shared:
+            self._block = shared_memory.SharedMemory(create=True, size=self._size())
+            self._map(self._block.buf)
+        else:
+            self._map(bytearray(self._size()))
+
+        self._y[:] = y_train.to_numpy(dtype=np.float64)
+        for (train_end, val_end), X_fold in zip(self.folds, self._X, strict=True):
+            train = X[:train_end]
+            mean = train.mean(axis=0)
+            # same as StandardScaler, constant features are only centered
+            scale = train.std(axis=0)
+            scale[scale == 0] = 1
+            np.subtract(X[:val_end], mean, out=X_fold)
+            np.divide(X_fold, scale, out=X_fold)
+
+    @property
+    def n_splits(self) -> int:
+        return len(self.folds)
+
+    def _size(self) -> int:
+        itemsize = np.dtype(self.dtype).itemsize
+        rows = sum(val_end for _, val_end in self.folds)
+        return max(self.n_rows * 8 + rows * self.n_features * itemsize, 1)
+
+    def _map(self, buffer) -> None:
+        """
+        Lays out the target, then the training and validation rows of every fold.
+        """
+        self._y = np.ndarray((self.n_rows,), dtype=np.float64, buffer=buffer)
+        self._X = []
+        offset = self._y.nbytes
+        for _, val_end in self.folds:
+            X_fold = np.ndarray(
+                (val_end, self.n_features),
+                dtype=self.dtype,
+                buffer=buffer,
+                offset=offset,
+            )
+            self._X.append(X_fold)
+            offset += X_fold.nbytes
+
+    def fold(self, index: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the scaled training rows, their target, the scaled validation rows
+        and their target of a fold, as read-only views.
+        """
+        train_end, val_end = self.folds[index]
+        views = (
+            self._X[index][:train_end],
+            self._y[:train_end],
+            self._X[index][train_end:val_end],
+            self._y[train_end:val_end],
+        )
+        for view in views:
+            view.flags.writeable = False
+        return views
+
+    def close(self) -> None:
+        """
+        Releases the shared memory block, and deletes it in the process that
+        created it.
+        """
+        if self._block is None:
+            return
+        # the views on the block must be gone before closing it
+        self._X, self._y = [], None
+        self._block.close()
+        if self._owner:
+            self._block.unlink()
+        self._block = None
+
+    def __getstate__(self) -> dict:
+        if self._block is None:
+            raise TypeError('Only a shared FoldCache can be sent to other processes')
+        return {
+            'name': self._block.name,
+            'folds': self.folds,
+            'n_rows': self.n_rows,
+            'n_features': self.n_features,
+            'dtype': self.dtype,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.folds = [tuple(fold) for fold in state['folds']]
+        self.n_rows = state['n_rows']
+        self.n_features = state['n_features']
+        self.dtype = state['dtype']
+        self._block = _attach(state['name'])
+        self._owner = False
+        self._map(self._block.buf)
@@ -0,0 +1,176 @@
+"""
+Loads the training data from RisingWave without materializing the whole table.
+
+Only the feature columns are selected, the lookback is a `window_start_ms >= bound`
+predicate on the column itself (so it can use an index or the primary key), and
+the rows are fetched in chunks from a server-side cursor straight into
+preallocated numpy arrays.
+"""
+
+import resource
+import time
+from typing import List, Literal, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import psycopg2
+from loguru import logger
+from psycopg2 import sql
+
+# Columns kept as integers, whatever the dtype of the features
+INT_COLUMNS = ('window_start_ms', 'window_end_ms', 'candle_seconds')
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of the process, in MB.
+    """
+    # in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _table_identifier(table: str) -> sql.Identifier:
+    # 'public.technical_indicators' is a schema and a table
+    return sql.Identifier(*table.split('.'))
+
+
+def load_training_data(
+    host: str,
+    port: int,
+    user: str,
+    password: str,
+    database: str,
+    table: str,
+    pairs: Sequence[str],
+    lookback_period: int,
+    candle_seconds: int,
+    features: List[str],
+    dtype: Literal['float32', 'float64'] = 'float64',
+    chunk_rows: int = 50000,
+    since_ms: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Loads the features of the last `lookback_period` days of candles of `pairs`.
+
+    Args:
+        host (str): The RisingWave host.
+        port (int): The RisingWave port.
+        user (str): The RisingWave user.
+        password (str): The RisingWave password.
+        database (str): The RisingWave database.
+        table (str): The technical indicators table.
+        pairs (List[str]): The crypto pairs to load data for.
+        lookback_period (int): The number of days in the past to load data for.
+        candle_seconds (int): The candle duration in seconds.
+        features (List[str]): The columns to load.
+        dtype (str): The dtype of the feature columns, except the timestamps.
+        chunk_rows (int): How many rows to fetch from the cursor at once.
+        since_ms (int): Load the candles from this window start instead, e.g. the
+            ones missing from the feature cache.
+
+    Returns:
+        pd.DataFrame: The features, ordered by pair and window, with a 'pair' column
+            if several pairs are loaded
+    """
+    columns = list(features)
+    with_pair = len(pairs) > 1 and 'pair' not in columns
+    if with_pair:
+        columns.append('pair')
+    if since_ms is None:
+        since_ms = int((time.time() - lookback_period * 24 * 3600) * 1000)
+    where = sql.SQL(
+        'WHERE pair IN %(pairs)s AND candle_seconds = %(candle_seconds)s '
+        'AND window_start_ms >= %(since_ms)s'
+    )
+    params = {
+        'pairs': tuple(pairs),
+        'candle_seconds': candle_seconds,
+        'since_ms': since_ms,
+    }
+
+    logger.info('Establishing connection to RisingWave...')
+    conn = psycopg2.connect(
+        host=host, port=port, user=user, password=password, dbname=database
+    )
+    start = time.monotonic()
+    try:
+        # the cursor lives in a read-only transaction
+        conn.set_session(readonly=True)
+        with conn.cursor() as cursor:
+            cursor.execute(
+                sql.SQL('SELECT count(*) FROM {} ').format(_table_identifier(table))
+                + where,
+                params,
+            )
+            n_rows = cursor.fetchone()[0]
+            arrays = {
+                column: _empty_column(column, n_rows, dtype) for column in columns
+            }
+
+            cursor.execute(
+                sql.SQL('DECLARE training_data CURSOR FOR SELECT {} FROM {} ').format(
+                    sql.SQL(', ').join(map(sql.Identifier, columns)),
+                    _table_identifier(table),
+                )
+                + where
+                + sql.SQL(' ORDER BY pair, window_start_ms'),
+                params,
+            )
+            offset = 0
+            while True:
+                cursor.execute(f'FETCH {int(chunk_rows)} FROM training_data')
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                if offset + len(rows) > len(arrays[columns[0]]):
+                    # rows added since the count
+                    arrays = {
+                        column: _grow(values, offset + len(rows))
+                        for column, values in arrays.items()
+                    }
+                _fill(arrays, columns, rows, offset)
+                offset += len(rows)
+                logger.debug(f'Fetched {offset}/{n_rows} rows')
+            cursor.execute('CLOSE training_data')
+    finally:
+        conn.rollback()
+        conn.close()
+
+    elapsed = time.monotonic() - start
+    logger.info(
+        f'Loaded {offset} rows of {len(columns)} columns for {", ".join(pairs)} in '
+        f'{elapsed:.1f}s ({offset / max(elapsed, 1e-9):.0f} rows/sec, peak RSS '
+        f'{peak_rss_mb():.0f} MB)'
+    )
+    return pd.DataFrame(
+        {column: arrays[column][:offset] for column in columns}, copy=False
+    )
+
+
+def _empty_column(column: str, n_rows: int, dtype: str) -> np.ndarray:
+    if column == 'pair':
+        return np.empty(n_rows, dtype=object)
+    if column in INT_COLUMNS:
+        return np.empty(n_rows, dtype=np.int64)
+    return np.empty(n_rows, dtype=dtype)
+
+
+def _grow(values: np.ndarray, n_rows: int) -> np.ndarray:
+    grown = np.empty(max(n_rows, 2 * len(values)), dtype=values.dtype)
+    grown[: len(values)] = values
+    return grown
+
+
+def _fill(arrays: dict, columns: List[str], rows: List[tuple], offset: int) -> None:
+    """
+    Copies a chunk of rows into the arrays, column by column.
+    """
+    end = offset + len(rows)
+    for index, values in enumerate(zip(*rows, strict=True)):
+        column = columns[index]
+        target = arrays[column]
+        if target.dtype == object:
+            target[offset:end] = values
+        else:
+            # None (NULL indicators, e.g. at the start of the history) becomes NaN
+            target[offset:end] = np.array(values, dtype=np.float64)
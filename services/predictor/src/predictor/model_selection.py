@@ -0,0 +1,293 @@
+"""
+Picks the model candidate and its hyperparameters with a single budget of fits
+(or seconds), instead of a hyperparameter search per fold of a cross-validation
+per candidate.
+
+The budget is spread with successive halving: many (candidate, hyperparameters)
+arms are scored on the latest `TimeSeriesSplit` fold, the best `1 / eta` of them
+on the latest `eta` folds, and so on until the few remaining ones are scored on
+all the folds. The hyperparameters of every candidate are suggested by its own
+Optuna study, and the ones of the winning arm are used for the final fit.
+
+The arms of the first rung are sampled in waves, and every arm is told to its study
+as soon as it is dropped (pruned, with the score of its last rung), so the sampler
+of each candidate suggests the next arms from the scores of the previous ones.
+
+A seconds budget is checked between the fits: the fits still running at the
+deadline cannot be interrupted and are waited for, so it can be exceeded by up to
+one fit per worker.
+"""
+
+import math
+import time
+from concurrent.futures import wait
+from typing import Any, Dict, List, Literal, NamedTuple, Optional
+
+import numpy as np
+import optuna
+import pandas as pd
+from loguru import logger
+from optuna.trial import TrialState
+
+from predictor.fold_cache import FoldCache
+from predictor.tuning import fold_mae, get_executor
+
+
+class ModelSelection(NamedTuple):
+    model_name: str
+    hyperparams: dict
+    cv_mae: float
+    n_fits: int
+
+
+class _Arm:
+    """
+    A model candidate with the hyperparameters of one trial, and its MAE per fold.
+    """
+
+    def __init__(self, model_name: str, model_cls, study: optuna.Study, suggest):
+        self.model_name = model_name
+        self.model_cls = model_cls
+        self.study = study
+        self.trial = study.ask()
+        self.params = suggest(self.trial)
+        self.scores: Dict[int, float] = {}
+        self.failed = False
+        self.finished = False
+
+    def score(self, folds: List[int]) -> float:
+        if self.failed or any(fold not in self.scores for fold in folds):
+            return math.inf
+        return float(np.mean([self.scores[fold] for fold in folds]))
+
+    def finish(self, state: TrialState, value: Optional[float] = None) -> None:
+        # a pruned trial keeps the score of its last reported rung
+        if not self.finished:
+            self.study.tell(self.trial, value, state=state)
+            self.finished = True
+
+
+def _rung_folds(n_splits: int, eta: int) -> List[int]:
+    """
+    Returns the number of latest folds each arm is scored on at every rung.
+    """
+    rungs = [1]
+    while rungs[-1] < n_splits:
+        rungs.append(min(rungs[-1] * eta, n_splits))
+    return rungs
+
+
+def _n_fits(n_arms: int, rungs: List[int], eta: int) -> int:
+    # the folds an arm was already scored on are not fitted again
+    n_fits, previous = 0, 0
+    for n_folds in rungs:
+        n_fits += n_arms * (n_folds - previous)
+        previous = n_folds
+        n_arms = max(1, n_arms // eta)
+    return n_fits
+
+
+def nested_search_fits(n_candidates: int, n_trials: int, n_splits: int) -> int:
+    """
+    Number of fits of the former selection: a hyperparameter search on every
+    cross-validation fold of every candidate, then another one on the whole
+    training data, each followed by the fit of the best hyperparameters.
+    """
+    search = n_trials * n_splits + 1
+    return n_candidates * n_splits * search + search
+
+
+def select_model(
+    candidates: Dict[str, Any],
+    X_train: pd.DataFrame,
+    y_train: pd.Series,
+    budget: float,
+    budget_unit: Literal['fits', 'seconds'] = 'fits',
+    n_splits: int = 5,
+    eta: int = 3,
+    n_jobs: int = 1,
+    blas_threads: Optional[int] = 1,
+) -> ModelSelection:
+    """
+    Finds the model candidate and hyperparameters with the lowest mean MAE over the
+    `TimeSeriesSplit` folds of the training data, within the budget.
+
+    Args:
+        candidates (Dict[str, Model]): The model wrappers by name, e.g. the
+            candidates suggested by lazypredict.
+        X_train (pd.DataFrame): Training data.
+        y_train (pd.Series): Training target.
+        budget (float): The number of fits, or of seconds, to spend. A seconds
+            budget can be exceeded by the fits running at the deadline.
+        budget_unit (str): 'fits' or 'seconds'.
+        n_splits (int): The number of folds the last arms are scored on.
+        eta (int): Only the best `1 / eta` arms of a rung go to the next one.
+        n_jobs (int): The number of worker processes, 1 to run in this process.
+        blas_threads (int): The number of BLAS threads of each worker.
+
+    Returns:
+        ModelSelection: The best candidate, its hyperparameters and mean MAE, and
+            the number of fits performed
+    """
+    start = time.monotonic()
+    model_names = list(candidates)
+    rungs = _rung_folds(n_splits, eta)
+    if budget_unit == 'fits':
+        deadline = None
+        n_arms = len(model_names)
+        while _n_fits(n_arms + 1, rungs, eta) <= budget:
+            n_arms += 1
+        if _n_fits(n_arms, rungs, eta) > budget:
+            logger.warning(
+                f'A budget of {budget:.0f} fits is too low for one arm per candidate'
+            )
+    elif budget_unit == 'seconds':
+        deadline = start + budget
+        # the first rung samples arms for its share of the time
+        n_arms = None
+    else:
+        raise ValueError(f'Unknown budget unit {budget_unit}')
+
+    search_spaces = {}
+    for model_name, model in candidates.items():
+        model_cls, suggest = model.get_search_space(X_train)
+        study = optuna.create_study(direction='minimize')
+        search_spaces[model_name] = (model_cls, study, suggest)
+
+    def new_arm(index: int) -> _Arm:
+        # round robin over the candidates
+        model_name = model_names[index % len(model_names)]
+        return _Arm(model_name, *search_spaces[model_name])
+
+    # the scaled folds are shared by all the candidates and their trials
+    fold_cache = FoldCache(X_train, y_train, n_splits, shared=n_jobs > 1)
+    executor = get_executor(fold_cache, n_jobs, blas_threads)
+    n_fits = 0
+
+    def evaluate(arms: List[_Arm], fold_indices: List[int], until: Optional[float]):
+        nonlocal n_fits
+        futures = {}
+        for arm in arms:
+            if until is not None and time.monotonic() > until:
+                break
+            for fold in fold_indices:
+                future = executor.submit(fold_mae, arm.model_cls, arm.params, fold)
+                futures[future] = (arm, fold)
+        timeout = None if until is None else max(until - time.monotonic(), 0)
+        done, not_done = wait(futures, timeout=timeout)
+        # only the fits not started yet are cancelled, the running ones are waited
+        # for when the executor shuts down
+        for future in not_done:
+            future.cancel()
+        for future in done:
+            arm, fold = futures[future]
+            n_fits += 1
+            try:
+                arm.scores[fold] = future.result()
+            except Exception as error:
+                if not arm.failed:
+                    logger.warning(
+                        f'{arm.model_name} failed with {arm.params}: {error}'
+                    )
+                arm.failed = True
+
+    def drop(arms: List[_Arm]) -> None:
+        for arm in arms:
+            arm.finish(TrialState.FAIL if arm.failed else TrialState.PRUNED)
+
+    def ranked(arms: List[_Arm], rung_folds: List[int]) -> List[_Arm]:
+        return sorted(
+            (
+                arm
+                for arm in arms
+                if not arm.finished and arm.score(rung_folds) < math.inf
+            ),
+            key=lambda arm: arm.score(rung_folds),
+        )
+
+    arms: List[_Arm] = []
+    all_arms: List[_Arm] = []
+    # the arms of the last rung with scores, and the folds they were scored on
+    scored: List[_Arm] = []
+    scored_folds: List[int] = []
+    try:
+        previous = 0
+        for rung, n_folds in enumerate(rungs):
+            new_folds = list(range(n_splits - n_folds, n_splits - previous))
+            rung_folds = list(range(n_splits - n_folds, n_splits))
+            previous = n_folds
+            if rung == 0:
+                # the first rung samples arms for its share of the time, or its
+                # number of arms, in waves of one arm per worker
+                rung_end = start + budget / len(rungs)
+                while (
+                    len(arms) < n_arms
+                    if n_arms is not None
+                    else time.monotonic() < rung_end or len(arms) < len(model_names)
+                ):
+                    wave_size = max(n_jobs, 1)
+                    if n_arms is not None:
+                        wave_size = min(wave_size, n_arms - len(arms))
+                    wave = [new_arm(len(arms) + i) for i in range(wave_size)]
+                    arms.extend(wave)
+                    evaluate(wave, new_folds, deadline)
+                    # the arms outranked by as many arms as the next rung takes are
+                    # dropped right away. With a time budget the size of the rung
+                    # is not known yet, it is projected from the pace so far.
+                    rung_size = n_arms
+                    if rung_size is None:
+                        elapsed = max(time.monotonic() - start, 1e-9)
+                        rung_size = max(
+                            len(arms), int(len(arms) * (rung_end - start) / elapsed)
+                        )
+                    keep = max(1, rung_size // eta)
+                    outranked = ranked(arms, rung_folds)[keep:]
+                    for arm in outranked:
+                        arm.trial.report(arm.score(rung_folds), step=rung)
+                    drop([arm for arm in wave if arm.failed] + outranked)
+                all_arms = list(arms)
+            else:
+                evaluate(arms, new_folds, deadline)
+
+            rung_scored = ranked(arms, rung_folds)
+            if not rung_scored:
+                # out of time, the arms of the previous rung are compared
+                break
+            scored, scored_folds = rung_scored, rung_folds
+            for arm in scored:
+                arm.trial.report(arm.score(rung_folds), step=rung)
+            logger.info(
+                f'Rung {rung}: {len(scored)}/{len(arms)} arms left on the latest '
+                f'{n_folds} folds, best {scored[0].model_name} '
+                f'{scored[0].score(rung_folds):.4f}'
+            )
+            if rung + 1 == len(rungs) or (
+                deadline is not None and time.monotonic() > deadline
+            ):
+                break
+            promoted = scored[: max(1, len(arms) // eta)]
+            drop([arm for arm in arms if arm not in promoted])
+            arms = promoted
+    finally:
+        executor.shutdown(cancel_futures=True)
+        fold_cache.close()
+
+    if not scored:
+        raise ValueError('No model candidate could be scored within the budget')
+    # the studies keep the record of every arm, the ones still running are the
+    # arms compared last
+    for arm in all_arms:
+        if arm.failed:
+            arm.finish(TrialState.FAIL)
+        elif arm in scored:
+            arm.finish(TrialState.COMPLETE, arm.score(scored_folds))
+        else:
+            arm.finish(TrialState.PRUNED)
+    best = scored[0]
+    best_mae = best.score(scored_folds)
+    logger.info(
+        f'Selected {best.model_name} with {best.params} (CV MAE {best_mae:.4f} on '
+        f'{len(scored_folds)} folds) after {n_fits} fits in '
+        f'{time.monotonic() - start:.1f}s'
+    )
+    return ModelSelection(best.model_name, best.params, best_mae, n_fits)
@@ -1,8 +1,7 @@
 import os
-from typing import Optional, Union
+from typing import Callable, Optional, Tuple, Union
 
 import mlflow
-import numpy as np
 import optuna
 import pandas as pd
 import sklearn.compose
@@ -20,9 +19,9 @@ from lazypredict.Supervised import LazyRegressor
 from loguru import logger
 from sklearn.linear_model import OrthogonalMatchingPursuit
 from sklearn.metrics import mean_absolute_error
-from sklearn.model_selection import TimeSeriesSplit
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import StandardScaler
+
+from predictor.tuning import get_pipeline, search_hyperparameters
 
 
 class BaselineModel:
@@ -60,23 +59,14 @@ class OrthogonalMatchingPursuitWithHyperparameterTuning:
         self.pipeline = self._get_pipeline()
         self.hyperparam_search_trials = None
         self.hyperparam_search_n_splits = None
+        self.hyperparam_search_n_jobs = 1
+        self.hyperparam_search_blas_threads = 1
 
     def _get_pipeline(self, model_hyperparams: Optional[dict] = None) -> Pipeline:
         """
         Returns the pipeline with the model and preprocessor.
         """
-        if model_hyperparams is None:
-            pipeline = Pipeline(
-                [('scaler', StandardScaler()), ('model', OrthogonalMatchingPursuit())]
-            )
-        else:
-            pipeline = Pipeline(
-                [
-                    ('scaler', StandardScaler()),
-                    ('model', OrthogonalMatchingPursuit(**model_hyperparams)),
-                ]
-            )
-        return pipeline
+        return get_pipeline(OrthogonalMatchingPursuit, model_hyperparams)
 
     def fit(
         self,
@@ -84,6 +74,8 @@ class OrthogonalMatchingPursuitWithHyperparameterTuning:
         y: pd.Series,
         hyperparam_search_trials: Optional[int] = 0,
         hyperparam_search_n_splits: Optional[int] = 5,
+        hyperparam_search_n_jobs: Optional[int] = 1,
+        hyperparam_search_blas_threads: Optional[int] = 1,
     ) -> None:
         """
         Fit the OrthogonalMatchingPursuit model to the training data.
@@ -91,9 +83,16 @@ class OrthogonalMatchingPursuitWithHyperparameterTuning:
         Args:
             X (pd.DataFrame): Training features.
             y (pd.Series): Target variable.
+            hyperparam_search_trials (int): Number of Optuna trials, 0 to fit the
+                default hyperparameters.
+            hyperparam_search_n_splits (int): Number of folds of each trial.
+            hyperparam_search_n_jobs (int): Number of processes running the trials.
+            hyperparam_search_blas_threads (int): BLAS threads of each process.
         """
         self.hyperparam_search_trials = hyperparam_search_trials
         self.hyperparam_search_n_splits = hyperparam_search_n_splits
+        self.hyperparam_search_n_jobs = hyperparam_search_n_jobs
+        self.hyperparam_search_blas_threads = hyperparam_search_blas_threads
         if self.hyperparam_search_trials == 0:
             logger.info(
                 'No hyperparameter search trials specified, fitting the model with default parameters.'
@@ -112,35 +111,29 @@ class OrthogonalMatchingPursuitWithHyperparameterTuning:
             logger.info('Fitting the model with the best hyperparameters...')
             self.pipeline.fit(X, y)
 
-    def _find_best_hyperparameters(
-        self,
-        X_train: pd.DataFrame,
-        y_train: pd.Series,
-    ) -> dict:
+    def fit_with_hyperparameters(
+        self, X: pd.DataFrame, y: pd.Series, hyperparams: dict
+    ) -> None:
         """
-        Placeholder for hyperparameter tuning logic.
-        Args:
-            X_train (pd.DataFrame): Training data.
-            y_train (pd.Series): Training target.
-        Returns:
-            dict: Best hyperparameters found.
+        Fits the model with hyperparameters found beforehand, e.g. by the model
+        selection.
         """
+        self.pipeline = self._get_pipeline(model_hyperparams=hyperparams)
+        self.pipeline.fit(X, y)
 
-        def objective(trial: optuna.Trial) -> float:
-            """
-            Objective function for hyperparameter tuning to make optuna work.
-
-            Args:
-                trial (optuna.Trial): The optuna trial object.
+    def get_search_space(
+        self, X_train: pd.DataFrame
+    ) -> Tuple[type, Callable[[optuna.Trial], dict]]:
+        """
+        Returns the model class and the function suggesting its hyperparameters.
+        """
 
-            Returns:
-                float: The mean absolute error of the model on the split sets.
-            """
+        def suggest_params(trial: optuna.Trial) -> dict:
             # We need to constrain the number of non-zero coefficients to be smaller
             # than the number of features for the model to work
             n_features = X_train.shape[1]
             max_n_nonzero_coefs = max(n_features, 1)
-            params = {
+            return {
                 'n_nonzero_coefs': trial.suggest_int(
                     'n_nonzero_coefs', 1, max_n_nonzero_coefs
                 ),
@@ -148,34 +141,39 @@ class OrthogonalMatchingPursuitWithHyperparameterTuning:
                     'fit_intercept', [True, False]
                 ),
             }
-            # We split the training data into n_splits and evaluate the model on each split
-            # And remember it is a time series data, so we need to use TimeSeriesSplit
-            tscv = TimeSeriesSplit(n_splits=self.hyperparam_search_n_splits)
-            mae_scores = []
-            for train_index, val_index in tscv.split(X_train):
-                X_train_split, X_val_split = (
-                    X_train.iloc[train_index],
-                    X_train.iloc[val_index],
-                )
-                y_train_split, y_val_split = (
-                    y_train.iloc[train_index],
-                    y_train.iloc[val_index],
-                )
-                # Build pipeline with the current hyperparameters
-                self.pipeline = self._get_pipeline(model_hyperparams=params)
-                self.pipeline.fit(X_train_split, y_train_split)
-                y_pred = self.pipeline.predict(X_val_split)
-                mae_scores.append(mean_absolute_error(y_val_split, y_pred))
-            return np.mean(mae_scores)
-
-        # Create an Optuna study to find the best hyperparameters
-        study = optuna.create_study(direction='minimize')
-        # Run the trials
-        logger.info(
-            f'Starting hyperparameter tuning with {self.hyperparam_search_trials} trials...'
+
+        return OrthogonalMatchingPursuit, suggest_params
+
+    def _find_best_hyperparameters(
+        self,
+        X_train: pd.DataFrame,
+        y_train: pd.Series,
+    ) -> dict:
+        """
+        Runs an Optuna search of `hyperparam_search_trials` trials over the search
+        space of `get_search_space`, each scored by its mean MAE on the
+        `TimeSeriesSplit` folds of the training data.
+
+        Args:
+            X_train (pd.DataFrame): Training data.
+            y_train (pd.Series): Training target.
+        Returns:
+            dict: Best hyperparameters found.
+        """
+
+        # The trials are evaluated on the TimeSeriesSplit folds of the training data,
+        # in parallel if `hyperparam_search_n_jobs` > 1
+        model_cls, suggest_params = self.get_search_space(X_train)
+        return search_hyperparameters(
+            model_cls,
+            suggest_params,
+            X_train,
+            y_train,
+            n_trials=self.hyperparam_search_trials,
+            n_splits=self.hyperparam_search_n_splits,
+            n_jobs=self.hyperparam_search_n_jobs,
+            blas_threads=self.hyperparam_search_blas_threads,
         )
-        study.optimize(objective, n_trials=self.hyperparam_search_trials)
-        return study.best_trial.params
 
     def predict(self, X: pd.DataFrame) -> pd.Series:
         """
@@ -299,6 +297,8 @@ class LazyPredictSuggestedModelWithHyperparameterTuning:
         self.pipeline = self._get_pipeline()
         self.hyperparam_search_trials = None
         self.hyperparam_search_n_splits = None
+        self.hyperparam_search_n_jobs = 1
+        self.hyperparam_search_blas_threads = 1
 
     def _get_sklearn_class(self, model_cls: str):
         """
@@ -361,18 +361,7 @@ class LazyPredictSuggestedModelWithHyperparameterTuning:
         """
         Returns the pipeline with the model and preprocessor.
         """
-        if model_hyperparams is None:
-            pipeline = Pipeline(
-                [('scaler', StandardScaler()), ('model', self.model_cls())]
-            )
-        else:
-            pipeline = Pipeline(
-                [
-                    ('scaler', StandardScaler()),
-                    ('model', self.model_cls(**model_hyperparams)),
-                ]
-            )
-        return pipeline
+        return get_pipeline(self.model_cls, model_hyperparams)
 
     def fit(
         self,
@@ -380,6 +369,8 @@ class LazyPredictSuggestedModelWithHyperparameterTuning:
         y: pd.Series,
         hyperparam_search_trials: Optional[int] = 0,
         hyperparam_search_n_splits: Optional[int] = 5,
+        hyperparam_search_n_jobs: Optional[int] = 1,
+        hyperparam_search_blas_threads: Optional[int] = 1,
     ) -> None:
         """
         Fit the model to the training data.
@@ -387,9 +378,16 @@ class LazyPredictSuggestedModelWithHyperparameterTuning:
         Args:
             X (pd.DataFrame): Training features.
             y (pd.Series): Target variable.
+            hyperparam_search_trials (int): Number of Optuna trials, 0 to fit the
+                default hyperparameters.
+            hyperparam_search_n_splits (int): Number of folds of each trial.
+            hyperparam_search_n_jobs (int): Number of processes running the trials.
+            hyperparam_search_blas_threads (int): BLAS threads of each process.
         """
         self.hyperparam_search_trials = hyperparam_search_trials
         self.hyperparam_search_n_splits = hyperparam_search_n_splits
+        self.hyperparam_search_n_jobs = hyperparam_search_n_jobs
+        self.hyperparam_search_blas_threads = hyperparam_search_blas_threads
         if self.hyperparam_search_trials == 0:
             logger.info(
                 'No hyperparameter search trials specified, fitting the model with default parameters.'
@@ -408,13 +406,34 @@ class LazyPredictSuggestedModelWithHyperparameterTuning:
             logger.info('Fitting the model with the best hyperparameters...')
             self.pipeline.fit(X, y)
 
+    def fit_with_hyperparameters(
+        self, X: pd.DataFrame, y: pd.Series, hyperparams: dict
+    ) -> None:
+        """
+        Fits the model with hyperparameters found beforehand, e.g. by the model
+        selection.
+        """
+        self.pipeline = self._get_pipeline(model_hyperparams=hyperparams)
+        self.pipeline.fit(X, y)
+
+    def get_search_space(
+        self, X_train: pd.DataFrame
+    ) -> Tuple[type, Callable[[optuna.Trial], dict]]:
+        """
+        Returns the model class and the function suggesting its hyperparameters.
+        """
+        return self.model_cls, self._suggest_params
+
     def _find_best_hyperparameters(
         self,
         X_train: pd.DataFrame,
         y_train: pd.Series,
     ) -> dict:
         """
-        Placeholder for hyperparameter tuning logic.
+        Runs an Optuna search of `hyperparam_search_trials` trials over the search
+        space of `get_search_space`, each scored by its mean MAE on the
+        `TimeSeriesSplit` folds of the training data.
+
         Args:
             X_train (pd.DataFrame): Training data.
             y_train (pd.Series): Training target.
@@ -422,45 +441,19 @@ class LazyPredictSuggestedModelWithHyperparameterTuning:
             dict: Best hyperparameters found.
         """
 
-        def objective(trial: optuna.Trial) -> float:
-            """
-            Objective function for hyperparameter tuning to make optuna work.
-
-            Args:
-                trial (optuna.Trial): The optuna trial object.
-
-            Returns:
-                float: The mean absolute error of the model on the split sets.
-            """
-            params = self._suggest_params(trial)
-            # We split the training data into n_splits and evaluate the model on each split
-            # And remember it is a time series data, so we need to use TimeSeriesSplit
-            tscv = TimeSeriesSplit(n_splits=self.hyperparam_search_n_splits)
-            mae_scores = []
-            for train_index, val_index in tscv.split(X_train):
-                X_train_split, X_val_split = (
-                    X_train.iloc[train_index],
-                    X_train.iloc[val_index],
-                )
-                y_train_split, y_val_split = (
-                    y_train.iloc[train_index],
-                    y_train.iloc[val_index],
-                )
-                # Build pipeline with the current hyperparameters
-                self.pipeline = self._get_pipeline(model_hyperparams=params)
-                self.pipeline.fit(X_train_split, y_train_split)
-                y_pred = self.pipeline.predict(X_val_split)
-                mae_scores.append(mean_absolute_error(y_val_split, y_pred))
-            return np.mean(mae_scores)
-
-        # Create an Optuna study to find the best hyperparameters
-        study = optuna.create_study(direction='minimize')
-        # Run the trials
-        logger.info(
-            f'Starting hyperparameter tuning with {self.hyperparam_search_trials} trials...'
+        # The trials are evaluated on the TimeSeriesSplit folds of the training data,
+        # in parallel if `hyperparam_search_n_jobs` > 1
+        model_cls, suggest_params = self.get_search_space(X_train)
+        return search_hyperparameters(
+            model_cls,
+            suggest_params,
+            X_train,
+            y_train,
+            n_trials=self.hyperparam_search_trials,
+            n_splits=self.hyperparam_search_n_splits,
+            n_jobs=self.hyperparam_search_n_jobs,
+            blas_threads=self.hyperparam_search_blas_threads,
         )
-        study.optimize(objective, n_trials=self.hyperparam_search_trials)
-        return study.best_trial.params
 
     def predict(self, X: pd.DataFrame) -> pd.Series:
         """
@@ -1,18 +1,20 @@
 # The training script for the predictor service.
 
 import os
-from typing import Optional
+import time
+from typing import Literal, Optional
 
 import mlflow
-import numpy as np
 import pandas as pd
 from loguru import logger
-from risingwave import OutputFormat, RisingWave, RisingWaveConnOptions
 from sklearn.metrics import mean_absolute_error
 from ydata_profiling import ProfileReport
 
 from predictor.data_validation import validate_data
+from predictor.feature_cache import FeatureCache
+from predictor.loader import load_training_data, peak_rss_mb
 from predictor.model_registry import get_model_name, push_model
+from predictor.model_selection import nested_search_fits, select_model
 from predictor.models import BaselineModel, get_model_candidates, get_model_obj
 
 
@@ -35,54 +37,6 @@ def generate_data_exploratory_analysis_report(
     profile.to_file(output_html_path)
 
 
-def load_ts_data_from_risingwave(
-    host: str,
-    port: int,
-    user: str,
-    password: str,
-    database: str,
-    table: str,
-    pair: str,
-    lookback_period: int,
-    candle_seconds: int,
-) -> pd.DataFrame:
-    """
-    Loads time series data from RisingWave for the specific crypto.
-    Args:
-        host (str): The RisingWave host.
-        port (int): The RisingWave port.
-        user (str): The RisingWave user.
-        password (str): The RisingWave password.
-        database (str): The RisingWave database.
-        pair (str): The crypto pair to load data for.
-        lookback_period (int): The number of days in the past to load data for.
-        candle_seconds (int): The candle duration in seconds.
-    Returns:
-        pd.DataFrame: The time series data for the specified crypto pair.
-    """
-    logger.info('Establishing connection to RisingWave...')
-    rw = RisingWave(
-        RisingWaveConnOptions.from_connection_info(
-            host=host,
-            port=port,
-            user=user,
-            password=password,
-            database=database,
-        )
-    )
-    query = f"""
-    SELECT * FROM {table}
-    WHERE pair='{pair}' and to_timestamp(window_start_ms/1000) > now() - interval '{lookback_period} day'
-    and candle_seconds={candle_seconds}
-    order by window_start_ms;
-    """
-    ts_data = rw.fetch(query, format=OutputFormat.DATAFRAME)
-    logger.info(
-        f'Successfully loaded {len(ts_data)} time series rows data from RisingWave for the pair {pair}.'
-    )
-    return ts_data
-
-
 def train(
     mlflow_tracking_uri: str,
     risingwave_host: str,
@@ -105,6 +59,14 @@ def train(
     model_name: Optional[str] = None,
     n_model_candidates: Optional[int] = 10,
     max_percentage_diff_vs_baseline: Optional[float] = 0.05,
+    training_data_dtype: Literal['float32', 'float64'] = 'float64',
+    training_data_chunk_rows: int = 50000,
+    feature_cache_dir: Optional[str] = None,
+    feature_cache_max_age_days: float = 7,
+    hyperparam_search_n_jobs: int = 1,
+    hyperparam_search_blas_threads: int = 1,
+    model_selection_budget: float = 100,
+    model_selection_budget_unit: Literal['fits', 'seconds'] = 'fits',
 ):
     """
     Trains a predictor for the given pair and data, and if the model is good enough, it pushes it
@@ -135,20 +97,48 @@ def train(
         mlflow.log_param(
             'max_percentage_diff_vs_baseline', max_percentage_diff_vs_baseline
         )
-        # Step 1: Load the time series data from RisingWave
-        ts_data = load_ts_data_from_risingwave(
-            host=risingwave_host,
-            port=risingwave_port,
-            user=risingwave_user,
-            password=risingwave_password,
-            database=risingwave_database,
-            table=risingwave_table,
-            pair=pair,
-            lookback_period=lookback_period,
-            candle_seconds=candle_seconds,
+        # Step 1: Load the features of the time series data from RisingWave
+        load_start = time.monotonic()
+
+        def fetch(since_ms: Optional[int] = None) -> pd.DataFrame:
+            columns = features
+            if feature_cache_dir and 'window_start_ms' not in features:
+                # the cache merges its parts on the window
+                columns = features + ['window_start_ms']
+            return load_training_data(
+                host=risingwave_host,
+                port=risingwave_port,
+                user=risingwave_user,
+                password=risingwave_password,
+                database=risingwave_database,
+                table=risingwave_table,
+                pairs=[pair],
+                lookback_period=lookback_period,
+                candle_seconds=candle_seconds,
+                features=columns,
+                dtype=training_data_dtype,
+                chunk_rows=training_data_chunk_rows,
+                since_ms=since_ms,
+            )
+
+        if feature_cache_dir:
+            ts_data = FeatureCache(
+                feature_cache_dir, max_age_days=feature_cache_max_age_days
+            ).load(
+                pair=pair,
+                candle_seconds=candle_seconds,
+                features=features,
+                lookback_period=lookback_period,
+                fetch=fetch,
+                dtype=training_data_dtype,
+            )
+        else:
+            ts_data = fetch()
+        mlflow.log_metric(
+            'load_rows_per_sec',
+            len(ts_data) / max(time.monotonic() - load_start, 1e-9),
         )
-        # Keep only the features
-        ts_data = ts_data[features]
+        mlflow.log_metric('load_peak_rss_mb', peak_rss_mb())
         # Step 2: Add a target column
         ts_data['target'] = ts_data['close'].shift(
             -prediction_horizon_seconds // candle_seconds
@@ -210,11 +200,6 @@ def train(
         mlflow.log_metric('test_mae_baseline', test_mae_baseline)
         logger.info(f'Test MAE for baseline model: {test_mae_baseline:.4f}')
         # Step 8:Find the best model candidate,if model_name is not provided
-        best_model_name = None
-        best_cv_score = float('inf')  # Lower MAE is better
-        from sklearn.model_selection import TimeSeriesSplit
-
-        tscv = TimeSeriesSplit(n_splits=hyperparam_search_n_splits)
         if model_name is None:
             # We fit n_model_candidates models with default hyperparameters to
             # find the best model candidate
@@ -225,44 +210,37 @@ def train(
                 y_test,
                 n_candidates=n_model_candidates,
             )
-            # model_name = model_names[0]
             for model_name in model_names:
                 logger.info(f'Found model candidate: {model_name}')
-                cv_mae_scores = []
-                model = get_model_obj(model_name)
-                for train_index, val_index in tscv.split(X_train):
-                    X_tr, X_val = X_train.iloc[train_index], X_train.iloc[val_index]
-                    y_tr, y_val = y_train.iloc[train_index], y_train.iloc[val_index]
-                    # in the next step
-                    # Step 9: Pick the best model from the table and train it with the best hyperparameters
-                    # logger.info(f'Start training model: {model} with hyperparams search')
-                    model.fit(
-                        X_tr,
-                        y_tr,
-                        hyperparam_search_trials=hyperparam_search_trials,
-                        hyperparam_search_n_splits=hyperparam_search_n_splits,
-                    )
-                    y_val_pred = model.predict(X_val)
-                    val_mae = mean_absolute_error(y_val, y_val_pred)
-                    cv_mae_scores.append(val_mae)
-                mean_cv_mae = np.mean(cv_mae_scores)
-                logger.info(f'Model candidate {model_name} CV MAE: {mean_cv_mae:.4f}')
-                # mlflow.log_metric(f'cv_mae_{model_name}', mean_cv_mae)
-                if mean_cv_mae < best_cv_score:
-                    best_cv_score = mean_cv_mae
-                    best_model_name = model_name
+            # Step 9: Pick the best candidate and hyperparameters with successive
+            # halving over the candidates, within a single budget
+            selection = select_model(
+                {model_name: get_model_obj(model_name) for model_name in model_names},
+                X_train,
+                y_train,
+                budget=model_selection_budget,
+                budget_unit=model_selection_budget_unit,
+                n_splits=hyperparam_search_n_splits,
+                n_jobs=hyperparam_search_n_jobs,
+                blas_threads=hyperparam_search_blas_threads,
+            )
+            best_model_name = selection.model_name
+            nested_fits = nested_search_fits(
+                len(model_names), hyperparam_search_trials, hyperparam_search_n_splits
+            )
             logger.info(
-                f'Best model candidate based on CV MAE: {best_model_name} with score {best_cv_score:.4f}'
+                f'Best model candidate based on CV MAE: {best_model_name} with score '
+                f'{selection.cv_mae:.4f}, {selection.n_fits} fits vs {nested_fits} '
+                'with a hyperparameter search per fold and candidate'
             )
             mlflow.log_param('best_model_name', best_model_name)
-            # Now get the best model and do hyperparameter tuning on the training data
+            mlflow.log_param('best_hyperparams', selection.hyperparams)
+            mlflow.log_metric('cv_mae', selection.cv_mae)
+            mlflow.log_metric('model_selection_fits', selection.n_fits)
+            mlflow.log_metric('model_selection_fits_nested', nested_fits)
+            # Now fit the best model with the hyperparameters of the winning trial
             best_model = get_model_obj(best_model_name)
-            best_model.fit(
-                X_train,
-                y_train,
-                hyperparam_search_trials=hyperparam_search_trials,
-                hyperparam_search_n_splits=hyperparam_search_n_splits,
-            )
+            best_model.fit_with_hyperparameters(X_train, y_train, selection.hyperparams)
             # Step 10: Final evaluation on the test set
             y_test_pred = best_model.predict(X_test)
             test_mae = mean_absolute_error(y_test, y_test_pred)
@@ -326,4 +304,12 @@ if __name__ == '__main__':
         n_model_candidates=config.n_model_candidates,
         max_percentage_rows_with_nulls=config.max_percentage_rows_with_nulls,  # Example parameter for data validation
         max_percentage_diff_vs_baseline=config.max_percentage_diff_vs_baseline,  # Example parameter for model performance validation
+        training_data_dtype=config.training_data_dtype,
+        training_data_chunk_rows=config.training_data_chunk_rows,
+        feature_cache_dir=config.feature_cache_dir,
+        feature_cache_max_age_days=config.feature_cache_max_age_days,
+        hyperparam_search_n_jobs=config.hyperparam_search_n_jobs,
+        hyperparam_search_blas_threads=config.hyperparam_search_blas_threads,
+        model_selection_budget=config.model_selection_budget,
+        model_selection_budget_unit=config.model_selection_budget_unit,
     )
@@ -0,0 +1,182 @@
+"""
+Hyperparameter search shared by the model wrappers.
+
+The Optuna study runs in the main process with its ask and tell interface, and
+the folds of the `TimeSeriesSplit` of every trial are fitted by a pool of worker
+processes, on the scaled matrices of the `FoldCache`. The folds of a trial run
+one after the other, so the pruner can stop a hopeless trial after its first
+folds, and the trials run in parallel.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import optuna
+import pandas as pd
+from loguru import logger
+from optuna.trial import TrialState
+from sklearn.metrics import mean_absolute_error
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+
+from predictor.fold_cache import FoldCache
+
+# The fold cache of the process, set once per worker by `_init_worker`
+_data: Dict[str, FoldCache] = {}
+
+
+def get_pipeline(model_cls, model_hyperparams: Optional[dict] = None) -> Pipeline:
+    """
+    Returns the pipeline with the model and preprocessor.
+    """
+    return Pipeline(
+        [
+            ('scaler', StandardScaler()),
+            ('model', model_cls(**(model_hyperparams or {}))),
+        ]
+    )
+
+
+def _init_worker(fold_cache: FoldCache, blas_threads: Optional[int]) -> None:
+    _data['fold_cache'] = fold_cache
+    if blas_threads:
+        # every worker gets its share of the cores, instead of one BLAS thread per
+        # core each
+        threadpool_limits(limits=blas_threads)
+
+
+def fold_mae(model_cls, params: dict, fold: int) -> float:
+    """
+    Fits the model on the scaled training rows of a fold and returns its MAE on
+    the validation ones, i.e. what the pipeline would score.
+    """
+    X_train, y_train, X_val, y_val = _data['fold_cache'].fold(fold)
+    model = model_cls(**params)
+    model.fit(X_train, y_train)
+    return mean_absolute_error(y_val, model.predict(X_val))
+
+
+class _InlineExecutor:
+    """
+    Runs the tasks in the calling process, when the search is not parallel.
+    """
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+    def shutdown(self, **kwargs) -> None:
+        _data.clear()
+
+
+def get_executor(
+    fold_cache: FoldCache, n_jobs: int = 1, blas_threads: Optional[int] = 1
+):
+    """
+    Returns the executor running `fold_mae` on the folds of `fold_cache`, a pool of
+    `n_jobs` worker processes (the cache must then be shared) or the calling
+    process itself.
+    """
+    if n_jobs > 1:
+        return ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_worker,
+            initargs=(fold_cache, blas_threads),
+        )
+    _init_worker(fold_cache, None)
+    return _InlineExecutor()
+
+
+def search_hyperparameters(
+    model_cls,
+    suggest_params: Callable[[optuna.Trial], dict],
+    X_train: pd.DataFrame,
+    y_train: pd.Series,
+    n_trials: int,
+    n_splits: int,
+    n_jobs: int = 1,
+    blas_threads: Optional[int] = 1,
+) -> dict:
+    """
+    Finds the hyperparameters of the pipeline of `model_cls` with the lowest mean
+    MAE over the `TimeSeriesSplit` folds of the training data.
+
+    Args:
+        model_cls: The sklearn-like estimator class.
+        suggest_params (Callable[[optuna.Trial], dict]): Suggests the
+            hyperparameters of a trial.
+        X_train (pd.DataFrame): Training data.
+        y_train (pd.Series): Training target.
+        n_trials (int): The number of trials.
+        n_splits (int): The number of folds of each trial.
+        n_jobs (int): The number of worker processes, 1 to run in this process.
+        blas_threads (int): The number of BLAS threads of each worker.
+
+    Returns:
+        dict: Best hyperparameters found.
+    """
+    fold_cache = FoldCache(X_train, y_train, n_splits, shared=n_jobs > 1)
+    n_folds = fold_cache.n_splits
+    study = optuna.create_study(
+        direction='minimize',
+        # a trial whose mean MAE over its first folds is worse than the median of
+        # the previous trials over the same folds is stopped
+        pruner=optuna.pruners.MedianPruner(),
+    )
+    executor = get_executor(fold_cache, n_jobs, blas_threads)
+
+    logger.info(
+        f'Starting hyperparameter tuning with {n_trials} trials of {n_folds} '
+        f'folds on {n_jobs} processes...'
+    )
+    running: Dict[Future, tuple] = {}
+    started = 0
+    n_pruned = 0
+
+    def submit(trial: optuna.Trial, params: dict, fold: int, scores: List[float]):
+        future = executor.submit(fold_mae, model_cls, params, fold)
+        running[future] = (trial, params, fold, scores)
+
+    def start_trial() -> None:
+        nonlocal started
+        trial = study.ask()
+        submit(trial, suggest_params(trial), 0, [])
+        started += 1
+
+    try:
+        while started < n_trials and len(running) < max(n_jobs, 1):
+            start_trial()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial, params, fold, scores = running.pop(future)
+                try:
+                    scores.append(future.result())
+                except Exception:
+                    study.tell(trial, state=TrialState.FAIL)
+                    raise
+                trial.report(float(np.mean(scores)), step=fold)
+                if trial.should_prune():
+                    study.tell(trial, state=TrialState.PRUNED)
+                    n_pruned += 1
+                elif fold + 1 < n_folds:
+                    submit(trial, params, fold + 1, scores)
+                    continue
+                else:
+                    study.tell(trial, float(np.mean(scores)))
+                if started < n_trials:
+                    start_trial()
+    finally:
+        executor.shutdown(cancel_futures=True)
+        fold_cache.close()
+
+    logger.info(
+        f'Pruned {n_pruned}/{n_trials} trials, best mean MAE {study.best_value:.4f}'
+    )
+    return study.best_trial.params
@@ -0,0 +1,134 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from predictor.feature_cache import MANIFEST, FeatureCache
+
+CANDLE_SECONDS = 3600
+FEATURES = ['close', 'sma_7', 'window_start_ms']
+
+
+class FakeSource:
+    """
+    Stands in for RisingWave: the candles of the last 3 days, and the `since` of
+    every fetch.
+    """
+
+    def __init__(self):
+        now_ms = int(time.time() * 1000)
+        window_ms = CANDLE_SECONDS * 1000
+        end_ms = now_ms // window_ms * window_ms
+        starts = np.arange(end_ms - 3 * 24 * window_ms, end_ms + 1, window_ms)
+        self.rows = pd.DataFrame(
+            {
+                'close': np.arange(len(starts), dtype=np.float64),
+                'sma_7': np.arange(len(starts), dtype=np.float64) / 2,
+                'window_start_ms': starts,
+            }
+        )
+        self.fetches = []
+
+    def fetch(self, since_ms):
+        self.fetches.append(since_ms)
+        rows = self.rows[self.rows['window_start_ms'] >= since_ms]
+        return rows.reset_index(drop=True)
+
+    def add_window(self):
+        new = self.rows.tail(1).copy()
+        new['close'] += 1
+        new['window_start_ms'] += CANDLE_SECONDS * 1000
+        self.rows = pd.concat([self.rows, new], ignore_index=True)
+
+
+def load(cache, source, lookback_period=1):
+    return cache.load(
+        'ETH/EUR', CANDLE_SECONDS, FEATURES, lookback_period, source.fetch
+    )
+
+
+def expected(source, data):
+    since_ms = data['window_start_ms'].iloc[0]
+    rows = source.rows[source.rows['window_start_ms'] >= since_ms]
+    return rows.reset_index(drop=True)[FEATURES]
+
+
+def read_manifest(cache):
+    entry_dir = cache.entry_dir('ETH/EUR', CANDLE_SECONDS, FEATURES, 'float64')
+    with open(os.path.join(entry_dir, MANIFEST)) as file:
+        return entry_dir, json.load(file)
+
+
+def test_only_the_new_windows_are_fetched(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    source = FakeSource()
+    first = load(cache, source)
+    assert len(first) in (24, 25)
+    pd.testing.assert_frame_equal(first, expected(source, first))
+
+    # the latest window is updated, and a new one starts
+    source.rows.loc[len(source.rows) - 1, 'close'] = -1.0
+    source.add_window()
+    second = load(cache, source)
+
+    latest_ms = first['window_start_ms'].iloc[-1]
+    assert source.fetches[1] == latest_ms - 2 * CANDLE_SECONDS * 1000
+    pd.testing.assert_frame_equal(second, expected(source, second))
+    assert second['close'].iloc[-2] == -1.0
+
+
+def test_parts_are_compacted(tmp_path):
+    cache = FeatureCache(str(tmp_path), max_parts=2)
+    source = FakeSource()
+    for _ in range(4):
+        data = load(cache, source)
+        source.add_window()
+
+    entry_dir, manifest = read_manifest(cache)
+    assert len(manifest['parts']) <= 2
+    assert sorted(os.listdir(entry_dir)) == sorted(
+        [MANIFEST] + [part['file'] for part in manifest['parts']]
+    )
+    pd.testing.assert_frame_equal(data, expected(source, data).iloc[:-1])
+
+
+def test_a_changed_part_drops_the_entry(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    source = FakeSource()
+    load(cache, source)
+
+    entry_dir, manifest = read_manifest(cache)
+    with open(os.path.join(entry_dir, manifest['parts'][0]['file']), 'ab') as file:
+        file.write(b'garbage')
+    data = load(cache, source)
+
+    # fetched again from the start of the lookback
+    assert source.fetches[1] <= source.fetches[0] + 60000
+    pd.testing.assert_frame_equal(data, expected(source, data))
+
+
+def test_a_longer_lookback_fetches_everything_again(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    source = FakeSource()
+    load(cache, source, lookback_period=1)
+    data = load(cache, source, lookback_period=2)
+
+    assert source.fetches[1] < source.fetches[0]
+    assert len(data) in (48, 49)
+
+
+def test_unused_entries_are_evicted(tmp_path):
+    cache = FeatureCache(str(tmp_path), max_age_days=1)
+    source = FakeSource()
+    load(cache, source)
+    entry_dir, manifest = read_manifest(cache)
+
+    cache.evict()
+    assert os.path.isdir(entry_dir)
+
+    manifest['last_used'] = time.time() - 2 * 24 * 3600
+    with open(os.path.join(entry_dir, MANIFEST), 'w') as file:
+        json.dump(manifest, file)
+    cache.evict()
+    assert not os.path.exists(entry_dir)
@@ -0,0 +1,67 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from predictor.fold_cache import FoldCache, time_series_folds
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.preprocessing import StandardScaler
+
+
+def make_data(n_rows=103, dtype=np.float64, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n_rows, 3)).astype(dtype), columns=list('abc'))
+    # a constant feature, which StandardScaler only centers
+    X['d'] = np.ones(n_rows, dtype=dtype)
+    y = pd.Series(rng.normal(size=n_rows))
+    return X, y
+
+
+def test_time_series_folds():
+    folds = list(TimeSeriesSplit(n_splits=4).split(np.empty(103)))
+    assert time_series_folds(103, 4) == [
+        (len(train), len(train) + len(val)) for train, val in folds
+    ]
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_folds_match_standard_scaler(dtype):
+    X, y = make_data(dtype=dtype)
+    cache = FoldCache(X, y, n_splits=4)
+
+    for index, (train, val) in enumerate(TimeSeriesSplit(n_splits=4).split(X)):
+        scaler = StandardScaler().fit(X.iloc[train])
+        X_train, y_train, X_val, y_val = cache.fold(index)
+        assert X_train.dtype == dtype
+        rtol = 1e-5 if dtype == np.float32 else 1e-12
+        np.testing.assert_allclose(
+            X_train, scaler.transform(X.iloc[train]), rtol=rtol, atol=rtol
+        )
+        np.testing.assert_allclose(
+            X_val, scaler.transform(X.iloc[val]), rtol=rtol, atol=rtol
+        )
+        np.testing.assert_array_equal(y_train, y.iloc[train])
+        np.testing.assert_array_equal(y_val, y.iloc[val])
+        assert not X_train.flags.writeable
+
+
+def test_shared_cache_round_trip():
+    X, y = make_data()
+    cache = FoldCache(X, y, n_splits=3, shared=True)
+    # what a worker process gets
+    attached = pickle.loads(pickle.dumps(cache))
+    try:
+        for index in range(cache.n_splits):
+            for expected, value in zip(
+                cache.fold(index), attached.fold(index), strict=True
+            ):
+                np.testing.assert_array_equal(value, expected)
+    finally:
+        attached.close()
+        cache.close()
+
+
+def test_only_a_shared_cache_can_be_pickled():
+    X, y = make_data()
+    with pytest.raises(TypeError):
+        pickle.dumps(FoldCache(X, y, n_splits=3))
@@ -0,0 +1,102 @@
+import numpy as np
+import optuna
+import pandas as pd
+import pytest
+from predictor.model_selection import (
+    _n_fits,
+    _rung_folds,
+    nested_search_fits,
+    select_model,
+)
+from sklearn.dummy import DummyRegressor
+from sklearn.linear_model import Ridge
+
+optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+
+class RidgeCandidate:
+    def get_search_space(self, X):
+        return Ridge, lambda trial: {
+            'alpha': trial.suggest_float('alpha', 1e-3, 1e3, log=True)
+        }
+
+
+class DummyCandidate:
+    def get_search_space(self, X):
+        return DummyRegressor, lambda trial: {
+            'strategy': trial.suggest_categorical('strategy', ['mean', 'median'])
+        }
+
+
+class FailingCandidate:
+    def get_search_space(self, X):
+        # an invalid alpha, every fit raises
+        return Ridge, lambda trial: {'alpha': -trial.suggest_float('alpha', 1, 2)}
+
+
+def make_data(n_rows=300, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n_rows, 4)), columns=list('abcd'))
+    y = pd.Series(2 * X['a'] + X['b'] + rng.normal(0, 0.1, n_rows))
+    return X, y
+
+
+@pytest.mark.parametrize(
+    'n_splits, eta, expected',
+    [
+        (1, 3, [1]),
+        (3, 3, [1, 3]),
+        (5, 3, [1, 3, 5]),
+        (9, 3, [1, 3, 9]),
+        (5, 2, [1, 2, 4, 5]),
+    ],
+)
+def test_rung_folds(n_splits, eta, expected):
+    assert _rung_folds(n_splits, eta) == expected
+
+
+def test_n_fits():
+    # 27 arms on 1 fold, 9 on 2 more, 3 on the last 2
+    assert _n_fits(27, [1, 3, 5], 3) == 27 + 9 * 2 + 3 * 2
+    # at least one arm goes to every rung
+    assert _n_fits(2, [1, 3, 5], 3) == 2 + 1 * 2 + 1 * 2
+    assert _n_fits(1, [1], 3) == 1
+
+
+def test_nested_search_fits():
+    # 2 candidates, 5 folds, 10 trials: a search of 51 fits per fold and candidate,
+    # and one on the whole data
+    assert nested_search_fits(2, 10, 5) == 2 * 5 * 51 + 51
+
+
+def test_select_model_within_a_fits_budget():
+    X, y = make_data()
+    candidates = {'Dummy': DummyCandidate(), 'Ridge': RidgeCandidate()}
+    selection = select_model(candidates, X, y, budget=40, n_splits=5, eta=3)
+
+    assert selection.model_name == 'Ridge'
+    assert selection.cv_mae < 0.2
+    assert 0 < selection.n_fits <= 40
+    # the most arms the budget allows
+    n_arms = max(n for n in range(1, 40) if _n_fits(n, [1, 3, 5], 3) <= 40)
+    assert selection.n_fits == _n_fits(n_arms, [1, 3, 5], 3)
+
+
+def test_select_model_skips_the_failing_arms():
+    X, y = make_data()
+    candidates = {'Failing': FailingCandidate(), 'Dummy': DummyCandidate()}
+    selection = select_model(candidates, X, y, budget=20, n_splits=3)
+
+    assert selection.model_name == 'Dummy'
+
+
+def test_select_model_without_any_scored_arm():
+    X, y = make_data()
+    with pytest.raises(ValueError):
+        select_model({'Failing': FailingCandidate()}, X, y, budget=10, n_splits=3)
+
+
+def test_select_model_unknown_budget_unit():
+    X, y = make_data()
+    with pytest.raises(ValueError):
+        select_model({'Ridge': RidgeCandidate()}, X, y, budget=10, budget_unit='days')
@@ -8,6 +8,12 @@ CREATE TABLE technical_indicators (
     window_start_ms BIGINT,
     window_end_ms BIGINT,
     candle_seconds INT,
+    trade_count INT,
+    vwap FLOAT,
+    buy_volume FLOAT,
+    sell_volume FLOAT,
+    first_trade_ms BIGINT,
+    last_trade_ms BIGINT,
     sma_7 FLOAT,
     sma_14 FLOAT,
     sma_21 FLOAT,
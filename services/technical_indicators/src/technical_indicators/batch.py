@@ -0,0 +1,327 @@
+"""
+Computes the technical indicators of a whole candle history in one pass per pair,
+with full-array talib calls, instead of replaying it candle by candle through the
+streaming service, then exits.
+
+    # from a candles file (.parquet, .csv or .jsonl) to a file
+    uv run services/technical_indicators/src/technical_indicators/batch.py from_file \\
+        --candles_path=candles.parquet --output_path=technical_indicators.parquet
+
+    # from the candles topic, up to its current end, to the technical indicators topic
+    uv run services/technical_indicators/src/technical_indicators/batch.py from_topic \\
+        --kafka_broker_address=localhost:31234 \\
+        --kafka_input_topic=candles_historical \\
+        --kafka_output_topic=technical_indicators
+
+    # from the candle columns of a RisingWave table, e.g. after adding indicators
+    uv run services/technical_indicators/src/technical_indicators/batch.py \\
+        from_risingwave --output_path=technical_indicators.parquet
+
+The indicators and cross-pair features are the ones declared in configs.yaml, with
+the values of the 'incremental' engine, i.e. over the whole history of each pair.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import talib
+from candles.serializers import decode_binary
+from common.batch import read_file, read_topic, write_file
+from common.serializers import BinaryDeserializer
+from fire import Fire
+from loguru import logger
+from quixstreams import Application
+
+from technical_indicators.config import IndicatorConfig, config
+from technical_indicators.cross import compute_cross_features
+from technical_indicators.serializers import SerializerName, get_serializer
+
+
+def read_candles_topic(
+    kafka_broker_address: str, kafka_input_topic: str
+) -> pd.DataFrame:
+    """
+    Reads the candles topic from its beginning up to its end offsets at the time of
+    the call.
+
+    Returns:
+        pd.DataFrame: The candles, in the order of the topic within each pair
+    """
+    return pd.DataFrame(
+        read_topic(
+            kafka_broker_address,
+            kafka_input_topic,
+            BinaryDeserializer(decode_binary),
+            consumer_group_prefix='technical-indicators-batch',
+        )
+    )
+
+
+def read_candles_risingwave(
+    host: str,
+    port: int,
+    user: str,
+    password: str,
+    database: str,
+    table: str,
+    candle_seconds: int,
+) -> pd.DataFrame:
+    """
+    Reads the candle columns of a RisingWave table.
+
+    Args:
+        host (str): The RisingWave host.
+        port (int): The RisingWave port.
+        user (str): The RisingWave user.
+        password (str): The RisingWave password.
+        database (str): The RisingWave database.
+        table (str): The table, the technical indicators one.
+        candle_seconds (int): The candle duration in seconds.
+
+    Returns:
+        pd.DataFrame: The candles
+    """
+    import psycopg2
+    from psycopg2 import sql
+
+    from technical_indicators.table import CANDLE_COLUMNS
+
+    # the table is an identifier, it cannot be a bind parameter
+    if table != config.table_name_in_risingwave:
+        raise ValueError(
+            f'Unknown table {table}, expected {config.table_name_in_risingwave}'
+        )
+    columns = [name for name, _ in CANDLE_COLUMNS]
+    query = sql.SQL(
+        'SELECT {} FROM {} WHERE candle_seconds = %(candle_seconds)s '
+        'ORDER BY pair, window_start_ms'
+    ).format(
+        sql.SQL(', ').join(map(sql.Identifier, columns)),
+        sql.Identifier(table),
+    )
+
+    conn = psycopg2.connect(
+        host=host, port=port, user=user, password=password, dbname=database
+    )
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, {'candle_seconds': candle_seconds})
+            candles = pd.DataFrame(cursor.fetchall(), columns=columns)
+    finally:
+        conn.close()
+    logger.info(f'Loaded {len(candles)} candles from RisingWave table {table}')
+    return candles
+
+
+def _indicator_values(
+    indicator: IndicatorConfig, close: np.ndarray, volume: np.ndarray
+) -> Dict[str, np.ndarray]:
+    outputs = indicator.outputs
+    if indicator.type == 'sma':
+        return {outputs[0]: talib.SMA(close, timeperiod=indicator.period)}
+    if indicator.type == 'ema':
+        return {outputs[0]: talib.EMA(close, timeperiod=indicator.period)}
+    if indicator.type == 'rsi':
+        return {outputs[0]: talib.RSI(close, timeperiod=indicator.period)}
+    if indicator.type == 'macd':
+        values = talib.MACD(
+            close,
+            fastperiod=indicator.fast_period,
+            slowperiod=indicator.slow_period,
+            signalperiod=indicator.signal_period,
+        )
+        return dict(zip(outputs, values, strict=True))
+    if indicator.type == 'obv':
+        return {outputs[0]: talib.OBV(close, volume)}
+    raise ValueError(f'Unknown indicator type: {indicator.type}')
+
+
+def compute_indicators(
+    candles: pd.DataFrame,
+    candle_seconds: int,
+    indicators: List[IndicatorConfig],
+) -> pd.DataFrame:
+    """
+    Computes the indicators of every closed candle of every pair.
+
+    Only the latest update of each candle is kept, like the streaming service does
+    once the next candle of the pair arrives.
+
+    Args:
+        candles (pd.DataFrame): The candles, possibly with intermediate updates.
+        candle_seconds (int): Duration of the candles to compute the indicators of.
+        indicators (List[IndicatorConfig]): The indicators to compute.
+
+    Returns:
+        pd.DataFrame: The candles and their indicators, in the order of their windows
+    """
+    candles = candles[candles['candle_seconds'] == candle_seconds]
+    candles = (
+        candles.drop_duplicates(['pair', 'window_start_ms'], keep='last')
+        .sort_values(['pair', 'window_start_ms'], kind='stable')
+        .reset_index(drop=True)
+    )
+
+    columns: Dict[str, np.ndarray] = {}
+    for _, group in candles.groupby('pair', sort=False):
+        close = group['close'].to_numpy(dtype=np.float64)
+        volume = group['volume'].to_numpy(dtype=np.float64)
+        for indicator in indicators:
+            for name, values in _indicator_values(indicator, close, volume).items():
+                # the groups are contiguous, in the order of the rows
+                columns.setdefault(name, []).append(values)
+
+    for name, values in columns.items():
+        candles[name] = np.concatenate(values)
+    return candles.sort_values(['window_end_ms', 'pair'], kind='stable').reset_index(
+        drop=True
+    )
+
+
+def produce(
+    technical_indicators: pd.DataFrame,
+    kafka_broker_address: str,
+    kafka_output_topic: str,
+    kafka_output_serializer: SerializerName = 'json',
+) -> None:
+    """
+    Produces the technical indicators to their topic, keyed by pair like the
+    streaming service.
+    """
+    app = Application(broker_address=kafka_broker_address)
+    topic = app.topic(
+        name=kafka_output_topic,
+        value_serializer=get_serializer(kafka_output_serializer),
+    )
+    start = time.monotonic()
+    with app.get_producer() as producer:
+        for row in technical_indicators.to_dict(orient='records'):
+            message = topic.serialize(key=row['pair'], value=row)
+            producer.produce(
+                topic=topic.name,
+                key=message.key,
+                value=message.value,
+                timestamp=row['window_start_ms'],
+            )
+    logger.info(
+        f'Produced {len(technical_indicators)} messages to {kafka_output_topic} in '
+        f'{time.monotonic() - start:.1f}s'
+    )
+
+
+def _compute(candles: pd.DataFrame, candle_seconds: int) -> pd.DataFrame:
+    start = time.monotonic()
+    technical_indicators = compute_indicators(
+        candles, candle_seconds, config.indicators
+    )
+    technical_indicators = compute_cross_features(
+        technical_indicators, config.cross_features
+    )
+    logger.info(
+        f'Computed the indicators of {len(technical_indicators)} candles in '
+        f'{time.monotonic() - start:.1f}s'
+    )
+    return technical_indicators
+
+
+def from_file(
+    candles_path: str,
+    output_path: str,
+    candle_seconds: int = config.candle_seconds,
+):
+    """
+    Computes the indicators of a candles file into a file.
+
+    Args:
+        candles_path (str): The candles file, .parquet, .csv or .jsonl.
+        output_path (str): The output file, .parquet, .csv or .jsonl.
+        candle_seconds (int): Duration of the candles in seconds.
+    """
+    candles = read_file(candles_path)
+    write_file(_compute(candles, candle_seconds), output_path)
+
+
+def from_topic(
+    kafka_broker_address: str = config.kafka_broker_address,
+    kafka_input_topic: str = config.kafka_input_topic,
+    kafka_output_topic: str = config.kafka_output_topic,
+    candle_seconds: int = config.candle_seconds,
+    kafka_output_serializer: SerializerName = config.kafka_output_serializer,
+    output_path: Optional[str] = None,
+):
+    """
+    Computes the indicators of the candles topic, from its beginning to its current
+    end, and produces them to the technical indicators topic (or writes them to
+    `output_path`).
+
+    Args:
+        kafka_broker_address (str): Address of the Kafka broker.
+        kafka_input_topic (str): Name of the Kafka topic to read candles from.
+        kafka_output_topic (str): Name of the Kafka topic to write technical
+            indicators to.
+        candle_seconds (int): Duration of the candles in seconds.
+        kafka_output_serializer (str): Serializer of the technical indicators topic.
+        output_path (str): A file to write instead of producing them.
+    """
+    candles = read_candles_topic(kafka_broker_address, kafka_input_topic)
+    technical_indicators = _compute(candles, candle_seconds)
+    if output_path:
+        write_file(technical_indicators, output_path)
+    else:
+        produce(
+            technical_indicators,
+            kafka_broker_address,
+            kafka_output_topic,
+            kafka_output_serializer,
+        )
+
+
+def from_risingwave(
+    output_path: Optional[str] = None,
+    kafka_broker_address: str = config.kafka_broker_address,
+    kafka_output_topic: str = config.kafka_output_topic,
+    candle_seconds: int = config.candle_seconds,
+    host: str = 'localhost',
+    port: int = 4567,
+    user: str = 'root',
+    password: str = '',
+    database: str = 'dev',
+    table: str = config.table_name_in_risingwave,
+):
+    """
+    Computes the indicators of the candles in a RisingWave table, and writes them to
+    `output_path`, or produces them to the technical indicators topic.
+
+    Args:
+        output_path (str): A file to write instead of producing them.
+        kafka_broker_address (str): Address of the Kafka broker.
+        kafka_output_topic (str): Name of the Kafka topic to write technical
+            indicators to.
+        candle_seconds (int): Duration of the candles in seconds.
+        host (str): The RisingWave host.
+        port (int): The RisingWave port.
+        user (str): The RisingWave user.
+        password (str): The RisingWave password.
+        database (str): The RisingWave database.
+        table (str): The table to read the candles from.
+    """
+    candles = read_candles_risingwave(
+        host, port, user, password, database, table, candle_seconds
+    )
+    technical_indicators = _compute(candles, candle_seconds)
+    if output_path:
+        write_file(technical_indicators, output_path)
+    else:
+        produce(technical_indicators, kafka_broker_address, kafka_output_topic)
+
+
+if __name__ == '__main__':
+    Fire(
+        {
+            'from_file': from_file,
+            'from_topic': from_topic,
+            'from_risingwave': from_risingwave,
+        }
+    )
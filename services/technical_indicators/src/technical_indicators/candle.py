@@ -1,7 +1,75 @@
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
 from quixstreams import State
 
 from technical_indicators.config import config
 
+# Columns of the candle ring buffer, the price and volume ones are what talib needs
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+WINDOW_COLUMNS = ('window_start_ms', 'window_end_ms')
+
+# One state key per slot, so a new or replaced candle only writes its own slot and
+# the header, whatever the capacity
+_SLOT = struct.Struct('<dddddqq')
+# capacity, number of candles, next slot to write, and a sequence number bumped on
+# every write, to tell whether a cached buffer is up to date
+_HEADER = struct.Struct('<qqqq')
+_HEADER_KEY = 'candles_header'
+
+
+def _slot_key(slot: int) -> str:
+    return f'candles_{slot}'
+
+
+class TimeframeState:
+    """
+    The state of a pair for one candle duration: the keys of the pair's state,
+    prefixed with the duration.
+    """
+
+    def __init__(self, state: State, candle_seconds: int):
+        self.state = state
+        self.prefix = f'{candle_seconds}s_'
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.state.get(self.prefix + key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        self.state.set(self.prefix + key, value)
+
+    def get_bytes(self, key: str, default: Optional[bytes] = None) -> Optional[bytes]:
+        return self.state.get_bytes(self.prefix + key, default)
+
+    def set_bytes(self, key: str, value: bytes) -> None:
+        self.state.set_bytes(self.prefix + key, value)
+
+    def delete(self, key: str) -> None:
+        self.state.delete(self.prefix + key)
+
+    def exists(self, key: str) -> bool:
+        return self.state.exists(self.prefix + key)
+
+
+def timeframe_state(state: State, candle_seconds: int) -> State:
+    """
+    Returns the state of a pair for the candles of `candle_seconds`.
+
+    The state of `config.candle_seconds` keeps the unprefixed keys it had when the
+    service computed a single duration, so an existing state stays valid.
+
+    Args:
+        state (State): The state of the pair.
+        candle_seconds (int): The candle duration.
+
+    Returns:
+        State: The state of the pair for that duration
+    """
+    if candle_seconds == config.candle_seconds:
+        return state
+    return TimeframeState(state, candle_seconds)
+
 
 def are_same_window(candle: dict, previous_candle: dict) -> bool:
     """
@@ -19,31 +87,178 @@ def are_same_window(candle: dict, previous_candle: dict) -> bool:
     )
 
 
+class CandleBuffer:
+    """
+    Fixed-size columnar ring buffer of the last `capacity` candles of a pair.
+
+    The columns are numpy arrays, so the indicators get them without building them
+    from a list of dicts, and the oldest candle is dropped in O(1). In the state each
+    slot is a small binary record under its own key.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.count = 0
+        self.end = 0
+        self.seq = 0
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.zeros(capacity, dtype=np.float64) for name in PRICE_COLUMNS
+        }
+        self.columns.update(
+            {name: np.zeros(capacity, dtype=np.int64) for name in WINDOW_COLUMNS}
+        )
+
+    @property
+    def last(self) -> Optional[int]:
+        """
+        The slot of the latest candle, if any.
+        """
+        return (self.end - 1) % self.capacity if self.count else None
+
+    def is_same_window(self, candle: dict) -> bool:
+        last = self.last
+        return (
+            last is not None
+            and candle['window_start_ms'] == self.columns['window_start_ms'][last]
+            and candle['window_end_ms'] == self.columns['window_end_ms'][last]
+        )
+
+    def _write_slot(self, slot: int, candle: dict) -> None:
+        for name in PRICE_COLUMNS + WINDOW_COLUMNS:
+            self.columns[name][slot] = candle[name]
+
+    def _pack_slot(self, slot: int) -> bytes:
+        return _SLOT.pack(
+            *(self.columns[name][slot] for name in PRICE_COLUMNS + WINDOW_COLUMNS)
+        )
+
+    def push(self, candle: dict, state: Optional[State] = None) -> None:
+        """
+        Adds a candle, or replaces the latest one if it is in the same window, and
+        writes the changed slot to `state`.
+        """
+        if self.is_same_window(candle):
+            slot = self.last
+        else:
+            slot = self.end
+            self.end = (self.end + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+        self._write_slot(slot, candle)
+        self.seq += 1
+        if state is not None:
+            state.set_bytes(_slot_key(slot), self._pack_slot(slot))
+            state.set_bytes(_HEADER_KEY, self.header())
+
+    def header(self) -> bytes:
+        return _HEADER.pack(self.capacity, self.count, self.end, self.seq)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns a column of the candles in chronological order.
+        """
+        values = self.columns[name]
+        if self.count < self.capacity:
+            return values[: self.count]
+        return np.concatenate((values[self.end :], values[: self.end]))
+
+    def to_candles(self) -> list:
+        """
+        Returns the candles in chronological order, without their pair.
+        """
+        columns = {
+            name: self.column(name).tolist() for name in PRICE_COLUMNS + WINDOW_COLUMNS
+        }
+        return [
+            dict(zip(columns, values, strict=True))
+            for values in zip(*columns.values(), strict=True)
+        ]
+
+    @classmethod
+    def from_state(cls, state: State, capacity: int) -> 'CandleBuffer':
+        """
+        Loads the buffer of a pair from its state, resized to `capacity` if it was
+        stored with another one, or migrated from the former list of candle dicts.
+        """
+        header = state.get_bytes(_HEADER_KEY)
+        if header is None:
+            buffer = cls(capacity)
+            legacy = state.get('candles')
+            if legacy:
+                for candle in legacy[-capacity:]:
+                    buffer.push(candle)
+                buffer._write_all(state)
+                state.delete('candles')
+            return buffer
+
+        stored_capacity, count, end, seq = _HEADER.unpack(header)
+        buffer = cls(stored_capacity)
+        buffer.count, buffer.end, buffer.seq = count, end, seq
+        for slot in range(count):
+            values = _SLOT.unpack(state.get_bytes(_slot_key(slot)))
+            for name, value in zip(PRICE_COLUMNS + WINDOW_COLUMNS, values, strict=True):
+                buffer.columns[name][slot] = value
+        if stored_capacity == capacity:
+            return buffer
+
+        resized = cls(capacity)
+        resized.seq = seq
+        for candle in buffer.to_candles()[-capacity:]:
+            resized.push(candle)
+        for slot in range(capacity, stored_capacity):
+            state.delete(_slot_key(slot))
+        resized._write_all(state)
+        return resized
+
+    def _write_all(self, state: State) -> None:
+        for slot in range(self.count):
+            state.set_bytes(_slot_key(slot), self._pack_slot(slot))
+        state.set_bytes(_HEADER_KEY, self.header())
+
+
+# Buffers already loaded by this process, per pair and candle duration. A cached buffer is used as long
+# as its sequence number matches the one in the state header, i.e. no other consumer
+# wrote the state of the pair since (after a rebalance).
+_buffers: Dict[Tuple[str, int], CandleBuffer] = {}
+
+
+def load_candle_buffer(candle: dict, state: State) -> CandleBuffer:
+    """
+    Returns the candle buffer of the pair and candle duration of `candle`.
+
+    Args:
+        candle (dict): A candle of the pair.
+        state (State): The state of the pair for the candle duration, see
+            `timeframe_state`.
+
+    Returns:
+        CandleBuffer: The buffer, from the cache if it is up to date
+    """
+    key = (candle['pair'], candle['candle_seconds'])
+    buffer = _buffers.get(key)
+    if buffer is not None and buffer.capacity == config.max_candles_in_state:
+        header = state.get_bytes(_HEADER_KEY)
+        if header is not None and _HEADER.unpack(header)[3] == buffer.seq:
+            return buffer
+    buffer = CandleBuffer.from_state(state, config.max_candles_in_state)
+    _buffers[key] = buffer
+    return buffer
+
+
 def update_candles_in_state(candle: dict, state: State):
     """
-    Takes the current state (with the list of N previous candles) and the latest
-    candle, and update this list.
+    Takes the current state (with the buffer of N previous candles) and the latest
+    candle, and update this buffer.
     It can either happen that the latest candle is already in the state or that it is a new candle.
 
+    Only the slot of the candle and the buffer header are written to the state, so
+    the bytes written per message do not grow with `max_candles_in_state`.
+
     Args:
         candle (dict): The latest candle
-        state (State): The current state containing the list of previous candles.
+        state (State): The current state containing the buffer of previous candles.
     Returns:
         None
     """
-    candles = state.get('candles', default=[])
-    # chack if the candle is already in the state
-    if not candles:
-        # if the state is empty, add the candle to the state
-        candles.append(candle)
-    if are_same_window(candle, candles[-1]):
-        # replace the latest candle in state
-        candles[-1] = candle
-    else:
-        # add the candle to the state
-        candles.append(candle)
-    if len(candles) > config.max_candles_in_state:
-        # remove the oldest candle if the state is full
-        candles.pop(0)
-    state.set('candles', candles)
+    state = timeframe_state(state, candle['candle_seconds'])
+    load_candle_buffer(candle, state).push(candle, state)
     return candle
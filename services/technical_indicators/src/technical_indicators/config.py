@@ -1,6 +1,7 @@
 import os
-from typing import List, Optional
+from typing import List, Literal, Optional
 
+from pydantic import BaseModel, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 BASE_DIR = os.path.dirname(
@@ -10,8 +11,92 @@ ENV_FILE = os.path.join(BASE_DIR, 'settings.env')
 YAML_FILE = os.path.join(BASE_DIR, 'configs.yaml')
 
 
-# class TechnicalIndicators(BaseModel):
-#     sma: List[int]
+class IndicatorConfig(BaseModel):
+    """
+    An indicator of the catalog in configs.yaml.
+
+    `period` applies to 'sma', 'ema' and 'rsi', the three `*_period` to 'macd', and
+    'obv' takes none. `name` is the output column, by default the type and period
+    (e.g. 'sma_7'). A 'macd' has 3 outputs: `name`, and the signal and histogram,
+    'macdsignal_{fast_period}' and 'macdhist_{fast_period}' by default, or
+    '{name}_signal' and '{name}_hist' with an explicit `name`.
+    """
+
+    type: Literal['sma', 'ema', 'rsi', 'macd', 'obv']
+    period: Optional[int] = None
+    fast_period: Optional[int] = None
+    slow_period: Optional[int] = None
+    signal_period: Optional[int] = None
+    name: Optional[str] = None
+
+    @model_validator(mode='after')
+    def check_params(self) -> 'IndicatorConfig':
+        if self.type in ('sma', 'ema', 'rsi') and not self.period:
+            raise ValueError(f'{self.type} needs a period')
+        if self.type == 'macd' and not (
+            self.fast_period and self.slow_period and self.signal_period
+        ):
+            raise ValueError('macd needs a fast_period, slow_period and signal_period')
+        return self
+
+    @property
+    def outputs(self) -> List[str]:
+        if self.type == 'obv':
+            return [self.name or 'obv']
+        if self.type != 'macd':
+            return [self.name or f'{self.type}_{self.period}']
+        if self.name is None:
+            return [
+                f'macd_{self.fast_period}',
+                f'macdsignal_{self.fast_period}',
+                f'macdhist_{self.fast_period}',
+            ]
+        return [self.name, f'{self.name}_signal', f'{self.name}_hist']
+
+
+class CrossFeatureConfig(BaseModel):
+    """
+    A feature of a pair computed from the candles of another pair in the same
+    window, see cross.py.
+
+    - 'return': the log return of `other` over the window
+    - 'correlation': the correlation of the log returns of the pair and of `other`
+      over the last `period` windows
+    - 'spread': the relative spread of the close of the pair over the close of
+      `other`, e.g. between the EUR and USD quotes of the same coin
+
+    The feature is added to the candles of `pair`, or of every other pair if not
+    set. `name` is the output column, by default the type, the period of a
+    'correlation' and `other` without its slash (e.g. 'correlation_60_btcusd').
+    """
+
+    type: Literal['return', 'correlation', 'spread']
+    other: str
+    pair: Optional[str] = None
+    period: Optional[int] = None
+    name: Optional[str] = None
+
+    @model_validator(mode='after')
+    def check_params(self) -> 'CrossFeatureConfig':
+        if self.type == 'correlation' and not (self.period and self.period > 1):
+            raise ValueError('correlation needs a period of at least 2')
+        if self.pair == self.other:
+            raise ValueError(f'{self.type} of {self.pair} with itself')
+        return self
+
+    @property
+    def output(self) -> str:
+        if self.name:
+            return self.name
+        other = self.other.replace('/', '').lower()
+        if self.type == 'correlation':
+            return f'correlation_{self.period}_{other}'
+        return f'{self.type}_{other}'
+
+    def applies_to(self, pair: str) -> bool:
+        return pair == self.pair if self.pair else pair != self.other
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=ENV_FILE,
@@ -24,11 +109,41 @@ class Settings(BaseSettings):
     kafka_output_topic: str
     kafka_consumer_group: str
     candle_seconds: int
+    # The candle durations computed by the process, each one with its own state and
+    # indicators per pair, by default only `candle_seconds`. E.g. [60, 300, 3600]
+    candle_seconds_list: List[int] = []
     max_candles_in_state: int = 100
-    sma_periods: Optional[List[int]] = None
+    # Value (de)serializer of each topic: 'json' (quixstreams default) or 'msgspec'.
+    # The input can also be 'binary', the output is ingested by RisingWave as JSON.
+    kafka_input_serializer: Literal['json', 'msgspec', 'binary'] = 'json'
+    kafka_output_serializer: Literal['json', 'msgspec'] = 'json'
+    # The indicators to compute, declared in configs.yaml
+    indicators: List[IndicatorConfig] = []
+    # 'talib' recomputes the indicators with talib over the last
+    # `max_candles_in_state` candles, 'incremental' updates them in O(1) per candle
+    # (see incremental.py). The values differ for the indicators with a seed, EMA,
+    # RSI and MACD: the incremental ones are seeded once at the start of the history
+    # of the pair, the talib ones at the start of the candles in the state.
+    indicator_engine: Literal['incremental', 'talib'] = 'talib'
+    # Which indicators to produce: 'current' (one message per candle update) or
+    # 'final' (closed candles only, once the next window starts). With 'final', the
+    # updates can also go to a compacted preview topic, at most one every
+    # `preview_interval_ms` per pair and candle duration.
+    emission_policy: Literal['current', 'final'] = 'current'
+    kafka_preview_topic: Optional[str] = None
+    preview_interval_ms: int = 1000
+    # Features computed across pairs, declared in configs.yaml. They need the 'final'
+    # emission policy, the candles of a window are held until every pair has its
+    # own, or the pairs are `cross_max_lag_windows` windows ahead.
+    cross_features: List[CrossFeatureConfig] = []
+    cross_max_lag_windows: int = 2
 
     table_name_in_risingwave: str = 'technical_indicators'
 
+    @property
+    def timeframes(self) -> List[int]:
+        return self.candle_seconds_list or [self.candle_seconds]
+
     @classmethod
     def from_yaml(cls):
         import yaml
@@ -0,0 +1,268 @@
+"""
+Features of a pair computed from the candles of other pairs in the same window,
+e.g. the BTC/USD return as a feature of ETH/EUR, the rolling correlation of their
+returns, or the spread between the EUR and USD quotes of the same coin.
+
+The state of the technical indicators is per pair, so the candles are grouped by
+candle duration first, and the features are computed from the state shared by all
+the pairs. The candles of a window are held until every known pair has its own
+(or has moved past it), then emitted together, so the features of a window always
+use the candles of that window. A window is also released when the candles are
+`max_lag_windows` windows ahead, so a pair that stopped trading does not hold the
+others back.
+
+The candles are expected to be the closed ones, i.e. the 'final' emission policy.
+`compute_cross_features` computes the same features over a whole history, for the
+batch backfill.
+"""
+
+import math
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from quixstreams import State
+
+from technical_indicators.config import CrossFeatureConfig
+
+
+class RollingCorrelation:
+    """
+    Correlation of two series over their last `period` values, from running sums
+    and bounded deques, so an update is O(1).
+    """
+
+    def __init__(self, period: int):
+        self.period = period
+        self.xs: deque = deque(maxlen=period)
+        self.ys: deque = deque(maxlen=period)
+        # sum of x, y, x * x, y * y and x * y
+        self.sums = [0.0] * 5
+
+    def update(self, x: float, y: float) -> None:
+        # the oldest values, which the deques drop when full
+        oldest = (self.xs[0], self.ys[0]) if len(self.xs) == self.period else None
+        self.xs.append(x)
+        self.ys.append(y)
+        self._add(x, y, 1.0)
+        if oldest is not None:
+            self._add(*oldest, -1.0)
+
+    def _add(self, x: float, y: float, sign: float) -> None:
+        for i, value in enumerate((x, y, x * x, y * y, x * y)):
+            self.sums[i] += sign * value
+
+    @property
+    def value(self) -> Optional[float]:
+        if len(self.xs) < self.period:
+            return None
+        n = self.period
+        sx, sy, sxx, syy, sxy = self.sums
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        if var_x <= 0 or var_y <= 0:
+            return None
+        return (sxy - sx * sy / n) / math.sqrt(var_x * var_y)
+
+    def to_dict(self) -> dict:
+        return {'xs': list(self.xs), 'ys': list(self.ys), 'sums': self.sums}
+
+    @classmethod
+    def from_dict(cls, data: dict, period: int) -> 'RollingCorrelation':
+        correlation = cls(period)
+        correlation.xs.extend(data['xs'][-period:])
+        correlation.ys.extend(data['ys'][-period:])
+        correlation.sums = data['sums']
+        return correlation
+
+
+class CrossPairFeatures:
+    """
+    Stateful apply adding the cross-pair features to the candles of one candle
+    duration, grouped under a single key.
+
+    Returns the candles released by each message, in the order of their windows.
+    """
+
+    def __init__(self, features: List[CrossFeatureConfig], max_lag_windows: int = 2):
+        self.features = features
+        self.max_lag_windows = max_lag_windows
+
+    def __call__(self, message: dict, state: State) -> List[dict]:
+        pair = message['pair']
+        window = message['window_start_ms']
+        candle_ms = message['candle_seconds'] * 1000
+
+        latest: Dict[str, int] = state.get('cross_latest') or {}
+        latest[pair] = max(latest.get(pair, window), window)
+        state.set('cross_latest', latest)
+
+        released = state.get('cross_released_ms')
+        if released is not None and window <= released:
+            logger.warning(
+                f'Candle {pair} {window} arrived after its window was released, '
+                'emitted without cross-pair features'
+            )
+            return [self._release_late(message, candle_ms, state)]
+
+        # state is stored as JSON, so the windows are string keys
+        windows: Dict[str, List[str]] = state.get('cross_windows') or {}
+        pairs = windows.setdefault(str(window), [])
+        if pair not in pairs:
+            pairs.append(pair)
+        state.set(f'cross_message_{window}_{pair}', message)
+
+        # the latest window that can be released, with the ones before it
+        newest = max(latest.values())
+        ready = None
+        for start in sorted(int(start) for start in windows):
+            complete = all(start <= pair_latest for pair_latest in latest.values())
+            lagging = newest - start >= self.max_lag_windows * candle_ms
+            if complete or lagging:
+                ready = start
+        if ready is None:
+            state.set('cross_windows', windows)
+            return []
+
+        messages = []
+        for start in sorted(int(start) for start in windows):
+            if start > ready:
+                break
+            window_messages = [
+                state.get(f'cross_message_{start}_{pair}')
+                for pair in windows.pop(str(start))
+            ]
+            for window_message in window_messages:
+                state.delete(f'cross_message_{start}_{window_message["pair"]}')
+            messages.extend(self._release(window_messages, candle_ms, state))
+        state.set('cross_windows', windows)
+        state.set('cross_released_ms', ready)
+        return messages
+
+    def _update_closes(
+        self, messages: List[dict], candle_ms: int, state: State
+    ) -> Dict[str, float]:
+        """
+        Returns the log return of each pair over the window of `messages`, if its
+        previous candle was in the previous window.
+        """
+        closes = state.get('cross_closes') or {}
+        returns = {}
+        for message in messages:
+            pair = message['pair']
+            previous = closes.get(pair)
+            if previous is not None and previous[0] >= message['window_start_ms']:
+                continue
+            if (
+                previous is not None
+                and previous[0] == message['window_start_ms'] - candle_ms
+                and previous[1] > 0
+                and message['close'] > 0
+            ):
+                returns[pair] = math.log(message['close'] / previous[1])
+            closes[pair] = [message['window_start_ms'], message['close']]
+        state.set('cross_closes', closes)
+        return returns
+
+    def _release(
+        self, messages: List[dict], candle_ms: int, state: State
+    ) -> List[dict]:
+        returns = self._update_closes(messages, candle_ms, state)
+        closes = {message['pair']: message['close'] for message in messages}
+
+        released = []
+        for message in messages:
+            pair = message['pair']
+            features = {}
+            for feature in self.features:
+                value = None
+                if feature.applies_to(pair):
+                    if feature.type == 'return':
+                        value = returns.get(feature.other)
+                    elif feature.type == 'spread':
+                        other_close = closes.get(feature.other)
+                        if other_close:
+                            value = message['close'] / other_close - 1
+                    elif feature.type == 'correlation':
+                        value = self._correlation(feature, pair, returns, state)
+                features[feature.output] = value
+            released.append({**message, **features})
+        return released
+
+    def _correlation(
+        self,
+        feature: CrossFeatureConfig,
+        pair: str,
+        returns: Dict[str, float],
+        state: State,
+    ) -> Optional[float]:
+        x, y = returns.get(pair), returns.get(feature.other)
+        if x is None or y is None:
+            return None
+        key = f'cross_correlation_{feature.output}_{pair}'
+        data = state.get(key)
+        correlation = (
+            RollingCorrelation(feature.period)
+            if data is None
+            else RollingCorrelation.from_dict(data, feature.period)
+        )
+        correlation.update(x, y)
+        state.set(key, correlation.to_dict())
+        return correlation.value
+
+    def _release_late(self, message: dict, candle_ms: int, state: State) -> dict:
+        self._update_closes([message], candle_ms, state)
+        return {**message, **{feature.output: None for feature in self.features}}
+
+
+def compute_cross_features(
+    technical_indicators: pd.DataFrame, features: List[CrossFeatureConfig]
+) -> pd.DataFrame:
+    """
+    Adds the cross-pair features to the closed candles of one candle duration, over
+    their whole history.
+
+    Args:
+        technical_indicators (pd.DataFrame): The candles, at most one per pair and
+            window.
+        features (List[CrossFeatureConfig]): The features to compute.
+
+    Returns:
+        pd.DataFrame: The candles with a column per feature
+    """
+    if technical_indicators.empty or not features:
+        return technical_indicators
+    candle_ms = int(technical_indicators['candle_seconds'].iloc[0]) * 1000
+    closes = technical_indicators.pivot(
+        index='window_start_ms', columns='pair', values='close'
+    ).sort_index()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.log(closes / closes.shift(1))
+    # only over consecutive windows
+    returns[closes.index.to_series().diff().to_numpy() != candle_ms] = np.nan
+    rows = pd.MultiIndex.from_arrays(
+        [technical_indicators['window_start_ms'], technical_indicators['pair']]
+    )
+
+    technical_indicators = technical_indicators.copy()
+    for feature in features:
+        values = pd.DataFrame(np.nan, index=closes.index, columns=closes.columns)
+        if feature.other in closes:
+            for pair in closes.columns:
+                if not feature.applies_to(pair):
+                    continue
+                if feature.type == 'return':
+                    values[pair] = returns[feature.other]
+                elif feature.type == 'spread':
+                    values[pair] = closes[pair] / closes[feature.other] - 1
+                elif feature.type == 'correlation':
+                    both = returns[[pair, feature.other]].dropna()
+                    values[pair] = (
+                        both[pair].rolling(feature.period).corr(both[feature.other])
+                    )
+        technical_indicators[feature.output] = (
+            values.stack(future_stack=True).reindex(rows).to_numpy()
+        )
+    return technical_indicators
@@ -0,0 +1,78 @@
+import time
+from typing import Dict, List, Literal, Tuple
+
+from quixstreams import State
+
+from technical_indicators.candle import timeframe_state
+
+# - 'current': the indicators of every candle update, i.e. one message per trade
+#   if the candles service emits its intermediate candles
+# - 'final': only the indicators of the closed candles, produced once the first
+#   update of the next window arrives
+EmissionPolicy = Literal['current', 'final']
+
+
+class FinalIndicators:
+    """
+    Stateful apply keeping the latest indicators of the current candle of each pair
+    and candle duration, and emitting them once the next window starts, i.e. once
+    the candle is closed.
+
+    The emitted messages are the last ones the 'current' policy would produce for
+    each window. An update of a window older than the current one is an amended
+    candle that was already emitted (see `IndicatorEngine`), it is emitted again
+    right away.
+    """
+
+    def __call__(self, message: dict, state: State) -> List[dict]:
+        """
+        Args:
+            message (dict): The indicators of the latest update of a candle.
+            state (State): The state of the pair.
+
+        Returns:
+            List[dict]: The indicators of the closed candle, if `message` starts a
+                new window or amends a closed one
+        """
+        state = timeframe_state(state, message['candle_seconds'])
+        last = state.get('final_pending')
+
+        messages = []
+        if last is not None:
+            if message['window_start_ms'] < last['window_start_ms']:
+                return [message]
+            if message['window_start_ms'] > last['window_start_ms']:
+                messages.append(last)
+        state.set('final_pending', message)
+        return messages
+
+
+class PreviewThrottle:
+    """
+    Filter letting through at most one update every `interval_ms` per pair and
+    candle duration, for the preview topic.
+
+    The interval is measured in wall clock time, since it bounds the message rate
+    downstream, and kept in the process only: the previews are best effort, after a
+    restart the first update of each pair just goes through.
+    """
+
+    def __init__(self, interval_ms: int = 1000):
+        self.interval_ms = interval_ms
+        self._emitted_at_ms: Dict[Tuple[str, int], int] = {}
+
+    def __call__(self, message: dict) -> bool:
+        now_ms = int(time.time() * 1000)
+        key = (message['pair'], message['candle_seconds'])
+        if now_ms - self._emitted_at_ms.get(key, -self.interval_ms) < self.interval_ms:
+            return False
+        self._emitted_at_ms[key] = now_ms
+        return True
+
+
+def preview_key(message: dict) -> str:
+    """
+    Key of the preview topic, one per pair and candle duration, so the compaction
+    keeps the latest preview of each.
+    """
+    return f'{message["pair"]}_{message["candle_seconds"]}'
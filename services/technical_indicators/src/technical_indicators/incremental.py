@@ -0,0 +1,489 @@
+"""
+Incremental technical indicators, updated in O(1) per candle instead of recomputed
+with talib over the candles in the state on every message.
+
+Every indicator has two operations:
+- `update`, which folds a closed candle into its running values (sums, EMAs,
+  Wilder averages),
+- `peek`, which returns the value the indicator would have with one more candle,
+  without changing it.
+
+The candles service emits several updates of the current candle before it closes,
+so the engine only commits a candle once the first candle of the next window
+arrives, and peeks with the latest update of the current one, i.e. each update
+replaces the previous one.
+
+An amended candle of the last committed window (e.g. from the `late_trades_correction`
+of the candles service) is applied too: the engine keeps its nodes from before that
+commit, one commit behind, and commits the amended candle on a copy of them instead.
+Older windows can no longer be taken into account, their candles are skipped.
+
+Only the indicators declared in configs.yaml are computed. The values follow the
+talib definitions (same seeds and warm up lengths), computed over the whole history
+of the pair rather than the last `max_candles_in_state`.
+"""
+
+import copy
+import math
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from quixstreams import State
+
+from technical_indicators.candle import timeframe_state
+from technical_indicators.config import IndicatorConfig
+
+NAN = float('nan')
+
+
+class SMA:
+    """
+    Simple moving average, from the running sum of the last `period` values.
+    """
+
+    def __init__(self, period: int):
+        self.period = period
+        self.values: List[float] = []
+        self.pos = 0
+        self.total = 0.0
+
+    def _total_with(self, x: float) -> float:
+        if len(self.values) < self.period:
+            return self.total + x
+        return self.total - self.values[self.pos] + x
+
+    def peek(self, x: float) -> float:
+        if len(self.values) + 1 < self.period:
+            return NAN
+        return self._total_with(x) / self.period
+
+    def update(self, x: float) -> None:
+        self.total = self._total_with(x)
+        if len(self.values) < self.period:
+            self.values.append(x)
+        else:
+            self.values[self.pos] = x
+            self.pos = (self.pos + 1) % self.period
+
+
+class EMA:
+    """
+    Exponential moving average with k = 2 / (period + 1), seeded with the simple
+    average of the first `period` values, like talib. The first `skip` values are
+    ignored, which is how talib aligns the fast EMA of a MACD on the slow one.
+    """
+
+    def __init__(self, period: int, skip: int = 0):
+        self.period = period
+        self.skip = skip
+        self.count = 0
+        self.seed_total = 0.0
+        # None rather than NaN until defined, the state is stored as JSON
+        self.value: Optional[float] = None
+
+    def peek(self, x: float) -> float:
+        if self.count - self.skip + 1 < self.period:
+            return NAN
+        if self.value is None:
+            return (self.seed_total + x) / self.period
+        return self.value + 2.0 / (self.period + 1) * (x - self.value)
+
+    def update(self, x: float) -> None:
+        value = self.peek(x)
+        self.count += 1
+        n_values = self.count - self.skip
+        if n_values <= 0:
+            return
+        if n_values < self.period:
+            self.seed_total += x
+        else:
+            self.value = value
+
+
+class RSI:
+    """
+    Relative strength index, with Wilder's smoothing of the average gain and loss,
+    seeded with their simple average over the first `period` changes, like talib.
+    """
+
+    def __init__(self, period: int):
+        self.period = period
+        self.count = 0
+        self.previous: Optional[float] = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def _averages(self, x: float) -> Optional[Tuple[float, float]]:
+        if self.previous is None:
+            return None
+        change = x - self.previous
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        # the number of changes including this one
+        n_changes = self.count
+        if n_changes < self.period:
+            # still summing up the changes of the seed
+            return self.avg_gain + gain, self.avg_loss + loss
+        if n_changes == self.period:
+            return (
+                (self.avg_gain + gain) / self.period,
+                (self.avg_loss + loss) / self.period,
+            )
+        return (
+            (self.avg_gain * (self.period - 1) + gain) / self.period,
+            (self.avg_loss * (self.period - 1) + loss) / self.period,
+        )
+
+    def peek(self, x: float) -> float:
+        if self.count < self.period:
+            return NAN
+        avg_gain, avg_loss = self._averages(x)
+        total = avg_gain + avg_loss
+        return 100.0 * avg_gain / total if total else 0.0
+
+    def update(self, x: float) -> None:
+        averages = self._averages(x)
+        if averages is not None:
+            self.avg_gain, self.avg_loss = averages
+        self.previous = x
+        self.count += 1
+
+
+class MACD:
+    """
+    Moving average convergence divergence, from the values of its fast and slow EMAs,
+    which are computed on their own so other indicators can share them. As in talib,
+    the three outputs are only defined once the signal EMA is.
+    """
+
+    def __init__(self, fast_key: str, slow_key: str, signal_period: int):
+        self.fast_key = fast_key
+        self.slow_key = slow_key
+        self.signal = EMA(signal_period)
+
+    def peek(self, fast: float, slow: float) -> Tuple[float, float, float]:
+        macd = fast - slow
+        if math.isnan(macd):
+            return NAN, NAN, NAN
+        signal = self.signal.peek(macd)
+        if math.isnan(signal):
+            return NAN, NAN, NAN
+        return macd, signal, macd - signal
+
+    def update(self, fast: float, slow: float) -> None:
+        macd = fast - slow
+        if not math.isnan(macd):
+            self.signal.update(macd)
+
+
+class OBV:
+    """
+    On balance volume, starting from the volume of the first candle like talib.
+    """
+
+    def __init__(self):
+        self.value: Optional[float] = None
+        self.previous: Optional[float] = None
+
+    def peek(self, close: float, volume: float) -> float:
+        if self.value is None:
+            return volume
+        if close > self.previous:
+            return self.value + volume
+        if close < self.previous:
+            return self.value - volume
+        return self.value
+
+    def update(self, close: float, volume: float) -> None:
+        self.value = self.peek(close, volume)
+        self.previous = close
+
+
+_INDICATOR_CLASSES = {cls.__name__: cls for cls in (SMA, EMA, RSI, MACD, OBV)}
+
+
+def _to_dict(indicator) -> dict:
+    fields = {}
+    for name, value in vars(indicator).items():
+        if type(value).__name__ in _INDICATOR_CLASSES:
+            value = _to_dict(value)
+        fields[name] = value
+    return {'type': type(indicator).__name__, 'fields': fields}
+
+
+def _from_dict(data: dict):
+    indicator = object.__new__(_INDICATOR_CLASSES[data['type']])
+    for name, value in data['fields'].items():
+        if isinstance(value, dict) and 'type' in value:
+            value = _from_dict(value)
+        setattr(indicator, name, value)
+    return indicator
+
+
+def _slim(candle: dict) -> dict:
+    # the fields of a candle the engine keeps
+    return {
+        'window_start_ms': candle['window_start_ms'],
+        'close': float(candle['close']),
+        'volume': float(candle['volume']),
+    }
+
+
+def _macd_key(indicator: IndicatorConfig) -> str:
+    return (
+        f'macd_{indicator.fast_period}_{indicator.slow_period}_'
+        f'{indicator.signal_period}'
+    )
+
+
+def _ema_key(period: int, skip: int = 0) -> str:
+    return f'ema_{period}' if not skip else f'ema_{period}_skip_{skip}'
+
+
+class _Nodes:
+    """
+    A set of nodes, dispatched once by their inputs rather than on every message.
+    """
+
+    def __init__(self, nodes: Dict[str, object]):
+        self.nodes = nodes
+        self._on_close = []
+        self._on_volume = []
+        self._macds = []
+        for key, node in nodes.items():
+            if isinstance(node, OBV):
+                self._on_volume.append((key, node))
+            elif isinstance(node, MACD):
+                self._macds.append((key, node))
+            else:
+                self._on_close.append((key, node))
+
+    def peek(self, close: float, volume: float) -> dict:
+        values = {key: node.peek(close) for key, node in self._on_close}
+        for key, node in self._on_volume:
+            values[key] = node.peek(close, volume)
+        for key, node in self._macds:
+            values[key] = node.peek(values[node.fast_key], values[node.slow_key])
+        return values
+
+    def update(self, candle: dict) -> None:
+        close, volume = candle['close'], candle['volume']
+        values = self.peek(close, volume)
+        # the MACDs are updated from the values of their EMAs before these move on
+        for _, node in self._macds:
+            node.update(values[node.fast_key], values[node.slow_key])
+        for _, node in self._on_close:
+            node.update(close)
+        for _, node in self._on_volume:
+            node.update(close, volume)
+
+    def to_dict(self) -> dict:
+        return {key: _to_dict(node) for key, node in self.nodes.items()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> '_Nodes':
+        return cls({key: _from_dict(node) for key, node in data.items()})
+
+
+def _build_nodes(indicators: List[IndicatorConfig]) -> _Nodes:
+    nodes: Dict[str, object] = {}
+    for indicator in indicators:
+        if indicator.type == 'sma':
+            nodes.setdefault(f'sma_{indicator.period}', SMA(indicator.period))
+        elif indicator.type == 'ema':
+            nodes.setdefault(_ema_key(indicator.period), EMA(indicator.period))
+        elif indicator.type == 'rsi':
+            nodes.setdefault(f'rsi_{indicator.period}', RSI(indicator.period))
+        elif indicator.type == 'obv':
+            nodes.setdefault('obv', OBV())
+        elif indicator.type == 'macd':
+            # like talib, the fast EMA starts at the same candle as the slow one
+            skip = max(indicator.slow_period - indicator.fast_period, 0)
+            fast_key = _ema_key(indicator.fast_period, skip)
+            slow_key = _ema_key(indicator.slow_period)
+            nodes.setdefault(fast_key, EMA(indicator.fast_period, skip))
+            nodes.setdefault(slow_key, EMA(indicator.slow_period))
+            nodes.setdefault(
+                _macd_key(indicator),
+                MACD(fast_key, slow_key, indicator.signal_period),
+            )
+    return _Nodes(nodes)
+
+
+class IndicatorEngine:
+    """
+    The incremental indicators of a pair, and the latest update of its current
+    candle, which is committed once the next window starts.
+
+    The declared indicators are turned into a set of nodes, each computed once per
+    candle even if several indicators use it, e.g. an 'ema' of period 14 and the
+    slow EMA of a 'macd' of periods (7, 14, 9).
+
+    For the amended candles, a second set of nodes lags one commit behind: every
+    commit replays the previous committed candle on it, so an amendment starts from
+    a copy of it rather than every commit copying the nodes. Only the lagging nodes
+    and the last committed candle are stored, the others are rebuilt from them.
+    """
+
+    def __init__(self, indicators: List[IndicatorConfig]):
+        self.indicators = indicators
+        self.nodes = _build_nodes(indicators)
+        # the nodes from before the commit of the last committed candle
+        self.before_last = _build_nodes(indicators)
+        self.last: Optional[dict] = None
+        self.pending: Optional[dict] = None
+        self._plan(indicators)
+
+    def _plan(self, indicators: List[IndicatorConfig]) -> None:
+        # (output column, node, index of the node output if it has several)
+        self._outputs = []
+        for indicator in indicators:
+            if indicator.type == 'macd':
+                key = _macd_key(indicator)
+                for index, output in enumerate(indicator.outputs):
+                    self._outputs.append((output, key, index))
+            else:
+                key = (
+                    'obv'
+                    if indicator.type == 'obv'
+                    else f'{indicator.type}_{indicator.period}'
+                )
+                self._outputs.append((indicator.outputs[0], key, None))
+
+    def _commit(self, candle: dict) -> None:
+        if self.last is not None:
+            self.before_last.update(self.last)
+        self.nodes.update(candle)
+        self.last = candle
+
+    def _peek(self, candle: dict) -> dict:
+        values = self.nodes.peek(candle['close'], candle['volume'])
+        return {
+            output: values[key] if index is None else values[key][index]
+            for output, key, index in self._outputs
+        }
+
+    def push(self, candle: dict) -> Optional[dict]:
+        """
+        Adds the latest update of a candle.
+
+        Args:
+            candle (dict): The latest candle of the pair.
+
+        Returns:
+            Optional[dict]: The indicators including this candle, or None for a
+                candle of a window older than the last committed one, which can no
+                longer be taken into account
+        """
+        pending = self.pending
+        if pending is not None:
+            if candle['window_start_ms'] < pending['window_start_ms']:
+                return self._amend(candle)
+            if candle['window_start_ms'] > pending['window_start_ms']:
+                # the pending candle is closed
+                self._commit(pending)
+        self.pending = _slim(candle)
+        return self._peek(candle)
+
+    def _amend(self, candle: dict) -> Optional[dict]:
+        """
+        Commits the amended candle of the last committed window in its place.
+        """
+        last = self.last
+        if last is None or candle['window_start_ms'] != last['window_start_ms']:
+            return None
+        # a copy, the window can be amended again
+        self.nodes = copy.deepcopy(self.before_last)
+        amended = _slim(candle)
+        indicators = self._peek(amended)
+        self.nodes.update(amended)
+        self.last = amended
+        return indicators
+
+    def to_dict(self) -> dict:
+        """
+        The lagging nodes and the last committed candle, the pending candle is
+        stored on its own.
+        """
+        return {'before_last': self.before_last.to_dict(), 'last': self.last}
+
+    @classmethod
+    def from_dict(
+        cls,
+        data: dict,
+        pending: Optional[dict],
+        indicators: List[IndicatorConfig],
+    ) -> 'IndicatorEngine':
+        if 'nodes' in data or 'last' not in data:
+            # written by an older version, the last committed candle can no longer
+            # be amended
+            data = {'before_last': data.get('nodes', data), 'last': None}
+        engine = object.__new__(cls)
+        engine.indicators = indicators
+        engine.pending = pending
+        engine.last = data['last']
+        engine.before_last = _Nodes.from_dict(data['before_last'])
+        # replay the last committed candle, on a copy of the lagging nodes
+        engine.nodes = _Nodes.from_dict(copy.deepcopy(data['before_last']))
+        if engine.last is not None:
+            engine.nodes.update(engine.last)
+        engine._plan(indicators)
+        return engine
+
+
+class IncrementalIndicators:
+    """
+    Stateful apply computing the indicators of each candle with the pair's
+    `IndicatorEngine`, kept in the state.
+
+    The committed indicators only change once per window, so they are written to the
+    state when a candle is committed, while the small pending candle is written on
+    every message. The engines are also cached in the process, and reused as long
+    as the sequence number stored with the pending candle matches, so the state is
+    only decoded after a rebalance. The engine is rebuilt from scratch when the
+    indicators configuration changes.
+    """
+
+    def __init__(self, indicators: List[IndicatorConfig]):
+        self.indicators = indicators
+        self.signature = repr([indicator.model_dump() for indicator in indicators])
+        self._engines: Dict[Tuple[str, int], Tuple[int, IndicatorEngine]] = {}
+
+    def _load(self, key: Tuple[str, int], state: State) -> Tuple[int, IndicatorEngine]:
+        pending = state.get('indicators_pending') or {'seq': 0, 'candle': None}
+        cached = self._engines.get(key)
+        if cached is not None and cached[0] == pending['seq']:
+            return cached
+        data = state.get('indicators')
+        if data is not None and data.get('signature') == self.signature:
+            engine = IndicatorEngine.from_dict(
+                data['engine'], pending['candle'], self.indicators
+            )
+            return pending['seq'], engine
+        return pending['seq'], IndicatorEngine(self.indicators)
+
+    def __call__(self, candle: dict, state: State) -> Optional[dict]:
+        # one engine per pair and candle duration
+        key = (candle['pair'], candle['candle_seconds'])
+        state = timeframe_state(state, candle['candle_seconds'])
+        seq, engine = self._load(key, state)
+
+        previous = engine.pending
+        indicators = engine.push(candle)
+        if indicators is None:
+            logger.warning(
+                f'Skipping candle {candle["pair"]} {candle["window_start_ms"]}, '
+                'older than the last committed window'
+            )
+            return None
+
+        if previous is not None:
+            # the previous candle was committed, or the last committed one amended
+            if previous['window_start_ms'] != candle['window_start_ms']:
+                state.set(
+                    'indicators',
+                    {'signature': self.signature, 'engine': engine.to_dict()},
+                )
+        seq += 1
+        state.set('indicators_pending', {'seq': seq, 'candle': engine.pending})
+        self._engines[key] = (seq, engine)
+        return {**candle, **indicators}
@@ -1,8 +1,21 @@
+from typing import List, Literal, Optional
+
+from candles.serializers import get_deserializer
 from loguru import logger
 from quixstreams import Application
+from quixstreams.models.topics import TopicConfig
 
 from technical_indicators.candle import update_candles_in_state
-from technical_indicators.indicators import compute_technical_indicators
+from technical_indicators.config import CrossFeatureConfig, config
+from technical_indicators.cross import CrossPairFeatures
+from technical_indicators.emission import (
+    EmissionPolicy,
+    FinalIndicators,
+    PreviewThrottle,
+    preview_key,
+)
+from technical_indicators.incremental import IncrementalIndicators
+from technical_indicators.serializers import Candle, SerializerName, get_serializer
 
 
 def run(
@@ -10,7 +23,15 @@ def run(
     kafka_input_topic: str,
     kafka_output_topic: str,
     kafka_consumer_group: str,
-    candle_seconds: int,
+    candle_seconds: List[int],
+    indicator_engine: Literal['incremental', 'talib'] = 'talib',
+    emission_policy: EmissionPolicy = 'current',
+    kafka_preview_topic: Optional[str] = None,
+    preview_interval_ms: int = 1000,
+    cross_features: Optional[List[CrossFeatureConfig]] = None,
+    cross_max_lag_windows: int = 2,
+    kafka_input_serializer: SerializerName = 'json',
+    kafka_output_serializer: SerializerName = 'json',
 ):
     """
     Transforms a stream of input candles into a stream of output technical indicators.
@@ -24,11 +45,27 @@ def run(
         kafka_input_topic (str): Name of the Kafka topic to read candles from.
         kafka_output_topic (str): Name of the Kafka topic to write technical indicators to.
         kafka_consumer_group (str): Kafka consumer group name.
-        candle_seconds (int): Duration of each candle in seconds.
+        candle_seconds (List[int]): Durations of the candles in seconds, each one with
+            its own state and indicators per pair.
+        indicator_engine (str): 'incremental' or 'talib', see config.py.
+        emission_policy (str): 'current' or 'final', see emission.py.
+        kafka_preview_topic (str): Compacted topic of the throttled updates, with the
+            'final' policy.
+        preview_interval_ms (int): Minimum interval between two previews of a pair
+            and candle duration.
+        cross_features (List[CrossFeatureConfig]): Features computed across pairs,
+            see cross.py. They need the 'final' policy.
+        cross_max_lag_windows (int): How many windows ahead the candles can be
+            before a window is released without the pairs it still waits for.
+        kafka_input_serializer (str): Deserializer of the candles topic.
+        kafka_output_serializer (str): Serializer of the technical indicators topic.
 
     Returns:
         None
     """
+    if cross_features and emission_policy != 'final':
+        raise ValueError('The cross-pair features need the final emission policy')
+
     app = Application(
         broker_address=kafka_broker_address,
         consumer_group=kafka_consumer_group,
@@ -36,32 +73,79 @@ def run(
     # Define the input topic
     candles_topic = app.topic(
         name=kafka_input_topic,
-        value_serializer='json',
+        value_deserializer=get_deserializer(kafka_input_serializer, schema=Candle),
     )
     # Define the output topic
     technical_indicators_topic = app.topic(
         name=kafka_output_topic,
-        value_serializer='json',
+        value_serializer=get_serializer(kafka_output_serializer),
     )
     # Step 1. Ingest candles from the input topic for the given `candle_seconds`
     # Create a streaming dataframe connected to the input topic
     sdf = app.dataframe(topic=candles_topic)
 
-    # Filter the candles for the given `candle_seconds`
-    sdf = sdf[sdf['candle_seconds'] == candle_seconds]
+    # Filter the candles for the given `candle_seconds`, all of them are read once
+    # and the state of each pair is split per duration
+    sdf = sdf[sdf['candle_seconds'].isin(candle_seconds)]
+
+    if indicator_engine == 'incremental':
+        # Step 2. Update the running indicators of the pair with the candle
+        sdf = sdf.apply(
+            IncrementalIndicators(config.indicators),
+            stateful=True,
+        )
+        # candles older than the last committed window cannot be taken into account
+        sdf = sdf.filter(lambda message: message is not None)
+    else:
+        from technical_indicators.indicators import compute_technical_indicators
 
-    # Step 2. Add candles to the state
-    sdf = sdf.apply(update_candles_in_state, stateful=True)
-    # Log the updated candle
-    # sdf=sdf.update(lambda message: logger.debug(f'Updated candle: {message}'))
+        # Step 2. Add candles to the state
+        sdf = sdf.apply(update_candles_in_state, stateful=True)
+        # Log the updated candle
+        # sdf=sdf.update(lambda message: logger.debug(f'Updated candle: {message}'))
+
+        # Step3. Compute technical indicators and
+        sdf = sdf.apply(compute_technical_indicators, stateful=True)
+    if emission_policy == 'final':
+        if kafka_preview_topic:
+            # the latest indicators of the current candles, for the consumers that
+            # need them before the candle closes
+            preview_topic = app.topic(
+                name=kafka_preview_topic,
+                key_serializer='str',
+                value_serializer=get_serializer(kafka_output_serializer),
+                config=TopicConfig(
+                    num_partitions=1,
+                    replication_factor=1,
+                    extra_config={'cleanup.policy': 'compact'},
+                ),
+            )
+            preview_sdf = sdf.filter(PreviewThrottle(preview_interval_ms))
+            preview_sdf.to_topic(topic=preview_topic, key=preview_key)
+        # the main topic only gets the closed candles
+        sdf = sdf.apply(FinalIndicators(), stateful=True, expand=True)
+
+    if cross_features:
+        # all the pairs of a candle duration share the state of the cross-pair
+        # features, and are keyed by pair again when produced
+        sdf = sdf.group_by(
+            lambda message: str(message['candle_seconds']),
+            name='technical_indicators_cross_pair',
+        )
+        sdf = sdf.apply(
+            CrossPairFeatures(cross_features, cross_max_lag_windows),
+            stateful=True,
+            expand=True,
+        )
 
-    # Step3. Compute technical indicators and
-    sdf = sdf.apply(compute_technical_indicators, stateful=True)
     # Print the data
     sdf = sdf.update(lambda message: logger.debug(f'Final message: {message}'))
 
     # Step 4. Produce candles to the output topic
-    sdf = sdf.to_topic(topic=technical_indicators_topic)
+    sdf = sdf.to_topic(
+        topic=technical_indicators_topic,
+        key=(lambda message: message['pair'].encode()) if cross_features else None,
+    )
 
     # Start the streaming application
     app.run()
@@ -81,5 +165,13 @@ if __name__ == '__main__':
         kafka_input_topic=config.kafka_input_topic,
         kafka_output_topic=config.kafka_output_topic,
         kafka_consumer_group=config.kafka_consumer_group,
-        candle_seconds=config.candle_seconds,
+        candle_seconds=config.timeframes,
+        indicator_engine=config.indicator_engine,
+        emission_policy=config.emission_policy,
+        kafka_preview_topic=config.kafka_preview_topic,
+        preview_interval_ms=config.preview_interval_ms,
+        cross_features=config.cross_features,
+        cross_max_lag_windows=config.cross_max_lag_windows,
+        kafka_input_serializer=config.kafka_input_serializer,
+        kafka_output_serializer=config.kafka_output_serializer,
     )
@@ -0,0 +1,35 @@
+from typing import NotRequired, TypedDict
+
+from common import serializers
+from common.serializers import SerializerName
+from quixstreams.models.serializers import Serializer
+
+
+class Candle(TypedDict):
+    pair: str
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    window_start_ms: int
+    window_end_ms: int
+    candle_seconds: int
+    # aggregates missing in the candles produced before they were added
+    trade_count: NotRequired[int]
+    vwap: NotRequired[float]
+    buy_volume: NotRequired[float]
+    sell_volume: NotRequired[float]
+    first_trade_ms: NotRequired[int]
+    last_trade_ms: NotRequired[int]
+
+
+def get_serializer(name: SerializerName) -> str | Serializer:
+    """
+    Returns the value serializer of the technical indicators topic given its name
+    in the config, see `common.serializers.get_serializer`.
+    """
+    if name == 'binary':
+        # RisingWave ingests the technical indicators topic as JSON
+        raise ValueError('The technical indicators topic must be JSON encoded')
+    return serializers.get_serializer(name)
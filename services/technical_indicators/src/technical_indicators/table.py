@@ -1,3 +1,89 @@
+"""
+Generates the RisingWave table of the technical indicators topic from the indicators
+declared in configs.yaml, so the two never drift apart:
+
+    uv run services/technical_indicators/src/technical_indicators/table.py \\
+        > services/technical_indicators/query.sql
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+from technical_indicators.config import CrossFeatureConfig, IndicatorConfig
+
+# Columns of the candles, before the indicators
+CANDLE_COLUMNS: List[Tuple[str, str]] = [
+    ('pair', 'VARCHAR'),
+    ('open', 'FLOAT'),
+    ('high', 'FLOAT'),
+    ('low', 'FLOAT'),
+    ('close', 'FLOAT'),
+    ('volume', 'FLOAT'),
+    ('window_start_ms', 'BIGINT'),
+    ('window_end_ms', 'BIGINT'),
+    ('candle_seconds', 'INT'),
+    ('trade_count', 'INT'),
+    ('vwap', 'FLOAT'),
+    ('buy_volume', 'FLOAT'),
+    ('sell_volume', 'FLOAT'),
+    ('first_trade_ms', 'BIGINT'),
+    ('last_trade_ms', 'BIGINT'),
+]
+PRIMARY_KEY = ('pair', 'window_start_ms', 'window_end_ms')
+
+
+def indicator_columns(
+    indicators: List[IndicatorConfig],
+    cross_features: Sequence[CrossFeatureConfig] = (),
+) -> List[str]:
+    """
+    Returns the output columns of the indicators, then of the cross-pair features,
+    in order.
+    """
+    columns = []
+    outputs = [output for indicator in indicators for output in indicator.outputs]
+    outputs += [feature.output for feature in cross_features]
+    for output in outputs:
+        if output in columns or output in dict(CANDLE_COLUMNS):
+            raise ValueError(f'Duplicate technical indicators column: {output}')
+        columns.append(output)
+    return columns
+
+
+def technical_indicators_ddl(
+    indicators: List[IndicatorConfig],
+    kafka_broker_address: str,
+    kafka_topic: str,
+    table_name: str = 'technical_indicators',
+    cross_features: Sequence[CrossFeatureConfig] = (),
+) -> str:
+    """
+    Returns the CREATE TABLE statement of the technical indicators, ingested from
+    the Kafka topic.
+
+    Args:
+        indicators (List[IndicatorConfig]): The indicators computed by the service.
+        kafka_broker_address (str): Address of the Kafka broker.
+        kafka_topic (str): Name of the technical indicators topic.
+        table_name (str): Name of the table.
+        cross_features (List[CrossFeatureConfig]): The cross-pair features.
+
+    Returns:
+        str: The DDL
+    """
+    columns = CANDLE_COLUMNS + [
+        (name, 'FLOAT') for name in indicator_columns(indicators, cross_features)
+    ]
+    lines = [f'    {name} {sql_type},' for name, sql_type in columns]
+    lines.append(f'    PRIMARY KEY ({", ".join(PRIMARY_KEY)})')
+    return (
+        f'CREATE TABLE {table_name} (\n' + '\n'.join(lines) + '\n) WITH (\n'
+        "    connector='kafka',\n"
+        f"    topic='{kafka_topic}',\n"
+        f"    properties.bootstrap.server='{kafka_broker_address}'\n"
+        ') FORMAT PLAIN ENCODE JSON;'
+    )
+
+
 def create_table_in_risingwave(
     kafka_broker_address: str,
     kafka_topic: str,
@@ -9,3 +95,39 @@ def create_table_in_risingwave(
     This way, Risingwave automatically ingests messages from Kafka and updates the table in real-time.
     """
     pass
+
+
+def main(
+    kafka_broker_address: str = 'kafka-e11b-kafka-bootstrap.kafka.svc.cluster.local:9092',
+    kafka_topic: Optional[str] = None,
+    table_name: Optional[str] = None,
+):
+    """
+    Prints the DDL of the table for the indicators and cross-pair features in
+    configs.yaml.
+
+    Args:
+        kafka_broker_address (str): Address of the Kafka broker, as seen by
+            RisingWave.
+        kafka_topic (str): The technical indicators topic, by default the
+            configured one.
+        table_name (str): The table, by default the configured one.
+    """
+    from technical_indicators.config import config
+
+    print(
+        technical_indicators_ddl(
+            config.indicators,
+            kafka_broker_address=kafka_broker_address,
+            kafka_topic=kafka_topic or config.kafka_output_topic,
+            table_name=table_name or config.table_name_in_risingwave,
+            cross_features=config.cross_features,
+        ),
+        end='',
+    )
+
+
+if __name__ == '__main__':
+    from fire import Fire
+
+    Fire(main)
@@ -0,0 +1,35 @@
+import json
+from collections import defaultdict
+
+import pytest
+
+
+class FakeState:
+    """
+    In-memory stand-in for the quixstreams state of one key, storing the values as
+    JSON like the real one.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        value = self.data.get(key)
+        return default if value is None else json.loads(value)
+
+    def set(self, key, value):
+        self.data[key] = json.dumps(value)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+@pytest.fixture
+def state():
+    return FakeState()
+
+
+@pytest.fixture
+def states():
+    # the state of each message key, e.g. of each pair
+    return defaultdict(FakeState)
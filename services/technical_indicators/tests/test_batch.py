@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from technical_indicators.config import IndicatorConfig
+from technical_indicators.incremental import IncrementalIndicators
+
+pytest.importorskip('talib')
+from technical_indicators.batch import compute_indicators  # noqa: E402
+
+INDICATORS = [
+    IndicatorConfig(type='sma', period=5),
+    IndicatorConfig(type='ema', period=5),
+    IndicatorConfig(type='rsi', period=5),
+    IndicatorConfig(type='macd', fast_period=3, slow_period=6, signal_period=4),
+    IndicatorConfig(type='obv'),
+]
+
+
+def make_candles(n_windows=50, seed=0):
+    # two updates per window and pair, and candles of another duration
+    rng = np.random.default_rng(seed)
+    candles = []
+    for i in range(n_windows):
+        for pair in ('ETH/EUR', 'BTC/USD'):
+            for _ in range(2):
+                close = 100 + rng.normal()
+                candles.append(
+                    {
+                        'pair': pair,
+                        'open': close,
+                        'high': close,
+                        'low': close,
+                        'close': close,
+                        'volume': rng.random(),
+                        'window_start_ms': i * 60000,
+                        'window_end_ms': (i + 1) * 60000,
+                        'candle_seconds': 60,
+                    }
+                )
+        candles.append({**candles[-1], 'candle_seconds': 300})
+    return candles
+
+
+def test_compute_indicators_matches_the_streaming_service(states):
+    candles = make_candles()
+    indicators = IncrementalIndicators(INDICATORS)
+    # the indicators of the latest update of each window
+    streamed = {}
+    for candle in candles:
+        if candle['candle_seconds'] == 60:
+            output = indicators(candle, states[candle['pair']])
+            streamed[(candle['pair'], candle['window_start_ms'])] = output
+
+    result = compute_indicators(pd.DataFrame(candles), 60, INDICATORS)
+    assert len(result) == len(streamed)
+    assert list(result['window_end_ms']) == sorted(result['window_end_ms'])
+    columns = [output for indicator in INDICATORS for output in indicator.outputs]
+    for row in result.to_dict(orient='records'):
+        output = streamed[(row['pair'], row['window_start_ms'])]
+        assert row['close'] == output['close']
+        np.testing.assert_allclose(
+            [row[column] for column in columns],
+            [output[column] for column in columns],
+            rtol=1e-9,
+        )
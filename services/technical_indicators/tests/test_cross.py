@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+from technical_indicators.config import CrossFeatureConfig
+from technical_indicators.cross import (
+    CrossPairFeatures,
+    RollingCorrelation,
+    compute_cross_features,
+)
+
+FEATURES = [
+    CrossFeatureConfig(type='return', other='BTC/USD'),
+    CrossFeatureConfig(type='spread', other='BTC/USD', pair='ETH/EUR'),
+    CrossFeatureConfig(type='correlation', other='BTC/USD', period=5),
+]
+
+
+def make_candle(pair, i, close):
+    return {
+        'pair': pair,
+        'close': close,
+        'window_start_ms': i * 60000,
+        'window_end_ms': (i + 1) * 60000,
+        'candle_seconds': 60,
+    }
+
+
+def make_candles(n_windows=60, seed=0):
+    rng = np.random.default_rng(seed)
+    candles = []
+    for i in range(n_windows):
+        for pair, price in (('ETH/EUR', 2500), ('BTC/USD', 60000)):
+            # a few windows without a candle, the returns skip them
+            if i % 17 == 3 and pair == 'ETH/EUR':
+                continue
+            candles.append(make_candle(pair, i, price * (1 + rng.normal(0, 0.01))))
+    return candles
+
+
+def test_rolling_correlation_matches_numpy():
+    rng = np.random.default_rng(0)
+    xs = rng.normal(size=100)
+    ys = xs + rng.normal(size=100)
+    correlation = RollingCorrelation(10)
+    for i, (x, y) in enumerate(zip(xs, ys, strict=True)):
+        correlation.update(x, y)
+        if i < 9:
+            assert correlation.value is None
+        else:
+            expected = np.corrcoef(xs[i - 9 : i + 1], ys[i - 9 : i + 1])[0, 1]
+            assert correlation.value == pytest.approx(expected)
+    assert len(correlation.xs) == 10
+
+
+def test_rolling_correlation_round_trip():
+    rng = np.random.default_rng(1)
+    correlation = RollingCorrelation(5)
+    for x, y in rng.normal(size=(8, 2)):
+        correlation.update(x, y)
+
+    restored = RollingCorrelation.from_dict(correlation.to_dict(), 5)
+    for x, y in rng.normal(size=(8, 2)):
+        correlation.update(x, y)
+        restored.update(x, y)
+        assert restored.value == pytest.approx(correlation.value)
+
+
+def test_rolling_correlation_of_a_constant_series():
+    correlation = RollingCorrelation(3)
+    for x in (1.0, 2.0, 3.0):
+        correlation.update(x, 5.0)
+    assert correlation.value is None
+
+
+def test_streaming_matches_batch(state):
+    candles = make_candles()
+    features = CrossPairFeatures(FEATURES)
+    streamed = [message for candle in candles for message in features(candle, state)]
+
+    expected = compute_cross_features(pd.DataFrame(candles), FEATURES)
+    # the last window is released too, both pairs have a candle in it
+    assert len(streamed) == len(candles)
+    streamed = {(m['pair'], m['window_start_ms']): m for m in streamed}
+    for row in expected.to_dict(orient='records'):
+        # the first candle releases its window before the other pair is known
+        if row['window_start_ms'] == 0:
+            continue
+        message = streamed[(row['pair'], row['window_start_ms'])]
+        for feature in FEATURES:
+            value = message[feature.output]
+            if np.isnan(row[feature.output]):
+                assert value is None, (feature.output, row)
+            else:
+                assert value == pytest.approx(row[feature.output]), feature.output
+
+
+def test_lagging_pair_does_not_hold_the_others(state):
+    features = CrossPairFeatures(FEATURES, max_lag_windows=2)
+    features(make_candle('ETH/EUR', 0, 2500.0), state)
+    features(make_candle('BTC/USD', 1, 60000.0), state)
+    features(make_candle('ETH/EUR', 1, 2500.0), state)
+    # ETH/EUR stops trading
+    assert features(make_candle('BTC/USD', 2, 60000.0), state) == []
+    assert features(make_candle('BTC/USD', 3, 60000.0), state) == []
+
+    released = features(make_candle('BTC/USD', 4, 60000.0), state)
+    assert [(m['pair'], m['window_start_ms']) for m in released] == [
+        ('BTC/USD', 2 * 60000)
+    ]
+
+    # too late for its window, emitted without the features
+    late = features(make_candle('ETH/EUR', 2, 2500.0), state)
+    assert late == [
+        {
+            **make_candle('ETH/EUR', 2, 2500.0),
+            **dict.fromkeys(feature.output for feature in FEATURES),
+        }
+    ]
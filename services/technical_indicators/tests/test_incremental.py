@@ -0,0 +1,178 @@
+import numpy as np
+import pytest
+from technical_indicators.config import IndicatorConfig
+from technical_indicators.incremental import IncrementalIndicators, IndicatorEngine
+
+talib = pytest.importorskip('talib')
+
+N_WINDOWS = 300
+# candle updates per window, as with the 'current' emission policy
+UPDATES_PER_WINDOW = 4
+INDICATORS = [
+    IndicatorConfig(type='sma', period=7),
+    IndicatorConfig(type='sma', period=14),
+    IndicatorConfig(type='ema', period=7),
+    IndicatorConfig(type='ema', period=14),
+    IndicatorConfig(type='rsi', period=7),
+    IndicatorConfig(type='rsi', period=14),
+    IndicatorConfig(type='macd', fast_period=7, slow_period=14, signal_period=9),
+    IndicatorConfig(type='obv'),
+]
+
+
+def make_series(seed=0):
+    rng = np.random.default_rng(seed)
+    close = np.cumsum(rng.normal(0, 1, N_WINDOWS)) + 2500
+    volume = rng.random(N_WINDOWS)
+    return close, volume
+
+
+def make_candle(i, close, volume):
+    return {
+        'pair': 'ETH/EUR',
+        'open': close,
+        'high': close,
+        'low': close,
+        'close': close,
+        'volume': volume,
+        'window_start_ms': i * 60000,
+        'window_end_ms': (i + 1) * 60000,
+        'candle_seconds': 60,
+    }
+
+
+def make_updates(close, volume, seed=1):
+    # intermediate updates of each window, the last one is the closed candle
+    rng = np.random.default_rng(seed)
+    for i in range(len(close)):
+        for j in range(UPDATES_PER_WINDOW):
+            if j == UPDATES_PER_WINDOW - 1:
+                yield make_candle(i, close[i], volume[i])
+            else:
+                yield make_candle(i, close[i] + rng.normal(), rng.random())
+
+
+def talib_reference(close, volume):
+    macd, macdsignal, macdhist = talib.MACD(close, 7, 14, 9)
+    return {
+        'sma_7': talib.SMA(close, 7),
+        'sma_14': talib.SMA(close, 14),
+        'ema_7': talib.EMA(close, 7),
+        'ema_14': talib.EMA(close, 14),
+        'rsi_7': talib.RSI(close, 7),
+        'rsi_14': talib.RSI(close, 14),
+        'macd_7': macd,
+        'macdsignal_7': macdsignal,
+        'macdhist_7': macdhist,
+        'obv': talib.OBV(close, volume),
+    }
+
+
+def assert_matches(outputs, reference):
+    for name, expected in reference.items():
+        values = np.array(
+            [np.nan if output[name] is None else output[name] for output in outputs],
+            dtype=np.float64,
+        )
+        defined = ~np.isnan(expected)
+        assert np.array_equal(defined, ~np.isnan(values)), name
+        np.testing.assert_allclose(
+            values[defined], expected[defined], rtol=1e-9, atol=1e-9, err_msg=name
+        )
+
+
+def test_closed_candles_match_talib(state):
+    close, volume = make_series()
+    indicators = IncrementalIndicators(INDICATORS)
+    outputs = [indicators(candle, state) for candle in make_updates(close, volume)]
+
+    closed = outputs[UPDATES_PER_WINDOW - 1 :: UPDATES_PER_WINDOW]
+    assert_matches(closed, talib_reference(close, volume))
+
+
+def test_intermediate_updates_match_talib():
+    # an update is computed as if the series ended with it
+    close, volume = make_series()
+    engine = IndicatorEngine(INDICATORS)
+    for i in range(N_WINDOWS - 1):
+        engine.push(make_candle(i, close[i], volume[i]))
+
+    output = engine.push(make_candle(N_WINDOWS - 1, 2400.0, 0.5))
+    close[-1], volume[-1] = 2400.0, 0.5
+    assert_matches(
+        [output], {k: v[-1:] for k, v in talib_reference(close, volume).items()}
+    )
+
+
+def test_amended_candle_matches_talib():
+    close, volume = make_series()
+    engine = IndicatorEngine(INDICATORS)
+    for i in range(N_WINDOWS):
+        engine.push(make_candle(i, close[i], volume[i]))
+
+    # the last committed window, amended twice by late trades
+    i = N_WINDOWS - 2
+    engine.push(make_candle(i, close[i] + 3, volume[i] + 1))
+    amended = engine.push(make_candle(i, close[i] + 5, volume[i] + 2))
+    close[i], volume[i] = close[i] + 5, volume[i] + 2
+    reference = talib_reference(close, volume)
+    assert_matches([amended], {k: v[i : i + 1] for k, v in reference.items()})
+
+    # the pending candle is computed on top of the amended one
+    output = engine.push(make_candle(N_WINDOWS - 1, close[-1], volume[-1]))
+    assert_matches([output], {k: v[-1:] for k, v in reference.items()})
+
+
+def test_older_windows_are_skipped(state):
+    close, volume = make_series()
+    indicators = IncrementalIndicators(INDICATORS)
+    for i in range(10):
+        indicators(make_candle(i, close[i], volume[i]), state)
+
+    # older than the last committed window
+    assert indicators(make_candle(7, close[7], volume[7]), state) is None
+
+
+def test_engine_round_trip():
+    close, volume = make_series()
+    engine = IndicatorEngine(INDICATORS)
+    for i in range(N_WINDOWS // 2):
+        engine.push(make_candle(i, close[i], volume[i]))
+
+    restored = IndicatorEngine.from_dict(engine.to_dict(), engine.pending, INDICATORS)
+    # the last committed window can still be amended after the round trip
+    i = N_WINDOWS // 2 - 2
+    candles = [make_candle(i, close[i] + 1, volume[i])] + [
+        make_candle(j, close[j], volume[j]) for j in range(i + 2, N_WINDOWS)
+    ]
+    for candle in candles:
+        np.testing.assert_equal(restored.push(candle), engine.push(candle))
+
+
+def test_state_is_reloaded_after_a_rebalance(state):
+    close, volume = make_series()
+    candles = list(make_updates(close, volume))
+    middle = len(candles) // 2 + 1
+
+    uninterrupted = IncrementalIndicators(INDICATORS)
+    reference_state = type(state)()
+    expected = [uninterrupted(candle, reference_state) for candle in candles]
+
+    # a new process picks up the pair from its state halfway through a window
+    indicators = IncrementalIndicators(INDICATORS)
+    outputs = [indicators(candle, state) for candle in candles[:middle]]
+    indicators = IncrementalIndicators(INDICATORS)
+    outputs += [indicators(candle, state) for candle in candles[middle:]]
+    np.testing.assert_equal(outputs, expected)
+
+
+def test_state_is_reset_when_the_indicators_change(state):
+    close, volume = make_series()
+    indicators = IncrementalIndicators(INDICATORS)
+    for i in range(20):
+        indicators(make_candle(i, close[i], volume[i]), state)
+
+    sma = [IndicatorConfig(type='sma', period=3)]
+    output = IncrementalIndicators(sma)(make_candle(20, close[20], volume[20]), state)
+    # the new engine starts from this candle
+    assert np.isnan(output['sma_3'])
@@ -1,4 +1,4 @@
-from typing import List, Literal
+from typing import List, Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -20,8 +20,34 @@ class Settings(BaseSettings):
     ]
     kafka_broker_address: str
     kafka_topic_name: str
-    live_or_historical: Literal['live', 'historical'] = 'live'  # 'live' or 'historical'
+    # 'live', 'historical' or 'tape' (replays a recorded tape, see kraken_replay.py)
+    live_or_historical: Literal['live', 'historical', 'tape'] = 'live'
     last_n_days: int = 30  # Only used in historical mode
+    # Kraken endpoints, overridden to point to a local `kraken_replay.py` server
+    kraken_websocket_url: Optional[str] = None
+    kraken_rest_url: Optional[str] = None
+    # Tape mode settings. A speed of 0 replays the tape as fast as possible.
+    tape_path: Optional[str] = None
+    tape_speed: float = 0.0
+    # Live mode settings: pairs are sharded over several websocket connections
+    websocket_max_pairs_per_connection: int = 10
+    websocket_queue_max_batches: int = 10000
+    # Producer batching, tuned for throughput rather than per-message latency
+    kafka_linger_ms: int = 100
+    kafka_batch_size: int = 1000000
+    kafka_compression_type: str = 'lz4'
+    stats_log_interval_sec: float = 10.0
+    # Encoder of the trades topic values: 'json' (orjson), 'msgspec' or 'binary'.
+    # Switch the candles service input to 'binary' first, it also accepts JSON.
+    kafka_value_serializer: Literal['json', 'msgspec', 'binary'] = 'json'
+    # Historical backfill settings. Kraken public endpoints allow roughly one request
+    # per second per IP, so more workers only help until this budget is reached.
+    backfill_max_workers: int = 4
+    backfill_max_requests_per_second: float = 1.0
+    # Where to checkpoint the per-pair cursors, so a restarted pod resumes the backfill
+    backfill_checkpoint_path: Optional[str] = None
+    # How often to flush the producer and checkpoint the cursors of the delivered pages
+    backfill_checkpoint_interval_sec: float = 10.0
 
 
 config = Settings()
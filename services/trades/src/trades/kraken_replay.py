@@ -0,0 +1,279 @@
+"""
+Local stand-in for the Kraken APIs, to run and load test the pipeline offline.
+
+    # record 10 minutes of live trades, and 20 REST pages per pair
+    uv run services/trades/src/trades/kraken_replay.py record \\
+        --tape_path=kraken.tape --seconds=600 --rest_pages=20
+
+    # replay them 10 times faster than recorded (0 means as fast as possible)
+    uv run services/trades/src/trades/kraken_replay.py serve \\
+        --tape_path=kraken.tape --speed=10
+
+and point the trades service to it with
+KRAKEN_WEBSOCKET_URL=ws://localhost:8080/v2 and
+KRAKEN_REST_URL=http://localhost:8080/0/public/Trades.
+"""
+
+import asyncio
+import bisect
+import json
+import time
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from fire import Fire
+from kraken_rest_api import KrakenRestAPI
+from kraken_tape import (
+    TAPE_KIND_REST,
+    TAPE_KIND_WEBSOCKET,
+    TapePacer,
+    TapeWriter,
+    read_tape,
+)
+from kraken_websocket_api import KrakenWebsocketAPI
+from loguru import logger
+from serializers import loads
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import ServerConnection
+from websockets.asyncio.server import serve as serve_websockets
+from websockets.exceptions import ConnectionClosed
+from websockets.http11 import Request, Response
+
+
+class KrakenReplayServer:
+    """
+    Serves the recorded websocket frames and REST pages of a tape with the same
+    endpoints as Kraken.
+
+    Every websocket connection replays the trade frames of its subscribed symbols
+    from the start of the tape, at `speed` times the recorded pace. REST pages are
+    looked up by their `since` cursor and served right away, since the clients
+    already pace their own requests. Both are served by the `websockets` server, the
+    REST requests are answered before the websocket handshake.
+    """
+
+    def __init__(self, tape_path: str, speed: float = 1.0, loop: bool = False):
+        self.speed = speed
+        self.loop = loop
+        # (recorded time, symbols, frame) of the trade frames
+        self._frames: List[Tuple[float, set, str]] = []
+        # pair -> recorded `since` cursors, pages and the cursor after the last page
+        self._sinces: Dict[str, List[int]] = {}
+        self._pages: Dict[str, List[str]] = {}
+        self._last_cursor: Dict[str, int] = {}
+
+        for record in read_tape(tape_path):
+            data = loads(record['data'])
+            if record['kind'] == TAPE_KIND_WEBSOCKET:
+                if data.get('channel') == 'trade':
+                    symbols = {trade['symbol'] for trade in data['data']}
+                    self._frames.append((record['t'], symbols, record['data']))
+            elif record['kind'] == TAPE_KIND_REST:
+                pair = record['pair']
+                self._sinces.setdefault(pair, []).append(record['since'])
+                self._pages.setdefault(pair, []).append(record['data'])
+                self._last_cursor[pair] = int(data['result']['last'])
+
+        for pair, sinces in self._sinces.items():
+            order = sorted(range(len(sinces)), key=sinces.__getitem__)
+            self._sinces[pair] = [sinces[i] for i in order]
+            self._pages[pair] = [self._pages[pair][i] for i in order]
+
+        logger.info(
+            f'Loaded {len(self._frames)} websocket frames and '
+            f'{sum(map(len, self._pages.values()))} REST pages from {tape_path}'
+        )
+
+    async def handle_websocket(self, ws: ServerConnection) -> None:
+        # wait for the subscription, and acknowledge it like Kraken, symbol by symbol
+        symbols = set()
+        try:
+            async for message in ws:
+                if not isinstance(message, str):
+                    continue
+                data = loads(message)
+                if data.get('method') == 'subscribe':
+                    symbols = set(data['params']['symbol'])
+                    for symbol in symbols:
+                        await ws.send(
+                            json.dumps(
+                                {
+                                    'method': 'subscribe',
+                                    'result': {'channel': 'trade', 'symbol': symbol},
+                                    'success': True,
+                                }
+                            )
+                        )
+                    break
+            logger.info(f'Replaying the trades of {sorted(symbols)}')
+
+            while True:
+                pacer = TapePacer(speed=self.speed)
+                for t, frame_symbols, frame in self._frames:
+                    if not frame_symbols & symbols:
+                        continue
+                    delay = pacer.delay(t)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    await ws.send(frame)
+                if not self.loop:
+                    break
+
+            # keep the connection open like the exchange does, the client decides
+            # when to close it
+            while True:
+                await ws.send(json.dumps({'channel': 'heartbeat'}))
+                await asyncio.sleep(1)
+        except ConnectionClosed:
+            pass
+
+    def process_request(
+        self, connection: ServerConnection, request: Request
+    ) -> Optional[Response]:
+        """
+        Answers the REST requests, and lets the websocket ones through to the
+        handshake.
+        """
+        url = urlsplit(request.path)
+        if url.path == '/v2':
+            return None
+        if url.path != '/0/public/Trades':
+            return connection.respond(HTTPStatus.NOT_FOUND, 'Not Found\n')
+
+        query = parse_qs(url.query)
+        pair = query.get('pair', [''])[0]
+        since = int(query.get('since', ['0'])[0])
+        sinces = self._sinces.get(pair)
+
+        if not sinces or since >= self._last_cursor[pair]:
+            # nothing left: a cursor in the present makes the client stop paging
+            body = json.dumps(
+                {'error': [], 'result': {pair: [], 'last': str(time.time_ns())}}
+            )
+        else:
+            # the page recorded with the closest cursor at or before the requested
+            # one
+            i = max(0, bisect.bisect_right(sinces, since) - 1)
+            body = self._pages[pair][i]
+        response = connection.respond(HTTPStatus.OK, body)
+        del response.headers['Content-Type']
+        response.headers['Content-Type'] = 'application/json'
+        return response
+
+
+async def _serve(server: KrakenReplayServer, host: str, port: int) -> None:
+    async with serve_websockets(
+        server.handle_websocket,
+        host,
+        port,
+        process_request=server.process_request,
+    ) as websocket_server:
+        await websocket_server.serve_forever()
+
+
+def serve(
+    tape_path: str,
+    speed: float = 1.0,
+    host: str = '0.0.0.0',
+    port: int = 8080,
+    loop: bool = False,
+):
+    """
+    Serves a tape with the Kraken websocket and REST endpoints.
+
+    Args:
+        tape_path (str): The tape to replay.
+        speed (float): Replay speed, relative to the recording. 0 means max speed.
+        host (str): The interface to listen on.
+        port (int): The port to listen on.
+        loop (bool): Whether to replay the websocket frames over and over.
+    """
+    server = KrakenReplayServer(tape_path=tape_path, speed=speed, loop=loop)
+    logger.info(f'Serving {tape_path} on {host}:{port}')
+    asyncio.run(_serve(server, host, port))
+
+
+async def _record_websocket(
+    writer: TapeWriter, product_ids: List[str], seconds: float
+) -> None:
+    deadline = time.monotonic() + seconds
+    async with connect(KrakenWebsocketAPI.URL) as ws:
+        await ws.send(
+            json.dumps(
+                {
+                    'method': 'subscribe',
+                    'params': {
+                        'channel': 'trade',
+                        'symbol': product_ids,
+                        'snapshot': False,
+                    },
+                }
+            )
+        )
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                frame = await asyncio.wait_for(ws.recv(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            writer.write_websocket_frame(frame)
+
+
+def _record_rest(
+    writer: TapeWriter, product_ids: List[str], rest_pages: int, last_n_days: int
+) -> None:
+    session = requests.Session()
+    for product_id in product_ids:
+        since = time.time_ns() - last_n_days * 24 * 60 * 60 * 1000000000
+        for _ in range(rest_pages):
+            response = session.get(
+                KrakenRestAPI.URL,
+                params={'pair': product_id, 'since': since},
+                timeout=30,
+            )
+            data = loads(response.content)
+            if data.get('error'):
+                logger.error(f'Kraken API error for pair {product_id}: {data["error"]}')
+                break
+            writer.write_rest_page(product_id, since, response.text)
+            since = int(data['result']['last'])
+            # stay within the Kraken public rate limit
+            time.sleep(1)
+        logger.info(f'Recorded the REST pages of {product_id}')
+
+
+def record(
+    tape_path: str,
+    product_ids: Optional[List[str]] = None,
+    seconds: float = 60,
+    rest_pages: int = 0,
+    last_n_days: int = 1,
+):
+    """
+    Records live Kraken websocket frames, and optionally REST pages, to a tape.
+
+    Args:
+        tape_path (str): The tape to append to.
+        product_ids (List[str]): The pairs to record, by default the configured ones.
+        seconds (float): How long to record the websocket for.
+        rest_pages (int): How many REST pages to record per pair.
+        last_n_days (int): How far back the REST pages start.
+    """
+    if product_ids is None:
+        from config import config
+
+        product_ids = config.product_ids
+
+    writer = TapeWriter(tape_path)
+    try:
+        if rest_pages > 0:
+            _record_rest(writer, product_ids, rest_pages, last_n_days)
+        logger.info(f'Recording websocket trades for {seconds} seconds')
+        asyncio.run(_record_websocket(writer, product_ids, seconds))
+    finally:
+        writer.close()
+
+
+if __name__ == '__main__':
+    Fire({'record': record, 'serve': serve})
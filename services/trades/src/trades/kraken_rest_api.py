@@ -1,31 +1,97 @@
 import json
+import os
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
 
 import requests
 from loguru import logger
-from trade import Trade
+from requests.adapters import HTTPAdapter
+from serializers import loads
+from trade import TradeBatch
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by all the REST clients of the process, so the
+    total number of requests sent to Kraken stays within the per-IP budget no matter
+    how many pairs are being backfilled concurrently.
+    """
+
+    def __init__(self, max_requests_per_second: float, burst: int = 1):
+        self.rate = max_requests_per_second
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Blocks until a request can be sent without exceeding the rate budget.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last_refill) * self.rate
+                )
+                self._last_refill = now
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_sec = max(
+                    self._blocked_until - now, (1 - self._tokens) / self.rate
+                )
+            time.sleep(wait_sec)
+
+    def backoff(self, seconds: float) -> None:
+        """
+        Pauses every client sharing this limiter, e.g. after Kraken answered with a
+        rate limit error.
+        """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
 
 
 class KrakenRestAPI:
     URL = 'https://api.kraken.com/0/public/Trades'
 
-    def __init__(self, product_id: str, last_n_days: int):
+    def __init__(
+        self,
+        product_id: str,
+        last_n_days: int,
+        since_timestamp_ns: Optional[int] = None,
+        session: Optional[requests.Session] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        rate_limit_backoff_sec: float = 10.0,
+        url: Optional[str] = None,
+    ):
         self.product_id = product_id
+        # e.g. a local `kraken_replay.py` server instead of the exchange
+        self.url = url or self.URL
         self.last_n_days = last_n_days
         self._is_done = False
+        self._session = session or requests.Session()
+        self._rate_limiter = rate_limiter
+        self._rate_limit_backoff_sec = rate_limit_backoff_sec
 
-        # get current timestamp in nanoseconds
-        self.since_timestamp_ns = int(
-            time.time_ns() - last_n_days * 24 * 60 * 60 * 1000000000
-        )
+        if since_timestamp_ns is None:
+            # get current timestamp in nanoseconds
+            since_timestamp_ns = int(
+                time.time_ns() - last_n_days * 24 * 60 * 60 * 1000000000
+            )
+        self.since_timestamp_ns = since_timestamp_ns
 
-    def get_trades(self) -> list[Trade]:
+    def get_trades(self) -> TradeBatch:
         """
         Sends a GET request to the Kraken API to get the trades for the given product_id
         and since the given timestamp
 
         Returns:
-            list[Trade]: List of trades for the given product_id and since the given timestamp
+            TradeBatch: Batch of trades for the given product_id and since the given timestamp
         """
         # Step 1. Set the right headers and parameters for the request
         headers = {'Accept': 'application/json'}
@@ -35,48 +101,58 @@ class KrakenRestAPI:
         }
 
         # Step 2. Send GET request to Kraken API
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire()
         try:
             # Send a GET request to the Kraken API
-            response = requests.request('GET', self.URL, headers=headers, params=params)
+            response = self._session.get(
+                self.url, headers=headers, params=params, timeout=30
+            )
 
-        except requests.exceptions.SSLError as e:
+        except requests.exceptions.RequestException as e:
             # If we get an error, we sleep for 10 seconds and early return the function
             logger.error(f'The Kraken API is not reachable. Error: {e}')
 
             # wait 10 seconds and try again
-            # It would be better to make this source stateful and recoverable, so if
-            # the container goes down and gets restarted by Kubernetes, it can resume
-            # from where it left off.
-            # TODO: reimplement this class a stateful Quix Streams data source so we don't
-            # have sleep here.
+            # The cursor is checkpointed by KrakenRestAPIMultiplePairs, so if the
+            # container goes down and gets restarted by Kubernetes, it resumes from
+            # where it left off.
             logger.error('Sleeping for 10 seconds and trying again...')
             time.sleep(10)
-            return []
+            return TradeBatch()
 
         # Step 3. Parse the output as a dictionary
         try:
-            data = json.loads(response.text)
+            data = loads(response.content)
         except json.JSONDecodeError as e:
             logger.error(f'Failed to parse response as json: {e}')
-            return []
+            return TradeBatch()
+
+        if data.get('error'):
+            # Kraken answers with HTTP 200 and a list of errors, e.g.
+            # ['EGeneral:Too many requests'] when we exceed the rate budget
+            logger.error(
+                f'Kraken API error for pair {self.product_id}: {data["error"]}'
+            )
+            if self._rate_limiter is not None:
+                self._rate_limiter.backoff(self._rate_limit_backoff_sec)
+            else:
+                time.sleep(self._rate_limit_backoff_sec)
+            return TradeBatch()
 
         try:
             # Get the trades data
             trades = data['result'][self.product_id]
         except KeyError as e:
             logger.error(f'Failed to get trades for pair {self.product_id}: {e}')
-            return []
-
-        # Step 4. Transform the trades data into a list of Trade objects
-        trades = [
-            Trade.from_kraken_rest_api_response(
-                product_id=self.product_id,
-                price=trade[0],
-                quantity=trade[1],
-                timestamp_sec=trade[2],
-            )
-            for trade in trades
-        ]
+            return TradeBatch()
+
+        # Step 4. Transform the trades data into a columnar batch of trades
+        try:
+            trades = TradeBatch.from_kraken_rest_api_response(self.product_id, trades)
+        except (IndexError, TypeError, ValueError) as e:
+            logger.error(f'Malformed trades for pair {self.product_id}: {e}')
+            return TradeBatch()
 
         # update the since_timestamp_ns
         self.since_timestamp_ns = int(float(data['result']['last']))
@@ -86,9 +162,140 @@ class KrakenRestAPI:
             # we got trades until now, so we can stop
             self._is_done = True
 
-        # breakpoint()
-
         return trades
 
     def is_done(self) -> bool:
         return self._is_done
+
+
+class BackfillCheckpoint:
+    """
+    Persists the `since_timestamp_ns` cursor of every pair to a small JSON file, so a
+    restarted backfill resumes from the last page delivered to Kafka instead of
+    starting over.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Dict[str, int]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return {pair: int(cursor) for pair, cursor in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            logger.error(f'Ignoring unreadable checkpoint {self.path}: {e}')
+            return {}
+
+    def save(self, cursors: Dict[str, int]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # write to a temporary file and rename it, so a crash never leaves a
+        # half-written checkpoint behind
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(cursors, f)
+        os.replace(tmp_path, self.path)
+
+
+class KrakenRestAPIMultiplePairs:
+    """
+    Backfills the trades of several pairs concurrently.
+
+    Each pair is paged by its own `KrakenRestAPI` on a bounded thread pool, with one
+    request in flight per pair. All the clients share a `RateLimiter`, so throughput
+    grows with the number of pairs until the Kraken per-IP budget is reached.
+    """
+
+    def __init__(
+        self,
+        product_ids: List[str],
+        last_n_days: int,
+        max_workers: int = 4,
+        max_requests_per_second: float = 1.0,
+        checkpoint_path: Optional[str] = None,
+        url: Optional[str] = None,
+    ):
+        self.product_ids = product_ids
+        self._checkpoint = (
+            BackfillCheckpoint(checkpoint_path) if checkpoint_path else None
+        )
+        cursors = self._checkpoint.load() if self._checkpoint else {}
+        if cursors:
+            logger.info(f'Resuming backfill from checkpoint {checkpoint_path}')
+
+        session = requests.Session()
+        # one pooled connection per worker, so pages reuse the TLS connection
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        rate_limiter = RateLimiter(max_requests_per_second=max_requests_per_second)
+
+        self._apis = {
+            product_id: KrakenRestAPI(
+                product_id=product_id,
+                last_n_days=last_n_days,
+                since_timestamp_ns=cursors.get(product_id),
+                session=session,
+                rate_limiter=rate_limiter,
+                url=url,
+            )
+            for product_id in product_ids
+        }
+        # cursors of the pages already returned by `get_trades`
+        self._cursors = {
+            product_id: api.since_timestamp_ns for product_id, api in self._apis.items()
+        }
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='kraken-rest'
+        )
+        self._in_flight: Dict[Future, str] = {}
+
+    def _submit_pending_pages(self) -> None:
+        busy = set(self._in_flight.values())
+        for product_id, api in self._apis.items():
+            if product_id not in busy and not api.is_done():
+                future = self._executor.submit(api.get_trades)
+                self._in_flight[future] = product_id
+
+    def get_trades(self) -> TradeBatch:
+        """
+        Returns the pages that finished downloading since the last call, for any of
+        the pairs.
+
+        The cursors of the returned pages are only checkpointed by
+        `commit_checkpoint`, once the producer has delivered them.
+        """
+        self._submit_pending_pages()
+        if not self._in_flight:
+            return TradeBatch()
+
+        done, _ = wait(self._in_flight, return_when=FIRST_COMPLETED)
+        trades = TradeBatch()
+        for future in done:
+            product_id = self._in_flight.pop(future)
+            try:
+                trades.extend(future.result())
+            except Exception as e:
+                logger.error(f'Failed to get trades for pair {product_id}: {e}')
+                continue
+            self._cursors[product_id] = self._apis[product_id].since_timestamp_ns
+            if self._apis[product_id].is_done():
+                logger.info(f'Backfill for pair {product_id} is done')
+
+        if self.is_done():
+            self._executor.shutdown(wait=False)
+        return trades
+
+    def commit_checkpoint(self) -> None:
+        """
+        Checkpoints the cursors of all the pages returned by `get_trades` so far. To
+        be called once Kafka has acknowledged their trades, e.g. after a flush.
+        """
+        if self._checkpoint:
+            self._checkpoint.save(self._cursors)
+
+    def is_done(self) -> bool:
+        return not self._in_flight and all(api.is_done() for api in self._apis.values())
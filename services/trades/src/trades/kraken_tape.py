@@ -0,0 +1,165 @@
+import json
+import time
+from typing import IO, Iterator, Optional
+
+from loguru import logger
+from serializers import loads
+from trade import TradeBatch
+
+# A tape is a JSON lines file with one recorded Kraken message per line, e.g.
+#   {"t": 1745494542.85, "kind": "ws", "data": "<websocket frame>"}
+#   {"t": 1745494543.12, "kind": "rest", "pair": "ETH/EUR", "since": 17454...,
+#    "data": "<body of the REST page>"}
+# `t` is the wall clock time the message was received, in seconds. Frames and pages
+# are kept verbatim, so replaying them exercises the same parsing as the live APIs.
+TAPE_KIND_WEBSOCKET = 'ws'
+TAPE_KIND_REST = 'rest'
+
+
+class TapeWriter:
+    """
+    Appends recorded Kraken messages to a tape file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: IO[str] = open(path, 'a')
+
+    def write_websocket_frame(self, frame: str | bytes) -> None:
+        if isinstance(frame, bytes):
+            frame = frame.decode()
+        self._write({'t': time.time(), 'kind': TAPE_KIND_WEBSOCKET, 'data': frame})
+
+    def write_rest_page(self, pair: str, since: int, body: str) -> None:
+        self._write(
+            {
+                't': time.time(),
+                'kind': TAPE_KIND_REST,
+                'pair': pair,
+                'since': since,
+                'data': body,
+            }
+        )
+
+    def _write(self, record: dict) -> None:
+        self._file.write(json.dumps(record) + '\n')
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def read_tape(path: str) -> Iterator[dict]:
+    """
+    Yields the records of a tape file, skipping (and logging) the corrupted lines,
+    e.g. the last one of a recording that was killed.
+    """
+    with open(path, 'rb') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield loads(line)
+            except json.JSONDecodeError as e:
+                logger.error(f'Skipping line {line_number} of tape {path}: {e}')
+
+
+class TapePacer:
+    """
+    Maps the recorded time of the tape messages to wall clock time, at `speed` times
+    the recorded pace. A speed of 0 replays as fast as possible.
+    """
+
+    def __init__(self, speed: float = 1.0):
+        self.speed = speed
+        self._tape_start: Optional[float] = None
+        self._wall_start = 0.0
+
+    def delay(self, t: float) -> float:
+        """
+        Returns how many seconds to wait before replaying a message recorded at `t`.
+        """
+        if self.speed <= 0:
+            return 0.0
+        if self._tape_start is None:
+            self._tape_start = t
+            self._wall_start = time.monotonic()
+        due = self._wall_start + (t - self._tape_start) / self.speed
+        return max(0.0, due - time.monotonic())
+
+
+def trades_from_tape_record(record: dict) -> TradeBatch:
+    """
+    Parses the trades of a tape record, like the live API that received it would.
+    Non trade websocket frames (heartbeats, subscription acks...) give no trades.
+    """
+    data = loads(record['data'])
+    if record['kind'] == TAPE_KIND_WEBSOCKET:
+        if data.get('channel') != 'trade':
+            return TradeBatch()
+        return TradeBatch.from_kraken_websocket_response(data['data'])
+    if record['kind'] == TAPE_KIND_REST:
+        pair = record['pair']
+        return TradeBatch.from_kraken_rest_api_response(pair, data['result'][pair])
+    raise ValueError(f'Unknown tape record kind {record["kind"]}')
+
+
+class KrakenTapeAPI:
+    """
+    Replays the trades of a recorded tape, without any network.
+
+    It has the same interface as the live and historical APIs, so the whole
+    trades -> candles -> technical indicators pipeline can be load tested
+    reproducibly from the same tape.
+    """
+
+    def __init__(
+        self,
+        tape_path: str,
+        speed: float = 0.0,
+        max_records_per_batch: int = 1000,
+    ):
+        self.tape_path = tape_path
+        self.max_records_per_batch = max_records_per_batch
+        self._records = read_tape(tape_path)
+        self._pacer = TapePacer(speed=speed)
+        self._next_record: Optional[dict] = None
+        self._is_done = False
+
+    def _pop_record(self) -> Optional[dict]:
+        if self._next_record is not None:
+            record, self._next_record = self._next_record, None
+            return record
+        record = next(self._records, None)
+        if record is None:
+            self._is_done = True
+            logger.info(f'Tape {self.tape_path} fully replayed')
+        return record
+
+    def get_trades(self) -> TradeBatch:
+        """
+        Returns the trades of the next records of the tape.
+
+        The first record is waited for according to the replay speed, then every
+        record that is already due (at most `max_records_per_batch`) is coalesced
+        into the same batch.
+        """
+        trades = TradeBatch()
+        for n_records in range(self.max_records_per_batch):
+            record = self._pop_record()
+            if record is None:
+                break
+            delay = self._pacer.delay(record['t'])
+            if delay > 0:
+                if n_records > 0:
+                    # not due yet, keep it for the next call
+                    self._next_record = record
+                    break
+                time.sleep(delay)
+            try:
+                trades.extend(trades_from_tape_record(record))
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f'Malformed tape record: {e}')
+        return trades
+
+    def is_done(self) -> bool:
+        return self._is_done
@@ -1,47 +1,190 @@
+import asyncio
 import json
-from typing import List
+import queue
+import random
+import threading
+from typing import List, Optional
 
 from loguru import logger
-from trade import Trade
-from websocket import create_connection
+from serializers import loads
+from trade import TradeBatch
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import WebSocketException
 
 
 class KrakenWebsocketAPI:
+    """
+    Streams live trades from the Kraken websocket API.
+
+    An asyncio event loop runs in a background thread and holds one connection per
+    shard of at most `max_pairs_per_connection` product ids. Every connection
+    reconnects with exponential backoff and resubscribes on its own. Decoded trade
+    batches are handed over through a bounded queue. When the producer loop falls
+    behind and the queue is full, the shards stop reading their sockets until it
+    frees a slot, so no trade is dropped.
+
+    If the event loop fails, the error is raised by the next `get_trades` call,
+    so the process crashes and is restarted instead of idling.
+    """
+
     URL = 'wss://ws.kraken.com/v2'
 
     def __init__(
         self,
         product_ids: List[str],
+        max_pairs_per_connection: int = 10,
+        queue_max_batches: int = 10000,
+        min_reconnect_delay_sec: float = 1.0,
+        max_reconnect_delay_sec: float = 60.0,
+        url: Optional[str] = None,
     ):
         self.product_ids = product_ids
-        # create a websocket client
-        self._ws_client = create_connection(self.URL)
+        # e.g. a local `kraken_replay.py` server instead of the exchange
+        self.url = url or self.URL
+        self.min_reconnect_delay_sec = min_reconnect_delay_sec
+        self.max_reconnect_delay_sec = max_reconnect_delay_sec
+        self.backpressure_waits = 0
+        self._error: Optional[BaseException] = None
+
+        self._shards = [
+            product_ids[i : i + max_pairs_per_connection]
+            for i in range(0, len(product_ids), max_pairs_per_connection)
+        ]
+        self._queue: queue.Queue[TradeBatch] = queue.Queue(maxsize=queue_max_batches)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run_event_loop, name='kraken-websocket', daemon=True
+        )
+        self._thread.start()
+
+    def _run_event_loop(self) -> None:
+        try:
+            asyncio.run(self._run_shards())
+        except Exception as e:
+            logger.exception(f'Websocket event loop failed: {e}')
+            self._error = e
+
+    async def _run_shards(self) -> None:
+        await asyncio.gather(
+            *(
+                self._run_shard(shard_id, product_ids)
+                for shard_id, product_ids in enumerate(self._shards)
+            )
+        )
 
-        # subscribe to the websocket
-        self._subscribe(self.product_ids)
+    async def _run_shard(self, shard_id: int, product_ids: List[str]) -> None:
+        """
+        Keeps one connection for the given `product_ids` alive, reconnecting with
+        exponential backoff (and jitter, so shards don't reconnect in lockstep).
+        """
+        delay = self.min_reconnect_delay_sec
+        while not self._stopped.is_set():
+            try:
+                async with connect(self.url) as ws:
+                    logger.info(
+                        f'Shard {shard_id} connected, subscribing {product_ids}'
+                    )
+                    await self._subscribe(ws, product_ids)
+                    async for message in ws:
+                        if await self._handle_message(shard_id, message):
+                            # the connection is healthy again
+                            delay = self.min_reconnect_delay_sec
+                        if self._stopped.is_set():
+                            return
+            except (OSError, asyncio.TimeoutError, WebSocketException) as e:
+                logger.error(f'Shard {shard_id} connection lost: {e}')
 
-    def _subscribe(self, product_ids: List[str]):
+            if self._stopped.is_set():
+                return
+            sleep_sec = delay * random.uniform(0.5, 1.5)
+            logger.info(f'Shard {shard_id} reconnecting in {sleep_sec:.1f} seconds')
+            await asyncio.sleep(sleep_sec)
+            delay = min(delay * 2, self.max_reconnect_delay_sec)
+
+    async def _subscribe(self, ws: ClientConnection, product_ids: List[str]) -> None:
         """
-        Subscribes to the websocket and waits for the initial snapshot for the given `product_ids`.
+        Sends the subscribe message for the given `product_ids`.
+        Kraken acknowledges each symbol with its own `subscribe` message, which is
+        handled like any other message by `_handle_message`.
         """
-        # send a subscribe message to the websocket
-        self._ws_client.send(
+        await ws.send(
             json.dumps(
                 {
                     'method': 'subscribe',
                     'params': {
                         'channel': 'trade',
-                        'symbol': self.product_ids,
+                        'symbol': product_ids,
                         'snapshot': False,
                     },
                 }
             )
         )
-        # In case of Kraken websocket you get two confirmation messages for each subscription
-        # so you have to discard them as they contain no relevant data
-        for _ in self.product_ids:
-            _ = self._ws_client.recv()
-            _ = self._ws_client.recv()
+
+    async def _handle_message(self, shard_id: int, message: str | bytes) -> bool:
+        """
+        Dispatches a websocket message by its type, and pushes trades to the queue.
+
+        Returns:
+            bool: True if the message was a trade update or a successful subscription
+        """
+        try:
+            data = loads(message)
+        except json.JSONDecodeError as e:
+            logger.error(f'Error decoding JSON: {e}')
+            return False
+        if not isinstance(data, dict):
+            logger.error(f'Unexpected message {data!r}')
+            return False
+
+        channel = data.get('channel')
+        if channel == 'trade':
+            try:
+                trades = TradeBatch.from_kraken_websocket_response(data['data'])
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f'Malformed trades in the message: {e}')
+                return False
+            await self._put(trades)
+            return True
+
+        if channel == 'heartbeat':
+            return False
+
+        if channel == 'status':
+            logger.info(f'Shard {shard_id} status: {data.get("data")}')
+            return False
+
+        if data.get('method') == 'subscribe':
+            symbol = data.get('result', {}).get('symbol')
+            if data.get('success'):
+                logger.info(f'Shard {shard_id} subscribed to {symbol}')
+                return True
+            logger.error(f'Shard {shard_id} failed to subscribe: {data.get("error")}')
+            return False
+
+        logger.debug(f'Ignoring message {data}')
+        return False
+
+    async def _put(self, trades: TradeBatch) -> None:
+        try:
+            self._queue.put_nowait(trades)
+        except queue.Full:
+            # Backpressure: the shard stops reading its socket until the producer
+            # loop frees a slot, Kraken buffers the trades meanwhile
+            self.backpressure_waits += 1
+            if self.backpressure_waits % 1000 == 1:
+                logger.warning(
+                    'Trades queue is full, waiting for the producer loop '
+                    f'({self.backpressure_waits} waits so far)'
+                )
+            await asyncio.to_thread(self._put_blocking, trades)
+
+    def _put_blocking(self, trades: TradeBatch) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(trades, timeout=1.0)
+                return
+            except queue.Full:
+                continue
 
     def is_done(self) -> bool:
         """
@@ -50,39 +193,33 @@ class KrakenWebsocketAPI:
         """
         return False
 
-    def get_trades(self) -> List[Trade]:
+    def get_trades(self, timeout: Optional[float] = 1.0) -> TradeBatch:
         """
         Fetches trades from the Kraken websocket API.
 
+        Waits up to `timeout` seconds for the first batch, then coalesces every
+        other batch already waiting in the queue into a single one.
+
         Returns:
-            List[Trade]: A list of Trade objects containing trade data.
+            TradeBatch: A columnar batch with the trades received since the last call.
         """
-        data: str = self._ws_client.recv()
-        if 'heartbeat' in data:
-            logger.info('Received heartbeat, skipping...')
-            return []
-
-        # transform raw string into a JSON object
+        # a dead event loop would otherwise look like a quiet market
+        if self._error is not None:
+            raise RuntimeError('Kraken websocket event loop failed') from self._error
+        trades = TradeBatch()
         try:
-            data = json.loads(data)
-        except json.JSONDecodeError as e:
-            logger.error(f'Error decoding JSON: {e}')
-            return []
+            trades.extend(self._queue.get(timeout=timeout))
+        except queue.Empty:
+            return trades
 
-        try:
-            trades_data = data['data']
-        except KeyError as e:
-            logger.error(f'No `data` field with trades in the message {e}')
-            return []
-
-        trades = [
-            Trade.from_kraken_websocket_response(
-                product_id=trade['symbol'],
-                price=float(trade['price']),
-                quantity=float(trade['qty']),
-                timestamp=trade['timestamp'],
-            )
-            for trade in trades_data
-        ]
+        while True:
+            try:
+                trades.extend(self._queue.get_nowait())
+            except queue.Empty:
+                return trades
 
-        return trades
+    def close(self) -> None:
+        """
+        Stops the shards once their next message arrives.
+        """
+        self._stopped.set()
@@ -1,39 +1,109 @@
 # Create an Application instance with Kafka configs
-from typing import List
+import time
+from typing import Callable, List, Tuple
 
-from kraken_rest_api import KrakenRestAPI
+from kraken_rest_api import KrakenRestAPI, KrakenRestAPIMultiplePairs
+from kraken_tape import KrakenTapeAPI
 from kraken_websocket_api import KrakenWebsocketAPI
 from loguru import logger
+from producer_stats import ProducerStats
 from quixstreams import Application
-from trade import Trade
+from serializers import SerializerName, get_batch_serializer
+from trade import TradeBatch
+
+
+def serialize_trades(
+    trades: TradeBatch, encode: Callable[[TradeBatch], List[bytes]]
+) -> List[Tuple[bytes, bytes]]:
+    """
+    Serializes a whole batch of trades into (key, value) pairs ready to be produced,
+    without going through the per-message `topic.serialize` machinery.
+
+    Args:
+        trades (TradeBatch): The trades to serialize.
+        encode (Callable): The function encoding the batch, one value per trade.
+
+    Returns:
+        List[Tuple[bytes, bytes]]: The message keys (product ids) and encoded values.
+    """
+    # the product ids are interned, each key is encoded once per batch
+    keys = {product_id: product_id.encode() for product_id in set(trades.product_ids)}
+    return [
+        (keys[product_id], value)
+        for product_id, value in zip(trades.product_ids, encode(trades), strict=True)
+    ]
 
 
 def run(
     kafka_broker_address: str,
     kafka_topic_name: str,
-    kraken_api: KrakenWebsocketAPI | KrakenRestAPI,
+    kraken_api: KrakenWebsocketAPI
+    | KrakenRestAPI
+    | KrakenRestAPIMultiplePairs
+    | KrakenTapeAPI,
+    kafka_linger_ms: int = 100,
+    kafka_batch_size: int = 1000000,
+    kafka_compression_type: str = 'lz4',
+    stats_log_interval_sec: float = 10.0,
+    kafka_value_serializer: SerializerName = 'json',
+    checkpoint_interval_sec: float = 10.0,
 ):
     app = Application(
         broker_address=kafka_broker_address,
+        # Let librdkafka accumulate messages into large compressed batches
+        producer_extra_config={
+            'linger.ms': kafka_linger_ms,
+            'batch.size': kafka_batch_size,
+            'compression.type': kafka_compression_type,
+        },
     )
 
-    # Define a topic "my_topic" with JSON serialization
-    topic = app.topic(name=kafka_topic_name, value_serializer='json')
+    # The values are encoded by `serialize_trades`, the topic is only used for its name
+    topic = app.topic(name=kafka_topic_name)
+
+    encode = get_batch_serializer(kafka_value_serializer)
+    stats = ProducerStats(log_interval_sec=stats_log_interval_sec)
+
+    # Only the historical backfill has cursors to checkpoint
+    commit_checkpoint = getattr(kraken_api, 'commit_checkpoint', None)
+    last_checkpoint = time.monotonic()
+
+    def flush_and_checkpoint() -> None:
+        # the cursors move past the produced pages only once Kafka acknowledged them,
+        # a failed delivery means a hole the checkpoint must not skip
+        remaining = producer.flush()
+        if remaining or stats.total_failed:
+            raise RuntimeError(
+                f'{remaining} trades not delivered, {stats.total_failed} delivery '
+                'failures, not moving the backfill checkpoint'
+            )
+        commit_checkpoint()
 
     # Create a Producer instance
     with app.get_producer() as producer:
         while not kraken_api.is_done():
-            events: List[Trade] = kraken_api.get_trades()
-            # event = {"id": "1", "text": "Lorem ipsum dolor sit amet"}
-            for event in events:
-                # Serialize an event using the defined Topic
-                message = topic.serialize(key=event.product_id, value=event.to_dict())
-
+            events: TradeBatch = kraken_api.get_trades()
+            for product_id, (key, value) in zip(
+                events.product_ids, serialize_trades(events, encode), strict=True
+            ):
                 # Produce a message into the Kafka topic
-                producer.produce(topic=topic.name, value=message.value, key=message.key)
-                # Log the produced messages
-                # logger.info(f"Produced message to topic: {topic.name}")
-                logger.info(f'Trade {event} pushed to kafka')
+                producer.produce(
+                    topic=topic.name,
+                    value=value,
+                    key=key,
+                    on_delivery=stats.on_delivery,
+                )
+                stats.record_produced(product_id, len(value))
+            # Log aggregated rates instead of every single trade
+            stats.maybe_log()
+            if (
+                commit_checkpoint is not None
+                and time.monotonic() - last_checkpoint >= checkpoint_interval_sec
+            ):
+                flush_and_checkpoint()
+                last_checkpoint = time.monotonic()
+        if commit_checkpoint is not None:
+            flush_and_checkpoint()
 
 
 if __name__ == '__main__':
@@ -42,19 +112,40 @@ if __name__ == '__main__':
     # create an instance of KrakenAPI to talk to Kraken websocket API
     if config.live_or_historical == 'live':
         logger.info('Running in live mode')
-        api = KrakenWebsocketAPI(product_ids=config.product_ids)
+        api = KrakenWebsocketAPI(
+            product_ids=config.product_ids,
+            max_pairs_per_connection=config.websocket_max_pairs_per_connection,
+            queue_max_batches=config.websocket_queue_max_batches,
+            url=config.kraken_websocket_url,
+        )
     elif config.live_or_historical == 'historical':
         logger.info('Running in historical mode')
-        api = KrakenRestAPI(
-            product_id=config.product_ids[0],
+        api = KrakenRestAPIMultiplePairs(
+            product_ids=config.product_ids,
             last_n_days=config.last_n_days,
+            max_workers=config.backfill_max_workers,
+            max_requests_per_second=config.backfill_max_requests_per_second,
+            checkpoint_path=config.backfill_checkpoint_path,
+            url=config.kraken_rest_url,
         )
+    elif config.live_or_historical == 'tape':
+        logger.info(f'Running in tape mode, replaying {config.tape_path}')
+        if config.tape_path is None:
+            raise ValueError("'tape_path' is required in tape mode.")
+        api = KrakenTapeAPI(tape_path=config.tape_path, speed=config.tape_speed)
     else:
         raise ValueError(
-            "Invalid value for 'live_or_historical'. Must be 'live' or 'historical'."
+            "Invalid value for 'live_or_historical'. "
+            "Must be 'live', 'historical' or 'tape'."
         )
     run(
         kafka_broker_address=config.kafka_broker_address,
         kafka_topic_name=config.kafka_topic_name,
         kraken_api=api,
+        kafka_linger_ms=config.kafka_linger_ms,
+        kafka_batch_size=config.kafka_batch_size,
+        kafka_compression_type=config.kafka_compression_type,
+        stats_log_interval_sec=config.stats_log_interval_sec,
+        kafka_value_serializer=config.kafka_value_serializer,
+        checkpoint_interval_sec=config.backfill_checkpoint_interval_sec,
     )
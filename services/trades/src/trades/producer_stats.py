@@ -0,0 +1,70 @@
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+from confluent_kafka import KafkaError, Message
+from loguru import logger
+
+
+class ProducerStats:
+    """
+    Aggregated counters for the trades producer loop.
+
+    Instead of logging every trade, the loop records what it produced per pair and
+    the Kafka delivery reports, and a summary with trades/sec and bytes/sec per pair
+    is logged every `log_interval_sec` seconds.
+    """
+
+    def __init__(self, log_interval_sec: float = 10.0):
+        self.log_interval_sec = log_interval_sec
+        self.delivered = 0
+        self.failed = 0
+        # never reset, so the caller can tell whether anything failed since a flush
+        self.total_failed = 0
+        self._trades: Dict[str, int] = defaultdict(int)
+        self._bytes: Dict[str, int] = defaultdict(int)
+        self._last_error: Optional[KafkaError] = None
+        self._last_log = time.monotonic()
+
+    def record_produced(self, product_id: str, n_bytes: int) -> None:
+        self._trades[product_id] += 1
+        self._bytes[product_id] += n_bytes
+
+    def on_delivery(self, err: Optional[KafkaError], msg: Message) -> None:
+        """
+        Delivery callback passed to `producer.produce`. Failures are counted, and only
+        the last error of each interval is kept for the summary.
+        """
+        if err is None:
+            self.delivered += 1
+        else:
+            self.failed += 1
+            self.total_failed += 1
+            self._last_error = err
+
+    def maybe_log(self) -> None:
+        """
+        Logs and resets the per-pair rates if `log_interval_sec` has elapsed.
+        """
+        now = time.monotonic()
+        elapsed = now - self._last_log
+        if elapsed < self.log_interval_sec:
+            return
+
+        for product_id, n_trades in sorted(self._trades.items()):
+            logger.info(
+                f'{product_id}: {n_trades / elapsed:.1f} trades/sec, '
+                f'{self._bytes[product_id] / elapsed:.0f} bytes/sec'
+            )
+        logger.info(
+            f'Delivered {self.delivered} messages, {self.failed} delivery failures'
+        )
+        if self._last_error is not None:
+            logger.error(f'Last delivery error: {self._last_error}')
+
+        self._trades.clear()
+        self._bytes.clear()
+        self.delivered = 0
+        self.failed = 0
+        self._last_error = None
+        self._last_log = now
@@ -0,0 +1,88 @@
+from typing import Any, Callable, List, Literal
+
+import msgspec
+from candles.serializers import encode_trade_fields
+from quixstreams.utils.json import dumps as orjson_dumps
+from quixstreams.utils.json import loads as orjson_loads
+from trade import TradeBatch
+
+SerializerName = Literal['json', 'msgspec', 'binary']
+
+# Decodes the Kraken websocket frames and REST pages. orjson ships with quixstreams
+# and raises `orjson.JSONDecodeError`, a subclass of `json.JSONDecodeError`.
+loads: Callable[[str | bytes], Any] = orjson_loads
+
+
+class _TradeMessage(msgspec.Struct):
+    # encoded by msgspec like the dict of `Trade.to_dict`, with the same key order
+    product_id: str
+    price: float
+    quantity: float
+    timestamp: str
+    timestamp_ms: int
+    side: str
+
+
+def _columns(trades: TradeBatch) -> zip:
+    return zip(
+        trades.product_ids,
+        trades.prices,
+        trades.quantities,
+        trades.timestamps,
+        trades.timestamps_ms,
+        trades.sides,
+        strict=True,
+    )
+
+
+def _encode_json(trades: TradeBatch) -> List[bytes]:
+    return [
+        orjson_dumps(
+            {
+                'product_id': product_id,
+                'price': price,
+                'quantity': quantity,
+                'timestamp': timestamp,
+                'timestamp_ms': timestamp_ms,
+                'side': side,
+            }
+        )
+        for product_id, price, quantity, timestamp, timestamp_ms, side in _columns(
+            trades
+        )
+    ]
+
+
+def _encode_msgspec(trades: TradeBatch) -> List[bytes]:
+    encode = msgspec.json.Encoder().encode
+    return [encode(_TradeMessage(*trade)) for trade in _columns(trades)]
+
+
+def _encode_binary(trades: TradeBatch) -> List[bytes]:
+    # the ISO timestamp is not part of the binary records
+    return list(
+        map(
+            encode_trade_fields,
+            trades.product_ids,
+            trades.prices,
+            trades.quantities,
+            trades.timestamps_ms,
+            trades.sides,
+        )
+    )
+
+
+def get_batch_serializer(name: SerializerName) -> Callable[[TradeBatch], List[bytes]]:
+    """
+    Returns the function that encodes a batch of trades produced to Kafka, one
+    message per trade, straight from the columns of the batch.
+    `json` is the same orjson encoder quixstreams uses for `value_serializer='json'`.
+    """
+    if name == 'json':
+        return _encode_json
+    if name == 'msgspec':
+        return _encode_msgspec
+    if name == 'binary':
+        # the binary records decoded by the candles service
+        return _encode_binary
+    raise ValueError(f'Unknown serializer: {name}')
@@ -1,7 +1,78 @@
 import datetime
+import math
+from array import array
+from functools import lru_cache
+from typing import Iterable, List, Literal, Optional, Sequence
 
 from pydantic import BaseModel
 
+_EPOCH = datetime.date(1970, 1, 1)
+_MS_PER_DAY = 24 * 60 * 60 * 1000
+
+# Taker side of the trades, abbreviated by the REST API. Mapping them all to the same
+# two strings also spares a string object per trade in the batches. An unknown side is
+# kept as is, like in `Trade`.
+_SIDES = {'b': 'buy', 's': 'sell', 'buy': 'buy', 'sell': 'sell'}
+
+
+@lru_cache(maxsize=64)
+def _date_to_epoch_ms(date: str) -> int:
+    """
+    Milliseconds between the epoch and midnight UTC of the given `YYYY-MM-DD` date.
+    Cached, as consecutive trades almost always share the same date.
+    """
+    return (datetime.date.fromisoformat(date) - _EPOCH).days * _MS_PER_DAY
+
+
+@lru_cache(maxsize=64)
+def _epoch_day_to_date(epoch_day: int) -> str:
+    """
+    The `YYYY-MM-DD` date of the given number of days since the epoch.
+    """
+    return (_EPOCH + datetime.timedelta(days=epoch_day)).isoformat()
+
+
+def iso_format_to_unix_ms(iso_format: str) -> int:
+    """
+    Convert Kraken's fixed ISO 8601 format to unix milliseconds.
+    Example: "2025-04-24T11:35:42.856851Z" -> 1745494542856
+
+    The fixed layout is parsed with string slicing; anything else falls back to
+    `datetime.fromisoformat`.
+    """
+    if len(iso_format) == 27 and iso_format[10] == 'T' and iso_format[26] == 'Z':
+        return (
+            _date_to_epoch_ms(iso_format[:10])
+            + int(iso_format[11:13]) * 3600000
+            + int(iso_format[14:16]) * 60000
+            + int(iso_format[17:19]) * 1000
+            + int(iso_format[20:23])
+        )
+    return int(datetime.datetime.fromisoformat(iso_format).timestamp() * 1000)
+
+
+def unix_seconds_to_iso_format(timestamp_sec: float) -> str:
+    """
+    Convert Unix timestamp in seconds to ISO 8601 format string with UTC timezone
+    Example: "2025-04-24T11:35:42.856851Z"
+
+    Produces the same string as `datetime.isoformat`, without building a datetime.
+    """
+    # same rounding as `datetime.fromtimestamp`: round the fractional part only
+    fraction, seconds = math.modf(timestamp_sec)
+    seconds = int(seconds)
+    microseconds = round(fraction * 1000000)
+    if microseconds >= 1000000:
+        seconds += 1
+        microseconds -= 1000000
+    epoch_day, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    date = _epoch_day_to_date(epoch_day)
+    if microseconds:
+        return f'{date}T{hours:02d}:{minutes:02d}:{seconds:02d}.{microseconds:06d}Z'
+    return f'{date}T{hours:02d}:{minutes:02d}:{seconds:02d}Z'
+
 
 class Trade(BaseModel):
     product_id: str
@@ -9,6 +80,8 @@ class Trade(BaseModel):
     quantity: float
     timestamp: str
     timestamp_ms: int
+    # taker side, missing in the trades produced before it was added
+    side: Optional[Literal['buy', 'sell']] = None
 
     def to_dict(self):
         """
@@ -24,8 +97,7 @@ class Trade(BaseModel):
         Convert Unix timestamp in seconds to ISO 8601 format string with UTC timezone
         Example: "2025-04-24T11:35:42.856851Z"
         """
-        dt = datetime.datetime.fromtimestamp(timestamp_sec, tz=datetime.timezone.utc)
-        return dt.isoformat().replace('+00:00', 'Z')
+        return unix_seconds_to_iso_format(timestamp_sec)
 
     @classmethod
     def from_kraken_rest_api_response(
@@ -34,6 +106,7 @@ class Trade(BaseModel):
         price: float,
         quantity: float,
         timestamp_sec: float,
+        side: Optional[str] = None,
     ) -> 'Trade':
         """
         Creates a Trade object from the Kraken REST API response.
@@ -44,6 +117,7 @@ class Trade(BaseModel):
             quantity=quantity,
             timestamp=cls.unix_seconds_to_iso_format(timestamp_sec),
             timestamp_ms=int(timestamp_sec * 1000),  # Convert seconds to milliseconds
+            side=_SIDES.get(side, side),
         )
 
     @classmethod
@@ -53,6 +127,7 @@ class Trade(BaseModel):
         price: float,
         quantity: float,
         timestamp: str,
+        side: Optional[str] = None,
     ) -> 'Trade':
         """
         Creates a Trade object from the Kraken WebSocket response.
@@ -62,9 +137,8 @@ class Trade(BaseModel):
             price=price,
             quantity=quantity,
             timestamp=timestamp,
-            timestamp_ms=int(
-                cls.iso_format_to_unix_seconds(timestamp) * 1000
-            ),  # Convert seconds to milliseconds
+            timestamp_ms=iso_format_to_unix_ms(timestamp),
+            side=side,
         )
 
     @staticmethod
@@ -73,3 +147,125 @@ class Trade(BaseModel):
         Convert ISO format to unix seconds timestamp format
         """
         return datetime.datetime.fromisoformat(iso_format).timestamp()
+
+
+class TradeBatch:
+    """
+    Columnar batch of trades used on the ingest hot path.
+
+    Prices, quantities and timestamps live in typed arrays, and product ids and sides
+    are references to the same interned strings, so appending a trade allocates no
+    per-trade object. The pydantic `Trade` model is only built at the boundary,
+    through `to_trades`, when validated objects are needed.
+    """
+
+    __slots__ = (
+        'product_ids',
+        'prices',
+        'quantities',
+        'timestamps',
+        'timestamps_ms',
+        'sides',
+    )
+
+    def __init__(self):
+        self.product_ids: List[str] = []
+        self.prices = array('d')
+        self.quantities = array('d')
+        self.timestamps: List[str] = []
+        self.timestamps_ms = array('q')
+        self.sides: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def append(
+        self,
+        product_id: str,
+        price: float,
+        quantity: float,
+        timestamp: str,
+        timestamp_ms: int,
+        side: str,
+    ) -> None:
+        self.product_ids.append(product_id)
+        self.prices.append(price)
+        self.quantities.append(quantity)
+        self.timestamps.append(timestamp)
+        self.timestamps_ms.append(timestamp_ms)
+        self.sides.append(side)
+
+    def extend(self, other: 'TradeBatch') -> None:
+        self.product_ids.extend(other.product_ids)
+        self.prices.extend(other.prices)
+        self.quantities.extend(other.quantities)
+        self.timestamps.extend(other.timestamps)
+        self.timestamps_ms.extend(other.timestamps_ms)
+        self.sides.extend(other.sides)
+
+    def to_dicts(self) -> Iterable[dict]:
+        """
+        Yields one dictionary per trade, with the same layout as `Trade.to_dict`.
+        """
+        for product_id, price, quantity, timestamp, timestamp_ms, side in zip(
+            self.product_ids,
+            self.prices,
+            self.quantities,
+            self.timestamps,
+            self.timestamps_ms,
+            self.sides,
+            strict=True,
+        ):
+            yield {
+                'product_id': product_id,
+                'price': price,
+                'quantity': quantity,
+                'timestamp': timestamp,
+                'timestamp_ms': timestamp_ms,
+                'side': side,
+            }
+
+    def to_trades(self) -> List[Trade]:
+        """
+        Validates the batch into a list of pydantic Trade objects.
+        """
+        return [Trade.model_validate(trade) for trade in self.to_dicts()]
+
+    @classmethod
+    def from_kraken_rest_api_response(
+        cls, product_id: str, trades: Sequence[Sequence]
+    ) -> 'TradeBatch':
+        """
+        Creates a TradeBatch from the rows of the Kraken REST API response, i.e.
+        `[price, volume, time, buy/sell, market/limit, miscellaneous, trade_id]`.
+        """
+        batch = cls()
+        for trade in trades:
+            timestamp_sec = float(trade[2])
+            batch.append(
+                product_id,
+                float(trade[0]),
+                float(trade[1]),
+                unix_seconds_to_iso_format(timestamp_sec),
+                int(timestamp_sec * 1000),  # Convert seconds to milliseconds
+                _SIDES.get(trade[3], trade[3]),
+            )
+        return batch
+
+    @classmethod
+    def from_kraken_websocket_response(cls, trades: Sequence[dict]) -> 'TradeBatch':
+        """
+        Creates a TradeBatch from the `data` field of a Kraken WebSocket trade message.
+        """
+        batch = cls()
+        for trade in trades:
+            timestamp = trade['timestamp']
+            batch.append(
+                trade['symbol'],
+                float(trade['price']),
+                float(trade['qty']),
+                timestamp,
+                iso_format_to_unix_ms(timestamp),
+                _SIDES.get(trade['side'], trade['side']),
+            )
+        return batch
@@ -0,0 +1,130 @@
+import json
+import time
+
+import pytest
+from kraken_rest_api import BackfillCheckpoint, KrakenRestAPI, RateLimiter
+
+
+class FakeClock:
+    """
+    Stands in for `time.monotonic` and `time.sleep`, sleeping advances the clock.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(time, 'sleep', clock.sleep)
+    return clock
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.content = json.dumps(data).encode()
+
+
+class FakeSession:
+    """
+    Answers the requests with the given pages, and records their parameters.
+    """
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.params = []
+
+    def get(self, url, headers, params, timeout):
+        self.params.append(params)
+        return FakeResponse(self.pages.pop(0))
+
+
+def test_rate_limiter_paces_the_requests(clock):
+    limiter = RateLimiter(max_requests_per_second=2, burst=2)
+    start = clock.now
+    times = []
+    for _ in range(6):
+        limiter.acquire()
+        times.append(clock.now - start)
+
+    # the burst goes through, then one request every half second
+    assert times == pytest.approx([0, 0, 0.5, 1.0, 1.5, 2.0])
+
+
+def test_rate_limiter_backoff(clock):
+    limiter = RateLimiter(max_requests_per_second=10, burst=5)
+    limiter.acquire()
+    limiter.backoff(3)
+    start = clock.now
+    limiter.acquire()
+
+    assert clock.now - start == pytest.approx(3)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint = BackfillCheckpoint(str(tmp_path / 'state' / 'checkpoint.json'))
+    assert checkpoint.load() == {}
+
+    checkpoint.save({'BTC/USD': 1745494542856851000, 'ETH/EUR': 1})
+    assert checkpoint.load() == {'BTC/USD': 1745494542856851000, 'ETH/EUR': 1}
+    assert [path.name for path in (tmp_path / 'state').iterdir()] == ['checkpoint.json']
+
+
+def test_checkpoint_unreadable(tmp_path):
+    path = tmp_path / 'checkpoint.json'
+    path.write_text('{"BTC/USD": ')
+    assert BackfillCheckpoint(str(path)).load() == {}
+
+
+def test_get_trades_pages_until_now():
+    now_ns = time.time_ns()
+    session = FakeSession(
+        [
+            {
+                'error': [],
+                'result': {
+                    'BTC/USD': [['93000.1', '0.5', 1745494542.5, 'b', 'l', '', 1]],
+                    'last': '1745494542500000000',
+                },
+            },
+            {'error': [], 'result': {'BTC/USD': [], 'last': str(now_ns)}},
+        ]
+    )
+    api = KrakenRestAPI('BTC/USD', last_n_days=1, since_timestamp_ns=0, session=session)
+
+    trades = api.get_trades()
+    assert [trade['timestamp_ms'] for trade in trades.to_dicts()] == [1745494542500]
+    assert not api.is_done()
+    assert len(api.get_trades()) == 0
+    assert api.is_done()
+    assert [params['since'] for params in session.params] == [0, 1745494542500000000]
+
+
+def test_get_trades_backs_off_on_errors(clock):
+    limiter = RateLimiter(max_requests_per_second=100)
+    session = FakeSession([{'error': ['EGeneral:Too many requests']}])
+    api = KrakenRestAPI(
+        'BTC/USD',
+        last_n_days=1,
+        since_timestamp_ns=5,
+        session=session,
+        rate_limiter=limiter,
+        rate_limit_backoff_sec=10,
+    )
+
+    assert len(api.get_trades()) == 0
+    # the cursor is unchanged, and the limiter holds the next request
+    assert api.since_timestamp_ns == 5
+    start = clock.now
+    limiter.acquire()
+    assert clock.now - start == pytest.approx(10)
@@ -0,0 +1,60 @@
+import pytest
+from candles.serializers import decode_binary
+from main import serialize_trades
+from quixstreams.models import MessageField, SerializationContext
+from quixstreams.models.serializers import JSONSerializer
+from quixstreams.utils.json import loads
+from serializers import get_batch_serializer
+from trade import TradeBatch
+
+ROWS = [
+    ['93000.1', '0.5', 1745494542.856851, 'b', 'l', '', 1],
+    ['93000.2', '0.25', 1745494543.1, 's', 'm', '', 2],
+    ['93000.3', '1e-8', 1745494544.0, 'b', 'm', '', 3],
+]
+
+
+def make_batch():
+    batch = TradeBatch.from_kraken_rest_api_response('BTC/USD', ROWS)
+    batch.extend(TradeBatch.from_kraken_rest_api_response('ETH/EUR', ROWS[:1]))
+    return batch
+
+
+def test_json_matches_the_topic_serializer():
+    # the bytes quixstreams produced with `value_serializer='json'`
+    serialize = JSONSerializer()
+    ctx = SerializationContext(topic='trades', field=MessageField.VALUE)
+    batch = make_batch()
+    expected = [serialize(trade, ctx) for trade in batch.to_dicts()]
+    assert get_batch_serializer('json')(batch) == expected
+
+
+@pytest.mark.parametrize('name', ['json', 'msgspec'])
+def test_json_round_trip(name):
+    batch = make_batch()
+    values = get_batch_serializer(name)(batch)
+    assert [loads(value) for value in values] == list(batch.to_dicts())
+
+
+def test_binary_round_trip():
+    batch = make_batch()
+    values = get_batch_serializer('binary')(batch)
+    # the ISO timestamp is not part of the binary records
+    expected = [
+        {key: value for key, value in trade.items() if key != 'timestamp'}
+        for trade in batch.to_dicts()
+    ]
+    assert [decode_binary(value) for value in values] == expected
+
+
+def test_unknown_serializer():
+    with pytest.raises(ValueError):
+        get_batch_serializer('avro')
+
+
+def test_serialize_trades():
+    batch = make_batch()
+    messages = serialize_trades(batch, get_batch_serializer('json'))
+
+    assert [key for key, _ in messages] == [b'BTC/USD'] * 3 + [b'ETH/EUR']
+    assert [loads(value) for _, value in messages] == list(batch.to_dicts())
@@ -0,0 +1,101 @@
+import datetime
+import random
+
+import pytest
+from trade import (
+    Trade,
+    TradeBatch,
+    iso_format_to_unix_ms,
+    unix_seconds_to_iso_format,
+)
+
+
+def reference_unix_ms(iso_format):
+    return int(datetime.datetime.fromisoformat(iso_format).timestamp() * 1000)
+
+
+def reference_iso_format(timestamp_sec):
+    return (
+        datetime.datetime.fromtimestamp(timestamp_sec, tz=datetime.timezone.utc)
+        .isoformat()
+        .replace('+00:00', 'Z')
+    )
+
+
+@pytest.mark.parametrize(
+    'iso_format',
+    [
+        '2025-04-24T11:35:42.856851Z',
+        '1970-01-01T00:00:00.000000Z',
+        '2024-02-29T23:59:59.999999Z',
+        '2025-12-31T00:00:00.000999Z',
+    ],
+)
+def test_iso_format_to_unix_ms(iso_format):
+    assert iso_format_to_unix_ms(iso_format) == reference_unix_ms(iso_format)
+
+
+@pytest.mark.parametrize(
+    'iso_format',
+    ['2025-04-24T11:35:42Z', '2025-04-24T11:35:42.85Z', '2025-04-24T13:35:42+02:00'],
+)
+def test_iso_format_to_unix_ms_falls_back_to_datetime(iso_format):
+    assert iso_format_to_unix_ms(iso_format) == reference_unix_ms(iso_format)
+
+
+def test_unix_seconds_to_iso_format():
+    rng = random.Random(0)
+    timestamps = [0.0, 1745494542.0, 1745494542.856851, 1745494542.9999996]
+    timestamps += [rng.uniform(0, 2e9) for _ in range(1000)]
+    for timestamp_sec in timestamps:
+        assert unix_seconds_to_iso_format(timestamp_sec) == reference_iso_format(
+            timestamp_sec
+        )
+
+
+def test_batch_from_kraken_rest_api_response():
+    rows = [
+        ['93000.1', '0.5', 1745494542.856851, 'b', 'l', '', 1],
+        ['93000.2', '0.25', 1745494543.1, 's', 'm', '', 2],
+    ]
+    batch = TradeBatch.from_kraken_rest_api_response('BTC/USD', rows)
+
+    assert len(batch) == 2
+    assert list(batch.to_dicts()) == [
+        Trade.from_kraken_rest_api_response(
+            'BTC/USD', float(row[0]), float(row[1]), row[2], row[3]
+        ).to_dict()
+        for row in rows
+    ]
+    assert [trade.side for trade in batch.to_trades()] == ['buy', 'sell']
+
+
+def test_batch_from_kraken_websocket_response():
+    trades = [
+        {
+            'symbol': 'ETH/EUR',
+            'price': 1600.5,
+            'qty': 0.1,
+            'timestamp': '2025-04-24T11:35:42.856851Z',
+            'side': 'sell',
+        }
+    ]
+    batch = TradeBatch.from_kraken_websocket_response(trades)
+
+    assert list(batch.to_dicts()) == [
+        Trade.from_kraken_websocket_response(
+            'ETH/EUR', 1600.5, 0.1, '2025-04-24T11:35:42.856851Z', 'sell'
+        ).to_dict()
+    ]
+    assert batch.timestamps_ms[0] == 1745494542856
+
+
+def test_batch_extend():
+    rows = [['1.0', '2.0', 1745494542.0, 'b', 'l', '', 1]]
+    batch = TradeBatch.from_kraken_rest_api_response('BTC/USD', rows)
+    batch.extend(TradeBatch.from_kraken_rest_api_response('ETH/EUR', rows))
+
+    assert [trade['product_id'] for trade in batch.to_dicts()] == [
+        'BTC/USD',
+        'ETH/EUR',
+    ]